@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+benchmark.py
+------------
+
+Times the toolkit's main operations on a reproducible synthetic tree (see genTestData) and writes
+the results as JSON, so runs can be compared between versions:
+
+    find_files, find_files_sorted       recursive search of the whole tree
+    copy_files, move_files              flat copy / move of the files (one per distinct name)
+    sync_files                          copy of the whole tree
+    process_files                       rename every file of a tree copy (upper case)
+    rename_file                         the same, one rename_file call per file (at most RENAME_FILE_LIMIT)
+    delete_files                        recursive delete of a tree copy
+
+Each benchmark runs `repeat` times on fresh copies; setup (creating copies) is not timed.
+
+Example:
+    benchmark.py --depth 4 --fan-out 4-8 --files 20-80 --output after.json --compare before.json
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from genTestData import TreeSpec, add_spec_arguments, generate_tree, spec_from_args
+from findFiles import find_files
+import renameFiles
+import dirFileActions
+
+# Small random files: realistic for copies, quick to generate
+DEFAULT_SPEC = TreeSpec(depth=3, fan_out=(2, 6), files_per_dir=(20, 60), sizes='lognormal:4k,1', fill='random')
+DEFAULT_WORKERS = dirFileActions.DEFAULT_WORKERS
+RENAME_FILE_LIMIT = 1000
+BENCHMARKS = ('find_files', 'find_files_sorted', 'copy_files', 'sync_files', 'move_files', 'process_files',
+              'rename_file', 'delete_files')
+
+
+class _Workspace:
+    """The generated tree plus a scratch directory for copies, with the setup steps benchmarks share."""
+
+    def __init__(self, tree, scratch, workers):
+        self.tree = tree
+        self.scratch = scratch
+        self.workers = workers
+        self.files = sorted(find_files(tree, '*', recursive=True))
+        by_name = {}
+        for file_path in self.files:
+            by_name.setdefault(os.path.basename(file_path), file_path)
+        self.flat_files = sorted(by_name.values())
+        self.counter = 0
+
+    def fresh_dir(self):
+        self.counter += 1
+        path = os.path.join(self.scratch, f"run{self.counter}")
+        os.makedirs(path)
+        return path
+
+    def tree_copy(self):
+        target = self.fresh_dir()
+        dirFileActions.sync_files([self.tree + os.sep], target, workers=self.workers)
+        return target
+
+    def flat_copy(self):
+        target = self.fresh_dir()
+        dirFileActions.copy_files(self.flat_files, target, workers=self.workers)
+        return target
+
+
+def _rename_args():
+    return argparse.Namespace(match=None, replace=None, change_case='upper', remove_vowels=False, start_number=1,
+                              workers=1)
+
+
+def _benchmarks(ws):
+    """name -> (setup returning the run's input, run(input) returning the number of items processed)."""
+    workers = ws.workers
+
+    def move_job():
+        source = ws.flat_copy()
+        return sorted(os.path.join(source, name) for name in os.listdir(source)), ws.fresh_dir()
+
+    def tree_copy_files():
+        return sorted(find_files(ws.tree_copy(), '*', recursive=True))
+
+    def rename_each(paths):
+        for file_path in paths:
+            renameFiles.rename_file(file_path, _rename_args(), False)
+        return len(paths)
+
+    return {
+        'find_files': (lambda: None, lambda _: sum(1 for _ in find_files(ws.tree, '*', True, workers))),
+        'find_files_sorted': (lambda: None, lambda _: sum(1 for _ in find_files(ws.tree, '*', True, workers, True))),
+        'copy_files': (ws.fresh_dir, lambda dst: dirFileActions.copy_files(ws.flat_files, dst, workers).files),
+        'sync_files': (ws.fresh_dir,
+                       lambda dst: dirFileActions.sync_files([ws.tree + os.sep], dst, workers=workers).files),
+        'move_files': (move_job, lambda job: dirFileActions.move_files(job[0], job[1], workers).files),
+        'process_files': (tree_copy_files,
+                          lambda paths: renameFiles.process_files(paths, _rename_args(), False).renamed),
+        'rename_file': (lambda: tree_copy_files()[:RENAME_FILE_LIMIT], rename_each),
+        'delete_files': (ws.tree_copy, lambda path: dirFileActions.delete_files([path], True, workers).deleted),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(spec=DEFAULT_SPEC, repeat=3, only=None, workers=DEFAULT_WORKERS, workdir=None):
+    """
+    Generate the tree for `spec` in a temporary directory and time each benchmark `repeat` times.
+    Args:
+        only (list): Names from BENCHMARKS to run; all if None.
+        workdir (str): Where to create the temporary directory (choose the filesystem under test).
+    Returns:
+        dict: {'meta': {...}, 'results': {name: {'items', 'seconds', 'min', 'median', 'items_per_second'}}}
+    """
+    # The tools log every call and print every rename; keep that out of the measurements
+    root = logging.getLogger()
+    level = root.level
+    root.setLevel(logging.ERROR)
+    try:
+        with tempfile.TemporaryDirectory(prefix='benchmark_', dir=workdir) as temp:
+            started = time.perf_counter()
+            tree_stats = generate_tree(os.path.join(temp, 'tree'), spec, workers)
+            meta = {
+                'revision': _git_revision(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'workers': workers,
+                'repeat': repeat,
+                'spec': spec._asdict(),
+                'tree': tree_stats._asdict(),
+                'generate_seconds': time.perf_counter() - started,
+            }
+            os.makedirs(os.path.join(temp, 'scratch'))
+            ws = _Workspace(os.path.join(temp, 'tree'), os.path.join(temp, 'scratch'), workers)
+            results = {}
+            for name, (setup, run) in _benchmarks(ws).items():
+                if only and name not in only:
+                    continue
+                seconds = []
+                for _ in range(repeat):
+                    job = setup()
+                    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                        start = time.perf_counter()
+                        items = run(job)
+                        seconds.append(time.perf_counter() - start)
+                best = min(seconds)
+                results[name] = {'items': items, 'seconds': seconds, 'min': best, 'median': statistics.median(seconds),
+                                 'items_per_second': items / best if best > 0 else None}
+                # Drop this benchmark's copies before the next one
+                shutil.rmtree(ws.scratch)
+                os.makedirs(ws.scratch)
+    finally:
+        root.setLevel(level)
+    return {'meta': meta, 'results': results}
+
+
+def compare(old, new):
+    """Return report lines comparing the median times of two run_benchmarks results."""
+    lines = [f"{'benchmark':<20} {'old (s)':>10} {'new (s)':>10} {'speedup':>8}"]
+    for name, result in new['results'].items():
+        before = old['results'].get(name)
+        if before is None:
+            lines.append(f"{name:<20} {'-':>10} {result['median']:>10.4f} {'-':>8}")
+            continue
+        speedup = before['median'] / result['median'] if result['median'] > 0 else float('inf')
+        lines.append(f"{name:<20} {before['median']:>10.4f} {result['median']:>10.4f} {speedup:>7.2f}x")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark findFiles, renameFiles and dirFileActions on a synthetic tree.")
+    add_spec_arguments(parser, DEFAULT_SPEC)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per benchmark; min and median are reported.")
+    parser.add_argument('--only', action='append', choices=BENCHMARKS, help="Run only this benchmark (repeatable).")
+    parser.add_argument('-j', '--workers', type=int, default=DEFAULT_WORKERS, help="Workers passed to every operation.")
+    parser.add_argument('--workdir', help="Directory to create the temporary tree in (default: system temp dir).")
+    parser.add_argument('--output', '-o', help="Write the JSON results to this file (default: stdout).")
+    parser.add_argument('--compare', metavar='JSON', help="Print speedups against an earlier results file.")
+    args = parser.parse_args()
+
+    results = run_benchmarks(spec_from_args(args), args.repeat, args.only, args.workers, args.workdir)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as file:
+            print('\n'.join(compare(json.load(file), results)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
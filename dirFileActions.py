@@ -1,35 +1,339 @@
 #!/usr/bin/env python3
 
 import argparse
+import errno
 import os
 import shutil
 import sys
 import logging
+from contextlib import nullcontext
 
 from lib_dryrun import *
 from lib_fileinput import *
 from lib_logging import *
+from lib_fastcopy import CopyStats, clone_file, copy_file
+from lib_scheduler import DEFAULT_WORKERS, DEFAULT_MAX_INFLIGHT_BYTES, Transfer, claim_target, iter_transfers, \
+    plan_transfers, plan_transfer_pairs, run_transfers
+from lib_duplicates import full_hash
+from lib_delete import delete_paths
+from lib_rename import rename_noreplace
+from lib_undo import DEFAULT_JOURNAL_DIR, journaled, record, transaction
+from lib_walk import walk_entries
 
 # Set up logging
 # setup_logging(level=logging.DEBUG)
-setup_logging(level=logging.ERROR)
+LOGGING = dict(level=logging.ERROR)
+setup_logging(**LOGGING)
 
 
-@dry_run_decorator
-def move_files(file_paths, destination):
-    for file_path in file_paths:
-        shutil.move(file_path, destination)
+# Copy modes, and the operation each one uses when source and destination share a device.
+COPY_MODES = ('copy', 'link', 'reflink')
+FAST_PATHS = {'move': 'rename', 'link': 'link', 'reflink': 'reflink'}
+# Errors from os.link meaning "not possible here", to be answered by copying the bytes instead.
+_LINK_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP}
 
 
-@dry_run_decorator
-def delete_files(file_paths):
-    for file_path in file_paths:
-        os.remove(file_path)
+def is_same_device(transfer):
+    """True if the transfer's source and destination are on the same device."""
+    src_dev, dst_dev = transfer.devices
+    return dst_dev is not None and src_dev == dst_dev
+
+
+def _destination_path(src, destination):
+    if os.path.isdir(destination):
+        return os.path.join(destination, os.path.basename(src.rstrip(os.sep)))
+    return destination
+
+
+def _target_path(transfer):
+    return _destination_path(transfer.src, transfer.dst)
+
+
+def plan_report(transfers, mode):
+    """
+    Summarise how many transfers will take the same-device fast path for `mode` ('move', 'copy',
+    'link' or 'reflink') and how many will have to copy their bytes.
+    """
+    fast = [t for t in transfers if mode in FAST_PATHS and is_same_device(t)]
+    slow_count = len(transfers) - len(fast)
+    slow_bytes = sum(t.size for t in transfers) - sum(t.size for t in fast)
+    report = f"{mode} plan: {len(transfers)} files"
+    if mode in FAST_PATHS:
+        report += f", {len(fast)} via {FAST_PATHS[mode]} ({sum(t.size for t in fast)} bytes, no data moved)"
+    if mode == 'reflink':
+        # Clones never fall back to copying (see _copy_transfer)
+        return report + f", {slow_count} on another device, cannot be cloned"
+    return report + f", {slow_count} copying bytes ({slow_bytes} bytes)"
+
+
+@timed_function(name="copy_transfer")
+def _copy_transfer(transfer, mode='copy'):
+    target = _target_path(transfer)
+    if mode == 'reflink' and not is_same_device(transfer):
+        # Refused before journaling, like a move onto an existing target
+        raise OSError(errno.EXDEV, "Cannot reflink (clone) across devices", target)
+    with journaled(mode, transfer.src, target):
+        if mode == 'link' and is_same_device(transfer):
+            try:
+                os.link(transfer.src, target)
+                return transfer.size, 'link'
+            except OSError as error:
+                if error.errno not in _LINK_UNSUPPORTED:
+                    raise
+                log_debug(f"Cannot hardlink {transfer.src}, copying instead: {error}")
+        if mode == 'reflink':
+            # Clone or fail, like cp --reflink=always: plain 'copy' already tries a clone first
+            _, size, method = clone_file(transfer.src, transfer.dst)
+            return size, method
+        _, size, method = copy_file(transfer.src, transfer.dst)
+        return size, method
+
+
+@timed_function(name="move_transfer")
+def _move_transfer(transfer):
+    target = _target_path(transfer)
+    if os.path.lexists(target):
+        # Checked before journaling, so undo never sees a move that was refused
+        raise FileExistsError(errno.EEXIST, "Destination path already exists", target)
+    with journaled('move', transfer.src, target):
+        if is_same_device(transfer):
+            try:
+                rename_noreplace(transfer.src, target)
+                return transfer.size, 'rename'
+            except OSError as error:
+                # Same st_dev but different mounts (e.g. bind mounts) still refuses a rename
+                if error.errno != errno.EXDEV:
+                    raise
+        shutil.move(transfer.src, transfer.dst)
+        return transfer.size, 'copy+delete'
+
+
+def _fast_path_bytes(mode):
+    """Scheduling weight: same-device fast paths push no data through the page cache."""
+    if mode not in FAST_PATHS:
+        return None
+    return lambda transfer: 0 if is_same_device(transfer) else transfer.size
+
+
+def move_plan(file_paths, destination, *args, **kwargs):
+    return (plan_step('move', file_path, _destination_path(file_path, destination)) for file_path in file_paths)
+
+
+def copy_plan(file_paths, destination, workers=DEFAULT_WORKERS, max_inflight_bytes=DEFAULT_MAX_INFLIGHT_BYTES,
+              per_device_workers=None, mode='copy', *args, **kwargs):
+    return (plan_step(mode, file_path, _destination_path(file_path, destination)) for file_path in file_paths)
+
+
+def delete_plan(file_paths, recursive=False, *args, **kwargs):
+    return (plan_step('delete', file_path, recursive=recursive) for file_path in file_paths)
+
+
+@dry_run_decorator(plan=move_plan)
+def move_files(file_paths, destination, workers=DEFAULT_WORKERS, max_inflight_bytes=DEFAULT_MAX_INFLIGHT_BYTES,
+               per_device_workers=None, report=None, dry_run=False):
+    """
+    Move files into the destination concurrently (see lib_scheduler). Moves within one device rename
+    without copying data and never replace an existing target (see lib_rename); only moves
+    across devices copy the data and delete the source.
+    Failures are logged and counted, not fatal. `file_paths` is consumed as the moves proceed (see
+    run_transfers), except with `report`, which needs the whole plan first.
+    Args:
+        report (function): Optional callback receiving the plan_report text before anything runs.
+    Returns:
+        CopyStats: Files, bytes, errors and throughput; methods are 'rename' or 'copy+delete'.
+    """
+    stats = CopyStats()
+    transfers = _transfers(file_paths, destination, stats, report, 'move')
+    return run_transfers(transfers, _move_transfer, workers, max_inflight_bytes, per_device_workers, stats, "move",
+                         _fast_path_bytes('move'))
+
+
+@dry_run_decorator(plan=delete_plan)
+def delete_files(file_paths, recursive=False, workers=DEFAULT_WORKERS, dry_run=False):
+    """
+    Delete files, and whole directory trees when `recursive` is set, in parallel (see lib_delete).
+    Failures are collected per path instead of aborting the run.
+    Returns:
+        DeleteStats: Number of removed entries and the (path, error) failures.
+    """
+    return delete_paths(_journaled_deletes(file_paths, recursive), recursive, workers)
+
 
-@dry_run_decorator
-def copy_files(file_paths, destination):
+def _journaled_deletes(file_paths, recursive):
+    # delete_paths hands a path to a worker only after pulling it from here, so it is journaled first
     for file_path in file_paths:
-        shutil.copy(file_path, destination)
+        record('delete', file_path, recursive=recursive)
+        yield file_path
+
+@dry_run_decorator(plan=copy_plan)
+def copy_files(file_paths, destination, workers=DEFAULT_WORKERS, max_inflight_bytes=DEFAULT_MAX_INFLIGHT_BYTES,
+               per_device_workers=None, mode='copy', report=None, dry_run=False):
+    """
+    Copy files into the destination concurrently (see lib_scheduler), preferring reflink, copy_file_range
+    and sendfile over user-space buffers (see lib_fastcopy). Failures are logged and counted, not fatal.
+    `file_paths` is consumed as the copies proceed (see run_transfers), except with `report`, which
+    needs the whole plan first.
+    Args:
+        mode (str): 'copy' (clone where the filesystem allows, else copy the bytes), 'link' (hardlink
+                    on the same device; other files are copied) or 'reflink' (clone only; files that
+                    cannot be cloned fail).
+        report (function): Optional callback receiving the plan_report text before anything runs.
+    Returns:
+        CopyStats: Files, bytes, errors, methods used and throughput.
+    """
+    if mode not in COPY_MODES:
+        raise ValueError(f"Invalid copy mode: {mode!r} (expected one of {COPY_MODES})")
+    stats = CopyStats()
+    transfers = _transfers(file_paths, destination, stats, report, mode)
+    return run_transfers(transfers, lambda transfer: _copy_transfer(transfer, mode), workers, max_inflight_bytes,
+                         per_device_workers, stats, "copy", _fast_path_bytes(mode))
+
+
+def _transfers(file_paths, destination, stats, report, mode):
+    if not report:
+        return iter_transfers(file_paths, destination, stats)
+    transfers = plan_transfers(file_paths, destination, stats)
+    report(plan_report(transfers, mode))
+    return transfers
+
+def _sync_sources(sources, destination):
+    """
+    Yield (source entry, destination file) for every file to sync, where the entry is an os.DirEntry or a path.
+    Directories are walked recursively: 'dir' is synced to destination/dir, while 'dir/' syncs the
+    directory's contents into destination (like rsync).
+    """
+    for source in sources:
+        if os.path.isdir(source):
+            root = source.rstrip(os.sep) or os.sep
+            target = destination if source.endswith(os.sep) else os.path.join(destination, os.path.basename(root))
+            for entry in walk_entries(root, recursive=True):
+                yield entry, os.path.join(target, os.path.relpath(entry.path, root))
+        else:
+            yield source, os.path.join(destination, os.path.basename(source))
+
+
+def plan_sync(sources, destination, stats):
+    """
+    Describe every file below `sources` as a Transfer to its own path under `destination`.
+    Unreadable sources, and sources mapping onto a path an earlier one already writes, are logged and
+    counted as errors in `stats`.
+    """
+    return list(iter_sync(sources, destination, stats))
+
+
+def iter_sync(sources, destination, stats):
+    """Like plan_sync, but a generator: the sources are walked as the transfers are needed."""
+    os.makedirs(destination, exist_ok=True)
+    dst_dev = os.stat(destination).st_dev
+    claimed = {}
+    for source, dst in _sync_sources(sources, destination):
+        if not claim_target(claimed, os.fspath(source), dst, stats):
+            continue
+        try:
+            # DirEntry.stat() reuses what the walk already fetched
+            st = source.stat() if isinstance(source, os.DirEntry) else os.stat(source)
+        except OSError as error:
+            stats.errors += 1
+            log_error(f"Cannot stat {source}: {error}")
+            continue
+        yield Transfer(os.fspath(source), dst, st.st_size, (st.st_dev, dst_dev))
+
+
+def is_up_to_date(src, dst, checksum=False):
+    """
+    Check whether `dst` already holds the same file as `src`: same size and same modification time
+    (to the second), or same size and content hash when `checksum` is set.
+    """
+    try:
+        dst_st = os.stat(dst)
+    except FileNotFoundError:
+        return False
+    src_st = os.stat(src)
+    if src_st.st_size != dst_st.st_size:
+        return False
+    if checksum:
+        return full_hash(src) == full_hash(dst)
+    return int(src_st.st_mtime) == int(dst_st.st_mtime)
+
+
+@timed_function(name="sync_transfer")
+def _sync_transfer(transfer, checksum):
+    if is_up_to_date(transfer.src, transfer.dst, checksum):
+        return 0, 'skipped'
+    os.makedirs(os.path.dirname(transfer.dst), exist_ok=True)
+    with journaled('sync', transfer.src, transfer.dst):
+        _, size, method = copy_file(transfer.src, transfer.dst)
+    # Carry the source mtime over so the next sync can recognise the copy as current.
+    st = os.stat(transfer.src)
+    os.utime(transfer.dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+    return size, method
+
+
+def sync_plan(sources, destination, checksum=False, *args, **kwargs):
+    for source, dst in _sync_sources(sources, destination):
+        src = os.fspath(source)
+        try:
+            if is_up_to_date(src, dst, checksum):
+                continue
+        except OSError as error:
+            log_error(f"Cannot stat {src}: {error}")
+            continue
+        yield plan_step('sync', src, dst)
+
+
+@dry_run_decorator(plan=sync_plan)
+def sync_files(sources, destination, checksum=False, workers=DEFAULT_WORKERS,
+               max_inflight_bytes=DEFAULT_MAX_INFLIGHT_BYTES, per_device_workers=None, dry_run=False):
+    """
+    Copy files and directory trees into the destination, skipping files that are already up to date
+    (see is_up_to_date). Comparisons and copies run concurrently on the copy scheduler, and start
+    while the source trees are still being walked.
+    Returns:
+        CopyStats: Totals; skipped files are counted under the 'skipped' method.
+    """
+    stats = CopyStats()
+    transfers = iter_sync(sources, destination, stats)
+    return run_transfers(transfers, lambda transfer: _sync_transfer(transfer, checksum),
+                         workers, max_inflight_bytes, per_device_workers, stats, "sync")
+
+
+def apply_plan(steps, workers=DEFAULT_WORKERS, max_inflight_bytes=DEFAULT_MAX_INFLIGHT_BYTES, per_device_workers=None):
+    """
+    Perform the steps of a plan written by --dry-run (see lib_dryrun) exactly as planned: every
+    'move', 'copy', 'link', 'reflink' or 'sync' step goes to its recorded target path, and 'delete'
+    steps remove their path. Steps of one kind run concurrently; kinds run one after another, in
+    order of first appearance.
+    Returns:
+        list: CopyStats or DeleteStats for each kind of step.
+    """
+    operations = {
+        'move': (_move_transfer, _fast_path_bytes('move')),
+        'sync': (lambda transfer: _sync_transfer(transfer, False), None),
+    }
+    for mode in COPY_MODES:
+        operations[mode] = ((lambda transfer, mode=mode: _copy_transfer(transfer, mode)), _fast_path_bytes(mode))
+    batches = {}
+    for step in steps:
+        op = step['op']
+        if op == 'delete':
+            batches.setdefault((op, bool(step.get('recursive'))), []).append(step['src'])
+        elif op in operations and 'dst' in step:
+            batches.setdefault((op, None), []).append((step['src'], step['dst']))
+        else:
+            log_error(f"Cannot apply plan step here: {step}")
+
+    results = []
+    for (op, recursive), items in batches.items():
+        if op == 'delete':
+            results.append(delete_paths(_journaled_deletes(items, recursive), recursive, workers))
+            continue
+        stats = CopyStats()
+        operation, data_bytes = operations[op]
+        transfers = plan_transfer_pairs(items, stats)
+        results.append(run_transfers(transfers, operation, workers, max_inflight_bytes, per_device_workers, stats,
+                                     op, data_bytes))
+    return results
+
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Perform actions on files such as move, delete, and copy.")
@@ -37,35 +341,88 @@ def parse_arguments():
     parser.add_argument('--move', '-m', help="Move files to the specified directory.")
     parser.add_argument('--delete', '-d', action='store_true', help="Delete the specified files.")
     parser.add_argument('--copy', '-c', help="Copy files to the specified directory.")
-    parser.add_argument('files', nargs='*', help="Files to perform actions on.")
-    parser.add_argument('--dry-run', action='store_true', help="Simulate the rename operations without performing them.")
+    parser.add_argument('--recursive', '-r', action='store_true', help="With --delete, also remove directories and their contents.")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Print the planned operations as JSON lines (see --apply-plan) without performing them.")
+    link_mode = parser.add_mutually_exclusive_group()
+    link_mode.add_argument('--link', dest='copy_mode', action='store_const', const='link', default='copy',
+                           help="With --copy, hardlink files on the same device instead of copying them.")
+    link_mode.add_argument('--reflink', dest='copy_mode', action='store_const', const='reflink',
+                           help="With --copy, clone files (copy-on-write) and fail on files that cannot be cloned, "
+                                "e.g. across devices or on filesystems without reflink support.")
+    parser.add_argument('--plan', action='store_true',
+                        help="Print to stderr how many files take the same-device fast path and how many copy bytes.")
+    parser.add_argument('--sync', action='store_true',
+                        help="With --copy, skip files whose destination has the same size and mtime; directories are copied recursively.")
+    parser.add_argument('--checksum', action='store_true',
+                        help="With --sync, compare same-sized files by content hash instead of mtime.")
+    parser.add_argument('--stats', action='store_true', help="Print a summary with throughput to stderr when done.")
+    parser.add_argument('--workers', '-j', type=int, default=DEFAULT_WORKERS,
+                        help=f"Number of files copied, moved or deleted concurrently (default: {DEFAULT_WORKERS}).")
+    parser.add_argument('--max-inflight-mb', type=int, default=DEFAULT_MAX_INFLIGHT_BYTES // 2**20,
+                        help="Budget in MiB for large files being copied or moved at the same time.")
+    parser.add_argument('--per-device', type=int,
+                        help="Maximum concurrent operations per source/destination device pair.")
 
+    parser.add_argument('--timings', metavar='FILE',
+                        help="Write per-operation wall/CPU time, call counts and latency histograms as JSON on exit.")
+    parser.add_argument('--trace', metavar='FILE', help="Write a Chrome trace-event file (chrome://tracing) on exit.")
+    parser.add_argument('--apply-plan', metavar='PLAN',
+                        help="Perform the steps of a plan written by --dry-run ('-' for stdin) exactly as recorded.")
+    parser.add_argument('--journal', nargs='?', const=DEFAULT_JOURNAL_DIR, metavar='DIR',
+                        help=f"Journal every operation so it can be undone with lib_undo.py (default dir: {DEFAULT_JOURNAL_DIR}).")
     parser.add_argument('--from-file', '-ff', help="Read file names from a file (one per line).")
-    parser.add_argument('files', nargs='*', help="Files to be renamed.")
+    parser.add_argument('--null', '-0', action='store_true',
+                        help="Input file names are NUL-terminated (find -print0, findFiles.py -0) and used verbatim.")
+    parser.add_argument('files', nargs='*', help="Files to perform actions on.")
 
     # Add other arguments as necessary
     return parser.parse_args()
 
 def main():
-    args = parser.parse_args()
+    args = parse_arguments()
     dry_run_flag = args.dry_run
+    if args.timings or args.trace:
+        enable_timings(args.timings, args.trace)
+
+    budget = args.max_inflight_mb * 2**20
+    if args.apply_plan:
+        with transaction("dirFileActions", args.journal) if args.journal else nullcontext():
+            results = apply_plan(read_plan(args.apply_plan), args.workers, budget, args.per_device)
+        for result in results if args.stats else ():
+            print(result.summary(), file=sys.stderr)
+        return
 
     # Determine the file paths to process
-    file_paths, detected_dry_run = get_file_paths_from_input(args)
+    # Streamed as they arrive; a path given twice would race against itself, so drop repeats
+    file_paths, detected_dry_run = iter_file_paths_from_input(args, dedupe=True)
 
     # If dry-run was detected from piped input, override the script's dry-run state
     if detected_dry_run:
         args.dry_run = True
 
-    if args.move:
-        move_files(file_paths, args.move)
-    elif args.delete:
-        delete_files(file_paths)
-    elif args.copy:
-        copy_files(file_paths, args.copy)
-    else:
-        print("No action specified. Use --move, --delete, or --copy.")
+    result = None
+    report = (lambda text: print(text, file=sys.stderr)) if args.plan else None
+    with transaction("dirFileActions", args.journal) if args.journal and not args.dry_run else nullcontext():
+        if args.move:
+            result = move_files(file_paths, args.move, args.workers, budget, args.per_device, report,
+                                dry_run=args.dry_run)
+        elif args.delete:
+            # Directories named on the command line are deleted as whole trees with --recursive
+            paths = (args.files or file_paths) if args.recursive else file_paths
+            result = delete_files(paths, args.recursive, args.workers, dry_run=args.dry_run)
+        elif args.copy and args.sync:
+            # Directories named on the command line are synced as whole trees
+            result = sync_files(args.files or file_paths, args.copy, args.checksum, args.workers, budget,
+                                args.per_device, dry_run=args.dry_run)
+        elif args.copy:
+            result = copy_files(file_paths, args.copy, args.workers, budget, args.per_device, args.copy_mode, report,
+                                dry_run=args.dry_run)
+        else:
+            print("No action specified. Use --move, --delete, or --copy.")
+
+    if args.stats and result is not None:
+        print(result.summary(), file=sys.stderr)
 
 if __name__ == "__main__":
     main()
-
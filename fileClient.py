@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+fileClient.py
+-------------
+
+Thin client for fileDaemon.py: runs findFiles, renameFiles, dirFileActions or lib_undo in the warm
+daemon when one is listening, else in this process. Output, exit code and stdin handling are the
+same either way, because the daemon runs the tool on this process's own stdin/stdout/stderr
+(passed over the Unix socket) and in this process's working directory and environment.
+
+Only standard modules are imported before the daemon has been tried, so a call costs little more
+than starting the interpreter.
+
+The environment and stdio are only handed to a daemon run by the same user (checked with
+SO_PEERCRED where available); a socket owned by anyone else is ignored and the tool runs here.
+
+While the daemon runs the tool, SIGINT, SIGTERM and SIGHUP received here are forwarded to it, so
+Ctrl-C stops the tool just like a local run.
+
+Usage:
+    fileClient.py [--socket PATH] TOOL [ARGS...]
+    fileClient.py findFiles '*.txt' ~/docs -r | fileClient.py renameFiles -cc upper
+"""
+
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+
+TOOLS = ('findFiles', 'renameFiles', 'dirFileActions', 'lib_undo')
+FORWARDED_SIGNALS = (signal.SIGINT, signal.SIGTERM, signal.SIGHUP)
+DEFAULT_SOCKET = os.environ.get('PYLIBS_DAEMON_SOCKET') or os.path.join(
+    os.environ.get('XDG_RUNTIME_DIR') or '/tmp', f"python_libs-{os.getuid()}.sock")
+
+
+def peer_uid(conn):
+    """User id of the process at the other end of a connected Unix socket."""
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return os.getuid()
+    _, uid, _ = struct.unpack('3i', conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))
+    return uid
+
+
+def run_in_daemon(tool, argv, socket_path=DEFAULT_SOCKET):
+    """
+    Run a tool in the daemon on this process's stdio.
+    Returns:
+        int: The tool's exit code, or None if no daemon of this user is listening on socket_path.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+        owner = peer_uid(sock)
+        if owner != os.getuid():
+            print(f"fileClient: ignoring {socket_path}, it is served by user {owner}", file=sys.stderr)
+            return None
+        request = json.dumps({'tool': tool, 'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)}) + '\n'
+        data = request.encode('utf-8', 'surrogateescape')
+        sys.stdout.flush()
+        sys.stderr.flush()
+        received = []
+
+        def forward(signum, frame):
+            received.append(signum)
+            try:
+                sock.sendall((json.dumps({'signal': signum}) + '\n').encode())
+            except OSError:
+                pass
+
+        previous = {signum: signal.signal(signum, forward) for signum in FORWARDED_SIGNALS}
+        try:
+            socket.send_fds(sock, [data[:4096]], [0, 1, 2])
+            sock.sendall(data[4096:])
+            reply = sock.makefile('rb').readline()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        if not reply:
+            if received:
+                # The tool was killed by a forwarded signal: end the same way
+                signal.signal(received[-1], signal.SIG_DFL)
+                os.kill(os.getpid(), received[-1])
+            print(f"fileClient: daemon closed the connection while running {tool}", file=sys.stderr)
+            return 1
+        return json.loads(reply)['exit']
+    finally:
+        sock.close()
+
+
+def run_in_process(tool, argv):
+    """Run a tool's main() in this process, as if it had been started as a script. Returns its exit code."""
+    import importlib
+    module = importlib.import_module(tool)
+    sys.argv = [module.__file__] + list(argv)
+    try:
+        module.main()
+    except SystemExit as exit:
+        return exit_code(exit.code)
+    return 0
+
+
+def exit_code(code):
+    """Exit status for a SystemExit code, as the interpreter would report it."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def main():
+    args = sys.argv[1:]
+    socket_path = DEFAULT_SOCKET
+    if args[:1] == ['--socket'] and len(args) > 1:
+        socket_path, args = args[1], args[2:]
+    if not args or args[0] not in TOOLS:
+        print(f"usage: fileClient.py [--socket PATH] {{{','.join(TOOLS)}}} [ARGS...]", file=sys.stderr)
+        sys.exit(2)
+    tool, argv = args[0], args[1:]
+    code = run_in_daemon(tool, argv, socket_path)
+    if code is None:
+        # No daemon: same tool, same arguments, in this process
+        code = run_in_process(tool, argv)
+    sys.stdout.flush()
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+fileDaemon.py
+-------------
+
+Optional local daemon that keeps findFiles, renameFiles, dirFileActions and lib_undo imported and
+initialised, and runs them for fileClient.py over a Unix domain socket, so repeated calls skip
+interpreter start-up, imports and module set-up.
+
+Each connection is served by a forked child of the warm daemon, so a slow or silent client never
+holds up the others. The child inherits everything already loaded (copy-on-write), reads the
+request (within REQUEST_TIMEOUT seconds), takes over the client's stdin/stdout/stderr (received
+with SCM_RIGHTS), working directory and environment, resets logging to the tool's own settings and
+runs the tool's main(). Requests are therefore isolated from each other and behave exactly like a
+script run: pipes, ttys, relative paths and exit codes all work unchanged, and signals the client
+receives (Ctrl-C, SIGTERM, SIGHUP) are forwarded to the child; a client that disappears hangs it up.
+
+What stays warm is the imported, initialised modules. Anything a request builds in memory, such as
+compiled pattern caches, is discarded with its child; state that must outlive a request, such as
+findFiles --index, lives on disk and stays in the page cache.
+
+Only the socket owner's user may connect (checked with SO_PEERCRED where available).
+
+Usage:
+    fileDaemon.py [--socket PATH] &
+    fileClient.py findFiles '*.txt' . -r
+"""
+
+import argparse
+import atexit
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+
+from fileClient import DEFAULT_SOCKET, exit_code, peer_uid
+from lib_logging import *
+
+# Import every tool now, so requests find them loaded. findFiles first: its logging setup is what
+# the daemon itself uses, as when running dirFileActions.py.
+import findFiles
+import renameFiles
+import dirFileActions
+import lib_undo
+
+MODULES = {'findFiles': findFiles, 'renameFiles': renameFiles, 'dirFileActions': dirFileActions,
+           'lib_undo': lib_undo}
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+REQUEST_TIMEOUT = 10
+STOP_SIGNALS = {signal.SIGINT, signal.SIGTERM}
+
+
+def _receive_request(conn):
+    """
+    Read one request line and the three stdio descriptors sent with it.
+    Returns:
+        tuple: (request dict, descriptors, bytes received after the request line).
+    """
+    data, fds, _, _ = socket.recv_fds(conn, 4096, 3)
+    if len(fds) != 3:
+        for fd in fds:
+            os.close(fd)
+        raise ValueError("expected stdin, stdout and stderr descriptors")
+    while b'\n' not in data:
+        if len(data) > MAX_REQUEST_BYTES:
+            raise ValueError("request too large")
+        chunk = conn.recv(65536)
+        if not chunk:
+            raise ValueError("incomplete request")
+        data += chunk
+    line, rest = data.split(b'\n', 1)
+    return json.loads(line), fds, rest
+
+
+def _forward_signals(conn, buffered, finished):
+    """
+    In the child, on a thread: deliver the signals the client forwards ({"signal": N} lines) to this
+    process, and hang up (SIGHUP) if the client goes away before the tool has finished.
+    """
+    data = buffered
+    while True:
+        while b'\n' in data:
+            line, data = data.split(b'\n', 1)
+            try:
+                os.kill(os.getpid(), int(json.loads(line)['signal']))
+            except (ValueError, KeyError, TypeError):
+                pass
+        try:
+            chunk = conn.recv(4096)
+        except OSError:
+            chunk = b''
+        if not chunk:
+            if not finished.is_set():
+                os.kill(os.getpid(), signal.SIGHUP)
+            return
+        data += chunk
+
+
+def _run_request(conn, request, fds):
+    """In the forked child: become the client's process for one tool run. Returns the exit code."""
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    # Logging as the tool configures it when run as a script
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    module = MODULES[request['tool']]
+    if hasattr(module, 'LOGGING'):
+        setup_logging(**module.LOGGING)
+    sys.argv = [module.__file__] + request['argv']
+    try:
+        module.main()
+        code = 0
+    except SystemExit as exit:
+        code = exit_code(exit.code)
+    except KeyboardInterrupt:
+        code = 128 + signal.SIGINT
+    except BaseException as error:
+        logging.exception(f"{request['tool']} failed: {error}")
+        code = 1
+    # What the interpreter would do at exit: atexit handlers (log writer, --timings dumps), then flush
+    atexit._run_exitfuncs()
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except OSError:
+            pass
+    return code
+
+
+def _serve_connection(conn):
+    """In the forked child: check the peer, read its request and run it. Returns the exit status."""
+    if peer_uid(conn) != os.getuid():
+        log_error("Rejected connection from another user")
+        return 1
+    conn.settimeout(REQUEST_TIMEOUT)
+    try:
+        request, fds, rest = _receive_request(conn)
+    except (OSError, ValueError) as error:
+        log_error(f"Bad request: {error}")
+        return 1
+    conn.settimeout(None)
+    if request.get('tool') not in MODULES:
+        for fd in fds:
+            os.close(fd)
+        conn.sendall((json.dumps({'exit': 2, 'error': f"unknown tool {request.get('tool')!r}"}) + '\n').encode())
+        return 2
+    finished = threading.Event()
+    threading.Thread(target=_forward_signals, args=(conn, rest, finished), daemon=True).start()
+    code = _run_request(conn, request, fds)
+    finished.set()
+    conn.sendall((json.dumps({'exit': code}) + '\n').encode())
+    return code
+
+
+def _fork_connection(server, conn):
+    sys.stdout.flush()
+    sys.stderr.flush()
+    # A stop signal landing inside fork() would run its handler in an at-fork hook, which swallows
+    # the SystemExit: hold such signals until the fork is over
+    signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+    if os.fork() == 0:
+        code = 1
+        try:
+            server.close()
+            # Signals as in a script; SIGINT keeps the default KeyboardInterrupt handler
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGHUP, signal.SIG_DFL)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+            code = _serve_connection(conn)
+        finally:
+            os._exit(code)
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+
+
+def serve(socket_path=DEFAULT_SOCKET):
+    """Accept requests on socket_path until interrupted (SIGINT/SIGTERM). Removes the socket on exit."""
+    try:
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        probe.connect(socket_path)
+        probe.close()
+        raise RuntimeError(f"A daemon is already listening on {socket_path}")
+    except (FileNotFoundError, ConnectionRefusedError):
+        pass
+    if os.path.exists(socket_path):
+        os.remove(socket_path)  # left behind by a daemon that died
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    server.listen(128)
+    # Children report their exit code to the client directly; let the kernel reap them
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"fileDaemon: listening on {socket_path}", file=sys.stderr, flush=True)
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                _fork_connection(server, conn)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.remove(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve findFiles, renameFiles, dirFileActions and lib_undo "
+                                                 "to fileClient.py from a warm process.")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help=f"Unix socket to listen on (default: {DEFAULT_SOCKET}).")
+    args = parser.parse_args()
+    serve(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,38 +2,211 @@
 
 import argparse
 import os
-import fnmatch
 import logging
+import re
+import time
+from collections import OrderedDict
 
-from lib_logging import setup_logging, log_block, log_function
-setup_logging(level=logging.ERROR)
+from lib_logging import setup_logging, log_block, log_function, log_debug, log_error, \
+    TIMINGS, enable_timings, timed_block, timed_function
+# Also applied by fileDaemon.py to every findFiles request
+LOGGING = dict(level=logging.ERROR)
+setup_logging(**LOGGING)
 
 from lib_fileinput import get_file_paths_from_input
+from lib_dirindex import DirIndex
+from lib_patterns import compile_name_matcher, compile_patterns
+from lib_duplicates import find_duplicates
+from lib_grep import grep_files
+from lib_walk import DEFAULT_WORKERS, scan_dir, walk_entries
+from lib_inotify import Inotify, IN_CREATE, IN_MOVED_TO, IN_ONLYDIR, IN_DONT_FOLLOW, IN_ISDIR, IN_Q_OVERFLOW
+
+SIZE_UNITS = {'': 1, 'c': 1, 'k': 1024, 'm': 1024**2, 'g': 1024**3, 't': 1024**4}
+AGE_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+FILE_TYPES = ('f', 'l', 'o')
+
+WATCH_MASK = IN_CREATE | IN_MOVED_TO | IN_ONLYDIR | IN_DONT_FOLLOW
+# How many recently reported paths watch_files remembers to suppress duplicate reports.
+WATCH_RECENT_PATHS = 65536
+
+
+def _parse_quantity(text, units, what):
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]?)\s*', str(text))
+    if not match or match.group(2).lower() not in units:
+        raise ValueError(f"Invalid {what}: {text!r} (expected a number with an optional unit from {sorted(units)})")
+    return float(match.group(1)) * units[match.group(2).lower()]
+
+
+def parse_size(text):
+    """Parse a size such as '512', '10k' or '1.5G' into bytes."""
+    return int(_parse_quantity(text, SIZE_UNITS, 'size'))
+
+
+def parse_age(text):
+    """Parse an age such as '90', '30m', '12h' or '7d' into seconds."""
+    return _parse_quantity(text, AGE_UNITS, 'age')
+
+
+def build_entry_filter(min_size=None, max_size=None, min_age=None, max_age=None, file_type=None,
+                       follow_symlinks=False, now=None):
+    """
+    Builds a predicate on os.DirEntry objects for size, age and type, like find -size/-mtime/-type.
+    The type test uses the d_type that scandir already returned; size and age share a single
+    cached DirEntry.stat() call, so each entry costs at most one stat syscall.
+
+    :param min_size: Minimum size in bytes (inclusive).
+    :param max_size: Maximum size in bytes (inclusive).
+    :param min_age: Minimum seconds since last modification (older than).
+    :param max_age: Maximum seconds since last modification (newer than).
+    :param file_type: 'f' regular file, 'l' symlink, 'o' anything else (fifo, socket, device).
+    :param follow_symlinks: Evaluate type, size and age of a symlink's target instead of the link itself;
+                            cannot be combined with file_type 'l'.
+    :param now: Reference time for ages; defaults to the time the filter is built.
+    :return: Predicate taking a DirEntry, or None if no criteria were given.
+    """
+    if file_type is not None and file_type not in FILE_TYPES:
+        raise ValueError(f"Invalid file type: {file_type!r} (expected one of {FILE_TYPES})")
+    if file_type == 'l' and follow_symlinks:
+        # Followed links are typed by their targets, so nothing would ever match
+        raise ValueError("File type 'l' (symlink) cannot be combined with follow_symlinks")
+    needs_stat = any(v is not None for v in (min_size, max_size, min_age, max_age))
+    if file_type is None and not needs_stat:
+        return None
+
+    now = time.time() if now is None else now
+    # Ages become absolute mtime bounds so the per-entry test is a plain comparison.
+    newest_mtime = now - min_age if min_age is not None else None
+    oldest_mtime = now - max_age if max_age is not None else None
+
+    def entry_filter(entry):
+        try:
+            if file_type is not None:
+                if file_type == 'l':
+                    if not entry.is_symlink():
+                        return False
+                else:
+                    is_regular = entry.is_file(follow_symlinks=follow_symlinks)
+                    if (file_type == 'f') != is_regular:
+                        return False
+                    if file_type == 'o' and not follow_symlinks and entry.is_symlink():
+                        return False
+            if needs_stat:
+                st = entry.stat(follow_symlinks=follow_symlinks)
+                if min_size is not None and st.st_size < min_size:
+                    return False
+                if max_size is not None and st.st_size > max_size:
+                    return False
+                if newest_mtime is not None and st.st_mtime > newest_mtime:
+                    return False
+                if oldest_mtime is not None and st.st_mtime < oldest_mtime:
+                    return False
+        except OSError:
+            # Broken symlinks and entries removed mid-walk never match.
+            return False
+        return True
+
+    return entry_filter
+
+
+def find_entries(directory, file_pattern, recursive=False, workers=DEFAULT_WORKERS, ordered=False,
+                 include=None, exclude=None, prune_dirs=None, entry_filter=None, cancel=None):
+    """
+    Same search as find_files, but yields the os.DirEntry objects so callers can reuse their cached stat.
+    Name patterns are tested first; entry_filter (see build_entry_filter) only runs on name matches.
+    """
+    matches = compile_name_matcher([file_pattern] + list(include or []), exclude)
+    prune = compile_patterns(prune_dirs)
+    if TIMINGS.enabled:
+        # Only wrap the per-entry predicates when timing, so the default path pays nothing.
+        matches = timed_function(matches, name="match")
+        entry_filter = entry_filter and timed_function(entry_filter, name="entry_filter")
+    for entry in walk_entries(directory, recursive, workers, ordered, prune, cancel):
+        if matches(entry.name) and (entry_filter is None or entry_filter(entry)):
+            yield entry
 
 
 @log_function
-def find_files(directory, file_pattern, recursive=False):
+def find_files(directory, file_pattern, recursive=False, workers=DEFAULT_WORKERS, ordered=False,
+               include=None, exclude=None, prune_dirs=None, entry_filter=None, cancel=None):
     """
     Searches for files where the filename exactly matches the given pattern.
+    All patterns are compiled once into a single matcher before the walk starts.
 
     :param directory: The directory to search in.
     :param file_pattern: The complete filename pattern to match.
     :param recursive: Whether to search recursively in subdirectories.
+    :param workers: Number of directories listed concurrently when searching recursively.
+    :param ordered: Yield paths in a deterministic, name-sorted depth-first order.
+    :param include: Additional filename patterns; a file matching any of them (or file_pattern) is included.
+    :param exclude: Filename patterns that reject an otherwise included file.
+    :param prune_dirs: Directory name patterns (e.g. '.git', 'node_modules') whose subtrees are never entered.
+    :param entry_filter: Optional metadata predicate on os.DirEntry, see build_entry_filter.
+    :param cancel: Optional threading.Event that stops the walk from another thread, see walk_entries.
     :return: Generator yielding file paths with filenames matching the pattern.
     """
+    for entry in find_entries(directory, file_pattern, recursive, workers, ordered,
+                              include, exclude, prune_dirs, entry_filter, cancel):
+        yield entry.path
 
-    # print(f"Searching in: {directory} for pattern: {file_pattern}")
-    if recursive:
-        for root, dirs, files in os.walk(directory):
-            # print(f"Checking directory: {root}")
-            for filename in files:
-                if fnmatch.fnmatch(filename, file_pattern):
-                    yield os.path.join(root, filename)
-    else:
-        for filename in os.listdir(directory):
-            # print(f"Checking file: {filename}")
-            if fnmatch.fnmatch(filename, file_pattern):
-                yield os.path.join(directory, filename)
+
+def watch_files(directory, file_pattern, recursive=False, include=None, exclude=None, prune_dirs=None):
+    """
+    Yields every file matching the pattern, then keeps yielding files created in or renamed into the tree,
+    as reported by inotify, instead of re-walking it. Runs until the generator is closed.
+    Each directory is watched before it is listed, so files created during the initial scan are not
+    missed (but may occasionally be reported twice). New subdirectories are watched and scanned as they appear.
+
+    :param directory: The directory to watch.
+    :param file_pattern: The complete filename pattern to match.
+    :param recursive: Whether to watch subdirectories too.
+    :param include: Additional filename patterns; a file matching any of them (or file_pattern) is included.
+    :param exclude: Filename patterns that reject an otherwise included file.
+    :param prune_dirs: Directory name patterns whose subtrees are neither scanned nor watched.
+    :return: Generator yielding file paths. Raises OSError if inotify is unavailable.
+    """
+    matches = compile_name_matcher([file_pattern] + list(include or []), exclude)
+    prune = compile_patterns(prune_dirs)
+    recent = OrderedDict()
+
+    def is_new(path):
+        if path in recent:
+            return False
+        recent[path] = None
+        if len(recent) > WATCH_RECENT_PATHS:
+            recent.popitem(last=False)
+        return True
+
+    with Inotify() as watcher:
+        def watch_and_scan(root):
+            pending = [root]
+            while pending:
+                path = pending.pop()
+                try:
+                    watcher.add_watch(path, WATCH_MASK)
+                except OSError as error:
+                    log_debug(f"Cannot watch directory {path}: {error}")
+                    continue
+                files, subdirs = scan_dir(path, prune)
+                for entry in files:
+                    if matches(entry.name):
+                        yield entry.path
+                if recursive:
+                    pending.extend(entry.path for entry in subdirs)
+
+        yield from watch_and_scan(directory)
+        while True:
+            for event in watcher.read_events():
+                if event.mask & IN_Q_OVERFLOW:
+                    log_error("inotify queue overflowed; some new files were not reported.")
+                elif not event.mask & (IN_CREATE | IN_MOVED_TO) or not event.name:
+                    continue
+                elif event.mask & IN_ISDIR:
+                    if recursive and not (prune and prune(event.name)):
+                        for path in watch_and_scan(event.path):
+                            if is_new(path):
+                                yield path
+                elif matches(event.name) and is_new(event.path):
+                    yield event.path
 
 
 def main():
@@ -42,14 +215,93 @@ def main():
     parser.add_argument('directory', nargs='?', default=os.getcwd(),
                         help='Optional directory to start searching from. Defaults to the current directory if not specified.')
     parser.add_argument('-r', '--recursive', action='store_true', help='Search recursively.')
+    parser.add_argument('-j', '--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Number of directories to list in parallel (default: {DEFAULT_WORKERS}).')
+    parser.add_argument('-s', '--sorted', action='store_true', help='Print results in a deterministic, sorted order.')
+    parser.add_argument('-i', '--include', action='append', default=[], metavar='PATTERN',
+                        help='Also match files against this pattern. May be repeated.')
+    parser.add_argument('-x', '--exclude', action='append', default=[], metavar='PATTERN',
+                        help='Skip files matching this pattern. May be repeated.')
+    parser.add_argument('-P', '--prune-dir', action='append', default=[], metavar='PATTERN',
+                        help='Never descend into directories matching this pattern (e.g. .git). May be repeated.')
+    parser.add_argument('--min-size', type=parse_size, metavar='SIZE', help='Only files at least this big (e.g. 10k, 1.5G).')
+    parser.add_argument('--max-size', type=parse_size, metavar='SIZE', help='Only files at most this big.')
+    parser.add_argument('--min-age', type=parse_age, metavar='AGE',
+                        help='Only files modified at least this long ago (e.g. 90s, 30m, 12h, 7d).')
+    parser.add_argument('--max-age', type=parse_age, metavar='AGE', help='Only files modified at most this long ago.')
+    parser.add_argument('-t', '--type', choices=FILE_TYPES,
+                        help="Only entries of this type: f (regular file), l (symlink), o (other).")
+    parser.add_argument('-L', '--follow-symlinks', action='store_true',
+                        help='Test the type, size and age of symlink targets rather than the links themselves.')
+    parser.add_argument('-g', '--grep', metavar='REGEX',
+                        help='Only report files whose contents match this regular expression, with the matching lines.')
+    parser.add_argument('-F', '--fixed-strings', action='store_true', help='Treat the --grep pattern as a literal string.')
+    parser.add_argument('--ignore-case', action='store_true', help='Match the --grep pattern case-insensitively.')
+    parser.add_argument('-l', '--files-with-matches', action='store_true',
+                        help='With --grep, print only the names of matching files.')
+    parser.add_argument('--duplicates', action='store_true',
+                        help='Print groups of matching files with identical content, separated by blank lines.')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='After the initial search, keep printing newly created or renamed matching files (Linux inotify).')
+    parser.add_argument('--index', metavar='DB',
+                        help='Answer from a persistent directory index, re-listing only directories whose mtime changed.')
+    parser.add_argument('-0', '--print0', action='store_true',
+                        help='Terminate each printed path with NUL instead of newline (pairs with renameFiles.py -0).')
+    parser.add_argument('--timings', metavar='FILE',
+                        help='Write per-function wall/CPU time, call counts and latency histograms as JSON on exit.')
+    parser.add_argument('--trace', metavar='FILE', help='Write a Chrome trace-event file (chrome://tracing) on exit.')
     args = parser.parse_args()
+    if args.timings or args.trace:
+        enable_timings(args.timings, args.trace)
+
+    if args.type == 'l' and args.follow_symlinks:
+        parser.error("-t l cannot be combined with -L/--follow-symlinks, which tests the links' targets.")
+    entry_filter = build_entry_filter(args.min_size, args.max_size, args.min_age, args.max_age,
+                                      args.type, args.follow_symlinks)
+    if args.index and (entry_filter or args.duplicates):
+        parser.error("--index cannot be combined with size, age or type filters or --duplicates.")
+    if args.grep and args.duplicates:
+        parser.error("--grep and --duplicates are mutually exclusive.")
+    if args.grep and args.index:
+        parser.error("--grep cannot be combined with --index.")
+    if args.watch and (entry_filter or args.grep or args.duplicates or args.index):
+        parser.error("--watch only supports name patterns (-i, -x, -P).")
 
-    with log_block("find_files"):
-        for file_path in find_files(args.directory, args.pattern, args.recursive):
-            print(file_path)
+    end = '\0' if args.print0 else '\n'
+    with log_block("find_files"), timed_block("find_files"):
+        if args.watch:
+            try:
+                for file_path in watch_files(args.directory, args.pattern, args.recursive,
+                                             args.include, args.exclude, args.prune_dir):
+                    print(file_path, end=end, flush=True)
+            except KeyboardInterrupt:
+                pass
+        elif args.duplicates:
+            entries = find_entries(args.directory, args.pattern, args.recursive, args.workers, False,
+                                   args.include, args.exclude, args.prune_dir, entry_filter)
+            for number, group in enumerate(find_duplicates(entries, args.workers)):
+                if number:
+                    print(end=end)
+                for file_path in group:
+                    print(file_path, end=end)
+        elif args.grep:
+            paths = find_files(args.directory, args.pattern, args.recursive, args.workers, args.sorted,
+                               args.include, args.exclude, args.prune_dir, entry_filter)
+            for file_path, line_number, line in grep_files(paths, args.grep, args.fixed_strings, args.ignore_case,
+                                                           args.files_with_matches):
+                print(file_path if line_number is None else f"{file_path}:{line_number}:{line}", end=end)
+        elif args.index:
+            with DirIndex(args.index, args.workers) as index:
+                results = index.find_files(args.directory, args.pattern, args.recursive,
+                                           args.include, args.exclude, args.prune_dir)
+                for file_path in (sorted(results) if args.sorted else results):
+                    print(file_path, end=end)
+        else:
+            for file_path in find_files(args.directory, args.pattern, args.recursive, args.workers, args.sorted,
+                                        args.include, args.exclude, args.prune_dir, entry_filter):
+                print(file_path, end=end)
 
 
 if __name__ == "__main__":
     main()
 
-
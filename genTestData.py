@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+genTestData.py
+--------------
+
+Generates synthetic directory trees for tests and benchmarks, offline and reproducibly.
+
+The same TreeSpec (including its seed) always produces the same directories, names and file
+sizes: every directory draws from its own random generator seeded with (seed, relative path),
+so the result does not depend on how many worker threads build the tree or in which order.
+Directories are built concurrently and iteratively, so trees with millions of files are fine.
+
+Shape and content are configurable:
+    depth, fan_out          levels of subdirectories, and (min, max) subdirectories per directory
+    files_per_dir           (min, max) files in every directory, including the root
+    sizes                   'empty', 'fixed:SIZE', 'uniform:MIN-MAX' or 'lognormal:MEDIAN,SIGMA'
+                            (sizes as for findFiles --min-size, e.g. 4k, 1.5M)
+    fill                    'sparse' (ftruncate, no data written), 'zero' or 'random' bytes
+    vocabulary, words_per_name
+                            names join (min, max) words from a seeded vocabulary of that many
+                            words; a small vocabulary gives many similar names (low entropy)
+    extensions              file extensions to pick from
+
+Example:
+    genTestData.py /tmp/tree --depth 4 --fan-out 2-10 --files 50-200 --sizes lognormal:8k,1.5 --seed 7
+"""
+
+import argparse
+import math
+import os
+import random
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from findFiles import parse_size
+from lib_walk import DEFAULT_WORKERS
+
+SIZE_DISTRIBUTIONS = ('empty', 'fixed', 'uniform', 'lognormal')
+FILL_MODES = ('sparse', 'zero', 'random')
+_CONSONANTS = 'bcdfghjklmnprstvwz'
+_VOWELS = 'aeiou'
+_WRITE_CHUNK = 1024 * 1024
+
+TreeSpec = namedtuple('TreeSpec', ['seed', 'depth', 'fan_out', 'files_per_dir', 'sizes', 'fill', 'vocabulary',
+                                   'words_per_name', 'extensions'],
+                      defaults=[0, 3, (1, 4), (1, 5), 'empty', 'sparse', 2000, (1, 3), ('.txt', '.doc', '.mp4')])
+TreeSpec.__doc__ = "Shape and content of a generated tree; see the module docstring."
+
+TreeStats = namedtuple('TreeStats', ['dirs', 'files', 'bytes'])
+
+
+def build_vocabulary(seed, size):
+    """Return `size` distinct pronounceable words of 1-3 syllables, the same for the same seed."""
+    rng = random.Random(f"{seed}/vocabulary")
+    words = set()
+    # The syllable space (90 syllables, 1-3 each) holds about 737k words
+    size = min(size, 700000)
+    while len(words) < size:
+        words.add(''.join(rng.choice(_CONSONANTS) + rng.choice(_VOWELS) for _ in range(rng.randint(1, 3))))
+    return sorted(words)
+
+
+def size_sampler(spec):
+    """
+    Parse a size distribution such as 'fixed:4k', 'uniform:0-1M' or 'lognormal:8k,1.5'.
+    Returns:
+        function: Draws a file size in bytes from a random.Random.
+    """
+    kind, _, params = spec.partition(':')
+    if kind == 'empty':
+        return lambda rng: 0
+    if kind == 'fixed':
+        size = parse_size(params)
+        return lambda rng: size
+    if kind == 'uniform':
+        low, _, high = params.partition('-')
+        low, high = parse_size(low), parse_size(high)
+        return lambda rng: rng.randint(low, high)
+    if kind == 'lognormal':
+        median, _, sigma = params.partition(',')
+        mu, sigma = math.log(max(parse_size(median), 1)), float(sigma or 1.0)
+        return lambda rng: int(rng.lognormvariate(mu, sigma))
+    raise ValueError(f"Invalid size distribution: {spec!r} (expected one of {SIZE_DISTRIBUTIONS})")
+
+
+def _write_file(path, size, fill, rng):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    try:
+        if fill == 'sparse':
+            os.ftruncate(fd, size)
+            return
+        remaining = size
+        zeros = bytes(min(size, _WRITE_CHUNK)) if fill == 'zero' else None
+        while remaining:
+            n = min(remaining, _WRITE_CHUNK)
+            os.write(fd, zeros[:n] if zeros is not None else rng.randbytes(n))
+            remaining -= n
+    finally:
+        os.close(fd)
+
+
+def _unique_name(rng, vocabulary, words_per_name, taken, extension=''):
+    name = ''.join(rng.choices(vocabulary, k=rng.randint(*words_per_name)))
+    candidate, number = name + extension, 1
+    while candidate in taken:
+        number += 1
+        candidate = f"{name}_{number}{extension}"
+    taken.add(candidate)
+    return candidate
+
+
+def _make_dir(root, relpath, level, spec, vocabulary, sample_size):
+    """Fill one directory with its files and create its subdirectories. Returns (files, bytes, subdir relpaths)."""
+    rng = random.Random(f"{spec.seed}/{relpath}")
+    directory = os.path.join(root, relpath)
+    taken = set()
+    total = 0
+    file_count = rng.randint(*spec.files_per_dir)
+    for _ in range(file_count):
+        name = _unique_name(rng, vocabulary, spec.words_per_name, taken, rng.choice(spec.extensions))
+        size = sample_size(rng)
+        _write_file(os.path.join(directory, name), size, spec.fill, rng)
+        total += size
+    subdirs = []
+    if level < spec.depth:
+        for _ in range(rng.randint(*spec.fan_out)):
+            name = _unique_name(rng, vocabulary, spec.words_per_name, taken)
+            os.mkdir(os.path.join(directory, name))
+            subdirs.append(os.path.join(relpath, name) if relpath else name)
+    return file_count, total, subdirs
+
+
+def generate_tree(root, spec=TreeSpec(), workers=DEFAULT_WORKERS):
+    """
+    Create the tree described by `spec` under `root` (created if missing; must not contain the tree yet).
+    Args:
+        root (str): Directory to fill.
+        spec (TreeSpec): Shape, sizes, names and seed.
+        workers (int): Directories filled concurrently; does not change the result.
+    Returns:
+        TreeStats: Number of directories (including root), files and bytes created.
+    """
+    if spec.fill not in FILL_MODES:
+        raise ValueError(f"Invalid fill mode: {spec.fill!r} (expected one of {FILL_MODES})")
+    os.makedirs(root, exist_ok=True)
+    vocabulary = build_vocabulary(spec.seed, spec.vocabulary)
+    sample_size = size_sampler(spec.sizes)
+    dirs = files = total = 0
+    # Bounded number of queued directories, as in lib_walk._walk_unordered
+    max_in_flight = max(1, workers) * 2
+    pending = deque([('', 0)])
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="genTestData") as executor:
+        while pending or in_flight:
+            while pending and len(in_flight) < max_in_flight:
+                relpath, level = pending.popleft()
+                future = executor.submit(_make_dir, root, relpath, level, spec, vocabulary, sample_size)
+                in_flight[future] = level
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                level = in_flight.pop(future)
+                file_count, size, subdirs = future.result()
+                dirs += 1
+                files += file_count
+                total += size
+                pending.extend((subdir, level + 1) for subdir in subdirs)
+    return TreeStats(dirs, files, total)
+
+
+def _range(text):
+    low, _, high = text.partition('-')
+    return int(low), int(high or low)
+
+
+def add_spec_arguments(parser, defaults=TreeSpec()):
+    """Add the TreeSpec options to an argparse parser; read them back with spec_from_args."""
+    parser.add_argument('--seed', type=int, default=defaults.seed, help="Random seed; the same seed gives the same tree.")
+    parser.add_argument('--depth', type=int, default=defaults.depth, help="Levels of subdirectories below the root.")
+    parser.add_argument('--fan-out', type=_range, default=defaults.fan_out, metavar='MIN-MAX',
+                        help="Subdirectories per directory (e.g. 2-10, or 5).")
+    parser.add_argument('--files', type=_range, default=defaults.files_per_dir, metavar='MIN-MAX',
+                        help="Files per directory.")
+    parser.add_argument('--sizes', default=defaults.sizes,
+                        help="Size distribution: empty, fixed:SIZE, uniform:MIN-MAX or lognormal:MEDIAN,SIGMA.")
+    parser.add_argument('--fill', choices=FILL_MODES, default=defaults.fill, help="How file contents are written.")
+    parser.add_argument('--vocabulary', type=int, default=defaults.vocabulary,
+                        help="Number of distinct words names are made of.")
+    parser.add_argument('--words', type=_range, default=defaults.words_per_name, metavar='MIN-MAX',
+                        help="Words per name.")
+    parser.add_argument('--extensions', default=','.join(defaults.extensions), help="Comma-separated file extensions.")
+
+
+def spec_from_args(args):
+    return TreeSpec(args.seed, args.depth, args.fan_out, args.files, args.sizes, args.fill, args.vocabulary,
+                    args.words, tuple(args.extensions.split(',')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a reproducible synthetic directory tree.")
+    parser.add_argument('root', help="Directory to create the tree in.")
+    add_spec_arguments(parser)
+    parser.add_argument('-j', '--workers', type=int, default=DEFAULT_WORKERS, help="Directories filled concurrently.")
+    args = parser.parse_args()
+
+    stats = generate_tree(args.root, spec_from_args(args), args.workers)
+    print(f"{stats.dirs} directories, {stats.files} files, {stats.bytes} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+lib_async.py
+------------
+
+asyncio counterparts of the search and file actions, for use from an event loop:
+
+    find_files          async generator over findFiles.find_files
+    copy_files, move_files, delete_files
+                        awaitables running the dirFileActions functions
+    perform_rename      awaitable running renameFiles.perform_rename
+
+Blocking work runs on a thread pool, never on the event loop. Actions go through an
+asyncio.Semaphore, so at most `max_concurrent` of them run at once; each action still uses its
+own `workers` threads internally (see lib_scheduler). A search runs on a thread of its own and
+hands results over in batches through a bounded queue: a slow consumer pauses the walk instead
+of buffering the whole tree, and leaving the `async for` early stops it.
+
+Cancelling an awaited action stops the wait, not the thread: the operation runs to completion.
+
+Example:
+    async with AsyncFileActions(max_concurrent=4) as actions:
+        paths = [path async for path in actions.find_files(root, '*.log', recursive=True)]
+        stats = await actions.move_files(paths, archive)
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# dirFileActions and findFiles set up logging when imported, as they do when run as scripts
+import dirFileActions
+import findFiles
+import renameFiles
+
+DEFAULT_CONCURRENCY = 4
+# Results handed from the search thread to the event loop at a time, and how long a partial batch may wait.
+SEARCH_BATCH = 256
+SEARCH_BATCH_SECONDS = 0.05
+# Batches buffered between the search thread and a slow consumer.
+SEARCH_QUEUE_BATCHES = 16
+
+_DONE = object()
+_LOOP_EXECUTOR = object()
+
+
+class AsyncFileActions:
+    """
+    Event-loop friendly front end to the file actions and search, with a shared concurrency limit.
+    Args:
+        max_concurrent (int): Actions (copy/move/delete/rename calls) running at the same time.
+        executor (Executor): Thread pool for the actions; a private one is created (and shut down by
+                             close) if omitted.
+    """
+
+    def __init__(self, max_concurrent=DEFAULT_CONCURRENCY, executor=None):
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._owns_executor = executor is None
+        if executor is _LOOP_EXECUTOR:
+            # The event loop's default executor, shut down by asyncio.run with the loop
+            self._executor = None
+        else:
+            self._executor = executor or ThreadPoolExecutor(max_workers=max_concurrent,
+                                                            thread_name_prefix="lib_async")
+
+    async def _run(self, func, *args, **kwargs):
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def copy_files(self, file_paths, destination, **kwargs):
+        """Await dirFileActions.copy_files (same keyword arguments). Returns CopyStats."""
+        return await self._run(dirFileActions.copy_files, list(file_paths), destination, **kwargs)
+
+    async def move_files(self, file_paths, destination, **kwargs):
+        """Await dirFileActions.move_files (same keyword arguments). Returns CopyStats."""
+        return await self._run(dirFileActions.move_files, list(file_paths), destination, **kwargs)
+
+    async def delete_files(self, file_paths, recursive=False, **kwargs):
+        """Await dirFileActions.delete_files (same keyword arguments). Returns DeleteStats."""
+        return await self._run(dirFileActions.delete_files, list(file_paths), recursive, **kwargs)
+
+    async def perform_rename(self, old_path, new_path, dry_run=False):
+        """Await renameFiles.perform_rename. Returns True if the file was renamed."""
+        return await self._run(renameFiles.perform_rename, old_path, new_path, dry_run=dry_run)
+
+    def find_files(self, directory, file_pattern, **kwargs):
+        """Async generator over findFiles.find_files (same keyword arguments); see find_files below."""
+        return find_files(directory, file_pattern, **kwargs)
+
+    def close(self):
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+async def find_files(directory, file_pattern, recursive=False, **kwargs):
+    """
+    Async generator yielding the paths findFiles.find_files finds (same arguments), while the
+    walk runs on a separate thread. Paths arrive in batches of up to SEARCH_BATCH, and no later than
+    SEARCH_BATCH_SECONDS after they were found; the walk pauses while SEARCH_QUEUE_BATCHES batches
+    are waiting. Leaving the `async for` stops the walk before it lists another directory.
+    """
+    loop = asyncio.get_running_loop()
+    results = asyncio.Queue(maxsize=SEARCH_QUEUE_BATCHES)
+    stop = threading.Event()
+    finished = loop.create_future()
+    # Paths found but not handed over yet, and batches handed over but not taken yet. The consumer
+    # only takes `pending` itself when no batch is queued, so paths keep the walk's order.
+    lock = threading.Lock()
+    pending, queued = [], 0
+
+    def hand_over(item):
+        # Blocks the search thread while the queue is full
+        asyncio.run_coroutine_threadsafe(results.put(item), loop).result()
+
+    def take_pending():
+        nonlocal pending, queued
+        batch, pending = pending, []
+        queued += 1
+        return batch
+
+    def search():
+        try:
+            for path in findFiles.find_files(directory, file_pattern, recursive, cancel=stop, **kwargs):
+                if stop.is_set():
+                    return
+                with lock:
+                    pending.append(path)
+                    batch = take_pending() if len(pending) >= SEARCH_BATCH else None
+                if batch:
+                    hand_over(batch)
+            if not stop.is_set():
+                with lock:
+                    batch = take_pending()
+                hand_over(batch)
+                hand_over(_DONE)
+        except BaseException as error:
+            if not stop.is_set():
+                hand_over(error)
+        finally:
+            loop.call_soon_threadsafe(finished.set_result, None)
+
+    threading.Thread(target=search, name="lib_async-find", daemon=True).start()
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(results.get(), SEARCH_BATCH_SECONDS)
+            except asyncio.TimeoutError:
+                # Nothing handed over for a while: take what a slow walk has found so far
+                with lock:
+                    if queued or not pending:
+                        continue
+                    item, pending = pending, []
+            else:
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                with lock:
+                    queued -= 1
+            for path in item:
+                yield path
+    finally:
+        stop.set()
+        # Unblock a search thread waiting for room in the queue, then let it finish
+        while not finished.done():
+            while not results.empty():
+                results.get_nowait()
+            await asyncio.wait([finished], timeout=SEARCH_BATCH_SECONDS)
+
+
+# One per event loop: an asyncio.Semaphore must not be shared between loops
+_default_actions = weakref.WeakKeyDictionary()
+
+
+def default_actions():
+    """
+    The AsyncFileActions used by the module-level functions in the running event loop, created on
+    first use. It runs on the loop's default executor, so nothing is left to shut down.
+    """
+    loop = asyncio.get_running_loop()
+    actions = _default_actions.get(loop)
+    if actions is None:
+        actions = _default_actions[loop] = AsyncFileActions(executor=_LOOP_EXECUTOR)
+    return actions
+
+
+async def copy_files(file_paths, destination, **kwargs):
+    return await default_actions().copy_files(file_paths, destination, **kwargs)
+
+
+async def move_files(file_paths, destination, **kwargs):
+    return await default_actions().move_files(file_paths, destination, **kwargs)
+
+
+async def delete_files(file_paths, recursive=False, **kwargs):
+    return await default_actions().delete_files(file_paths, recursive, **kwargs)
+
+
+async def perform_rename(old_path, new_path, dry_run=False):
+    return await default_actions().perform_rename(old_path, new_path, dry_run)
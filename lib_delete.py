@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+lib_delete.py
+-------------
+
+Parallel bulk deletion of files and whole directory trees.
+
+Each directory is opened once, relative to its parent's descriptor (openat with O_NOFOLLOW), and
+its entries are unlinked and its subdirectories removed relative to its own descriptor (unlinkat),
+like shutil.rmtree: no path is resolved more than once, and replacing a directory with a symlink
+during the delete cannot redirect it outside the tree. Large directories are split into chunks that
+are unlinked concurrently, subdirectories are emptied in parallel, and each directory is removed as
+soon as everything below it is gone (bottom-up). Symlinks are removed, never followed. Failures are
+collected per path and the rest of the run carries on.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from lib_logging import *
+from lib_walk import DEFAULT_WORKERS
+
+CHUNK_SIZE = 1024
+# Directories held open (by descriptor) at the same time, well below the usual limit of 1024 files.
+MAX_OPEN_DIRS = 256
+
+_DIR_FLAGS = os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0) | getattr(os, 'O_NOFOLLOW', 0)
+# dir_fd is only honoured where the platform supports it (not on Windows)
+_HAVE_DIR_FD = all(func in os.supports_dir_fd for func in (os.open, os.unlink, os.rmdir)) and os.scandir in os.supports_fd
+
+
+class DeleteStats:
+    """
+    Outcome of a bulk delete.
+    Attributes:
+        deleted (int): Files, links and directories removed.
+        failures (list): (path, OSError) for everything that could not be removed.
+    """
+
+    def __init__(self):
+        self.deleted = 0
+        self.failures = []
+        self.started = time.perf_counter()
+
+    def summary(self):
+        seconds = time.perf_counter() - self.started
+        rate = self.deleted / seconds if seconds > 0 else 0.0
+        return f"{self.deleted} deleted in {seconds:.3f}s ({rate:.0f}/s); {len(self.failures)} errors"
+
+
+class _Dir:
+    def __init__(self, path, parent):
+        self.path = path
+        self.parent = parent
+        self.fd = None
+        self.remaining = 1  # the listing itself, then one per chunk and subdirectory
+        self.failed = False
+
+
+def _open_dir(node):
+    # Below a root, open relative to the parent's descriptor: no path is resolved twice, and a parent
+    # swapped for a symlink mid-delete cannot redirect the rest of the walk.
+    if node.parent is None:
+        return os.open(node.path, _DIR_FLAGS)
+    return os.open(os.path.basename(node.path), _DIR_FLAGS, dir_fd=node.parent.fd)
+
+
+def _list_dir(node):
+    """Open a directory and split it into non-directory names and subdirectory names, without following symlinks."""
+    files, subdirs = [], []
+    if _HAVE_DIR_FD:
+        node.fd = _open_dir(node)
+    # scandir works on its own duplicate of the descriptor, which stays open for the unlinks
+    with os.scandir(node.path if node.fd is None else node.fd) as entries:
+        for entry in entries:
+            (subdirs if entry.is_dir(follow_symlinks=False) else files).append(entry.name)
+    return files, subdirs
+
+
+def _unlink_chunk(node, names):
+    """Unlink names inside one listed directory. Returns (count removed, failures)."""
+    removed, failures = 0, []
+    for name in names:
+        try:
+            if node.fd is None:
+                os.unlink(os.path.join(node.path, name))
+            else:
+                os.unlink(name, dir_fd=node.fd)
+            removed += 1
+        except OSError as error:
+            failures.append((os.path.join(node.path, name), error))
+    return removed, failures
+
+
+def _unlink_paths(paths):
+    removed, failures = 0, []
+    for path in paths:
+        try:
+            os.unlink(path)
+            removed += 1
+        except OSError as error:
+            failures.append((path, error))
+    return removed, failures
+
+
+def _rmdir(node):
+    try:
+        if node.parent is None or node.parent.fd is None:
+            os.rmdir(node.path)
+        else:
+            os.rmdir(os.path.basename(node.path), dir_fd=node.parent.fd)
+        return 1, []
+    except OSError as error:
+        return 0, [(node.path, error)]
+
+
+def delete_paths(paths, recursive=False, workers=DEFAULT_WORKERS, stats=None):
+    """
+    Delete files, and directory trees when `recursive` is set, on a thread pool.
+    Args:
+        paths (iterable): Files, symlinks or (with `recursive`) directories to delete; consumed as the
+                          files are unlinked.
+        recursive (bool): Remove directories and everything below them; otherwise directories are failures.
+        workers (int): Number of concurrent unlink/list/rmdir tasks.
+        stats (DeleteStats): Totals to update; a new one is created if omitted.
+    Returns:
+        DeleteStats: Count of removed entries and the per-path failures.
+    """
+    stats = stats or DeleteStats()
+    running = {}
+    # Directories waiting to be opened and listed (deepest last), roots not started yet, and
+    # directories holding a descriptor
+    waiting = []
+    roots = deque()
+    open_dirs = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="delete") as executor:
+        def close(node):
+            nonlocal open_dirs
+            if node.fd is not None:
+                os.close(node.fd)
+                node.fd = None
+            open_dirs -= 1
+
+        def finish(node):
+            # Called once nothing is left below `node`: remove it, unless a descendant could not be removed.
+            node.remaining -= 1
+            if node.remaining == 0:
+                close(node)
+                if node.failed:
+                    if node.parent:
+                        node.parent.failed = True
+                        finish(node.parent)
+                else:
+                    running[executor.submit(_rmdir, node)] = ('rmdir', node)
+
+        def open_more():
+            # A directory keeps its descriptor until its subtree is gone, so only MAX_OPEN_DIRS are
+            # opened at a time (depth first), unless nothing else is left to run.
+            nonlocal open_dirs
+            while (waiting or roots) and (open_dirs < MAX_OPEN_DIRS or not running):
+                node = waiting.pop() if waiting else roots.popleft()
+                open_dirs += 1
+                running[executor.submit(_list_dir, node)] = ('list', node)
+
+        def collect(future):
+            kind, node = running.pop(future)
+            if kind == 'list':
+                try:
+                    names, subdirs = future.result()
+                except OSError as error:
+                    stats.failures.append((node.path, error))
+                    node.failed = True
+                    finish(node)
+                    return
+                for start in range(0, len(names), CHUNK_SIZE):
+                    node.remaining += 1
+                    running[executor.submit(_unlink_chunk, node, names[start:start + CHUNK_SIZE])] = ('chunk', node)
+                for name in subdirs:
+                    node.remaining += 1
+                    waiting.append(_Dir(os.path.join(node.path, name), node))
+                finish(node)
+                return
+            removed, failures = future.result()
+            stats.deleted += removed
+            stats.failures.extend(failures)
+            if node is None:
+                return
+            if failures:
+                node.failed = True
+            if kind == 'rmdir':
+                if node.parent:
+                    if failures:
+                        node.parent.failed = True
+                    finish(node.parent)
+            else:
+                finish(node)
+
+        def collect_some():
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                collect(future)
+            open_more()
+
+        # Plain files are unlinked a chunk at a time while the rest of `paths` is still being read; reading
+        # pauses while the workers are busy, so queued work stays bounded however long the input is.
+        files = []
+
+        def submit_files():
+            nonlocal files
+            while len(running) >= max(1, workers) * 2:
+                collect_some()
+            running[executor.submit(_unlink_paths, files)] = ('files', None)
+            files = []
+
+        for path in paths:
+            if recursive and os.path.isdir(path) and not os.path.islink(path):
+                roots.append(_Dir(path, None))
+                continue
+            files.append(path)
+            if len(files) == CHUNK_SIZE:
+                submit_files()
+        if files:
+            submit_files()
+        open_more()
+
+        while running:
+            collect_some()
+
+    for path, error in stats.failures:
+        log_error(f"Error deleting {path}: {error}")
+    log_info(f"delete: {stats.summary()}")
+    return stats
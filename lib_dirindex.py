@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+lib_dirindex.py
+---------------
+
+A persistent, SQLite-backed index of directory listings used to answer repeated
+find queries without rescanning an unchanged tree.
+
+Every indexed directory is stored with its mtime and its entries. A directory's
+mtime changes whenever an entry is created, removed or renamed in it, so a
+refresh only has to stat each known directory and re-list the ones whose mtime
+moved. Directories modified within RACY_WINDOW_NS of being listed are stored
+without an mtime so that the next refresh always lists them again; otherwise a
+change landing in the same timestamp tick as the listing could be missed.
+
+Example:
+    with DirIndex('~/.cache/findFiles.db') as index:
+        for path in index.find_files('/data', '*.mp4', recursive=True):
+            print(path)
+"""
+
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from lib_logging import *
+from lib_patterns import compile_name_matcher, compile_patterns
+from lib_walk import DEFAULT_WORKERS
+
+# Entry kinds stored in entries.kind. Symlinked directories are neither listed as files nor followed.
+KIND_FILE, KIND_DIR, KIND_LINKED_DIR = 0, 1, 2
+
+# Coarsest directory timestamp granularity we expect (FAT, some NFS servers).
+RACY_WINDOW_NS = 2 * 10**9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path     TEXT PRIMARY KEY,
+    mtime_ns INTEGER
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS entries (
+    dir    TEXT NOT NULL,
+    name   TEXT NOT NULL,
+    kind   INTEGER NOT NULL,
+    PRIMARY KEY (dir, name)
+) WITHOUT ROWID;
+"""
+
+
+def _subtree_bounds(path):
+    """Return (low, high) so that low <= p < high selects every path strictly below `path`."""
+    prefix = path if path.endswith(os.sep) else path + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+def _refresh_dir(path, cached_mtime_ns):
+    """
+    Stat a directory and list it again only if its mtime differs from the cached one.
+    Runs on worker threads; touches the filesystem only, never the database.
+
+    Returns:
+        tuple: (mtime_ns to store, list of (name, kind) or None if unchanged), or None if the
+               directory vanished or cannot be read. mtime_ns is None if the directory was
+               modified too recently to trust.
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if cached_mtime_ns is not None and mtime_ns == cached_mtime_ns:
+        return mtime_ns, None
+
+    listed_at = time.time_ns()
+    listing = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if not entry.is_dir():
+                        kind = KIND_FILE
+                    else:
+                        kind = KIND_LINKED_DIR if entry.is_symlink() else KIND_DIR
+                except OSError:
+                    kind = KIND_FILE
+                listing.append((entry.name, kind))
+    except OSError as error:
+        log_debug(f"Cannot scan directory {path}: {error}")
+        return None
+    if mtime_ns >= listed_at - RACY_WINDOW_NS:
+        mtime_ns = None
+    return mtime_ns, listing
+
+
+class DirIndex:
+    """
+    Persistent directory index stored in a single SQLite file.
+
+    Args:
+        index_path (str): Location of the index database; created if missing.
+        workers (int): Number of directories stat'ed/listed concurrently during a refresh.
+    """
+
+    def __init__(self, index_path, workers=DEFAULT_WORKERS):
+        self.index_path = os.path.expanduser(index_path)
+        self.workers = max(1, workers)
+        self.conn = sqlite3.connect(self.index_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _cached_mtimes(self, root, recursive):
+        rows = self.conn.execute("SELECT path, mtime_ns FROM dirs WHERE path = ?", (root,)).fetchall()
+        if recursive:
+            low, high = _subtree_bounds(root)
+            rows += self.conn.execute(
+                "SELECT path, mtime_ns FROM dirs WHERE path >= ? AND path < ?", (low, high)).fetchall()
+        return dict(rows)
+
+    def _forget(self, path):
+        """Drop a directory and everything indexed below it."""
+        low, high = _subtree_bounds(path)
+        self.conn.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (path, low, high))
+        self.conn.execute("DELETE FROM entries WHERE dir = ? OR (dir >= ? AND dir < ?)", (path, low, high))
+
+    def _store(self, path, mtime_ns, listing):
+        """Replace the indexed listing of `path`, forgetting subdirectories that disappeared."""
+        old_dirs = {name for (name,) in self.conn.execute(
+            "SELECT name FROM entries WHERE dir = ? AND kind = ?", (path, KIND_DIR))}
+        new_dirs = {name for name, kind in listing if kind == KIND_DIR}
+        for name in old_dirs - new_dirs:
+            self._forget(os.path.join(path, name))
+        self.conn.execute("DELETE FROM entries WHERE dir = ?", (path,))
+        self.conn.executemany("INSERT INTO entries (dir, name, kind) VALUES (?, ?, ?)",
+                              ((path, name, kind) for name, kind in listing))
+        self.conn.execute("INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)", (path, mtime_ns))
+
+    def _cached_listing(self, path):
+        return self.conn.execute("SELECT name, kind FROM entries WHERE dir = ?", (path,)).fetchall()
+
+    def walk(self, directory, recursive=False, prune=None):
+        """
+        Refresh the index below `directory` and yield the listing of every directory visited.
+        Only directories whose mtime changed since the last refresh are read from disk.
+
+        Args:
+            directory (str): Root of the walk.
+            recursive (bool): Whether to descend into subdirectories.
+            prune (function): Optional predicate on a subdirectory name; matching subdirectories are not visited.
+        Yields:
+            tuple: (absolute directory path, list of (name, kind)), kind being one of the KIND_* constants.
+        """
+        root = os.path.abspath(directory)
+        cached = self._cached_mtimes(root, recursive)
+        pending = deque([root])
+        in_flight = {}
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="dirindex")
+        try:
+            while pending or in_flight:
+                while pending and len(in_flight) < self.workers * 2:
+                    path = pending.popleft()
+                    in_flight[executor.submit(_refresh_dir, path, cached.get(path))] = path
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = in_flight.pop(future)
+                    result = future.result()
+                    if result is None:
+                        self._forget(path)
+                        continue
+                    mtime_ns, listing = result
+                    if listing is None:
+                        listing = self._cached_listing(path)
+                    else:
+                        self._store(path, mtime_ns, listing)
+                    if recursive:
+                        pending.extend(os.path.join(path, name) for name, kind in listing
+                                       if kind == KIND_DIR and not (prune and prune(name)))
+                    yield path, listing
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.conn.commit()
+
+    def find_files(self, directory, file_pattern, recursive=False, include=None, exclude=None, prune_dirs=None):
+        """
+        Searches the index for files whose name matches the given pattern, refreshing stale directories first.
+
+        :param directory: The directory to search in.
+        :param file_pattern: The complete filename pattern to match (fnmatch syntax).
+        :param recursive: Whether to search recursively in subdirectories.
+        :param include: Additional filename patterns; a file matching any of them (or file_pattern) is included.
+        :param exclude: Filename patterns that reject an otherwise included file.
+        :param prune_dirs: Directory name patterns whose subtrees are not visited.
+        :return: Generator yielding file paths, spelled relative to `directory` as given.
+        """
+        match = compile_name_matcher([file_pattern] + list(include or []), exclude)
+        prune = compile_patterns(prune_dirs)
+        root = os.path.abspath(directory)
+        for path, listing in self.walk(directory, recursive, prune):
+            display_dir = directory if path == root else os.path.join(directory, os.path.relpath(path, root))
+            for name, kind in listing:
+                if kind == KIND_FILE and match(name):
+                    yield os.path.join(display_dir, name)
@@ -1,23 +1,99 @@
+import json
+import os
+import sys
 from functools import wraps
 from contextlib import contextmanager
 
 # Assuming a global variable or another way to determine if it's a dry-run
 dry_run_flag = True  # This should be set based on command-line arguments
 
-def dry_run_decorator(custom_message=None):
+
+#####################################
+# Plans: one JSON object per line, e.g. {"op": "rename", "src": "a.txt", "dst": "A.txt"}
+# Paths are str; undecodable bytes survive as surrogate escapes (os.fsdecode/os.fsencode), and
+# JSON escaping keeps names with newlines, quotes or '->' on one unambiguous line.
+#####################################
+
+def plan_step(op, src, dst=None, **options):
+    """
+    Build one plan step.
+    Args:
+        op (str): Operation name, e.g. 'rename', 'move', 'copy', 'link', 'reflink', 'sync' or 'delete'.
+        src (str or bytes): Path the operation acts on.
+        dst (str or bytes): Full target path, for operations that have one.
+        options: Extra fields for the operation (e.g. recursive=True for 'delete').
+    Returns:
+        dict: The step.
+    """
+    step = {'op': op, 'src': os.fsdecode(src)}
+    if dst is not None:
+        step['dst'] = os.fsdecode(dst)
+    step.update(options)
+    return step
+
+
+def write_plan(steps, stream=None):
+    """Write plan steps as JSON lines to `stream` (default: stdout) and flush, so they can be piped on."""
+    stream = stream or sys.stdout
+    for step in steps:
+        stream.write(json.dumps(step) + '\n')
+    stream.flush()
+
+
+def parse_plan_step(line):
+    """Return the plan step encoded in `line`, or None if it is not one."""
+    if not line.startswith('{'):
+        return None
+    try:
+        step = json.loads(line)
+    except ValueError:
+        return None
+    return step if isinstance(step, dict) and 'op' in step and 'src' in step else None
+
+
+def read_plan(source):
+    """
+    Read plan steps from a file name ('-' for stdin) or an open text stream.
+    Blank lines are ignored; anything else that is not a plan step raises ValueError.
+    Returns:
+        generator: Plan step dicts, in file order.
+    """
+    if isinstance(source, str):
+        if source == '-':
+            yield from read_plan(sys.stdin)
+        else:
+            with open(source) as stream:
+                yield from read_plan(stream)
+        return
+    for number, line in enumerate(source, 1):
+        line = line.strip()
+        if not line:
+            continue
+        step = parse_plan_step(line)
+        if step is None:
+            raise ValueError(f"Line {number} is not a plan step: {line[:80]!r}")
+        yield step
+
+
+def dry_run_decorator(custom_message=None, plan=None):
     """
     A decorator for simulating actions in dry-run mode with customizable messages.
     Args:
         custom_message (str or callable): A message or a function that generates a dry-run message.
                                           If a function, it should accept the same arguments as the decorated function.
+        plan (callable): Accepts the same arguments as the decorated function and returns the plan steps
+                         (see plan_step) it would perform. In dry-run mode they are written to stdout as
+                         JSON lines instead of the message.
     Returns:
-        A decorated function that prints the custom dry-run message instead of executing.
+        A decorated function that prints the plan or custom dry-run message instead of executing.
     """
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
             dry_run = kwargs.get('dry_run', False)
-            if dry_run:
+            if dry_run and plan:
+                write_plan(plan(*args, **kwargs))
+            elif dry_run:
                 message = custom_message(*args, **kwargs) if callable(custom_message) else custom_message
                 print(message or f"Dry-run: {func.__name__} with args {args}, kwargs {kwargs}")
             else:
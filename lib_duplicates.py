@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+lib_duplicates.py
+-----------------
+
+Content-duplicate detection by staged elimination, so that most files are never read in full:
+
+1. Group candidates by size (from the stat the walk already cached). Unique sizes are dropped.
+2. Hash the first and last PARTIAL_BYTES of every remaining file. For files no bigger than
+   2 * PARTIAL_BYTES this already covers the whole content and settles the question.
+3. Fully hash only the files whose (size, partial hash) still collide, on a thread pool.
+   Large files are read through mmap; hashlib releases the GIL while hashing big buffers,
+   so the threads really do hash in parallel.
+
+Hardlinks to the same inode are treated as a single file: deleting one of them frees nothing.
+
+Example:
+    for group in find_duplicates(findFiles.find_entries('/media', '*', recursive=True)):
+        print(group)
+"""
+
+import os
+import mmap
+import hashlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from lib_logging import *
+from lib_walk import DEFAULT_WORKERS
+
+PARTIAL_BYTES = 4 * 1024
+MMAP_THRESHOLD = 1024 * 1024
+READ_CHUNK = 1024 * 1024
+
+
+def _new_hash():
+    return hashlib.blake2b(digest_size=20)
+
+
+def partial_hash(path, size, partial_bytes=PARTIAL_BYTES):
+    """
+    Hash the first and last `partial_bytes` of a file (the whole file if it is small enough).
+    Args:
+        path (str): File to hash.
+        size (int): File size, as already known from the walk.
+        partial_bytes (int): Bytes read from each end.
+    Returns:
+        bytes: Digest.
+    """
+    digest = _new_hash()
+    with open(path, 'rb') as file:
+        if size <= 2 * partial_bytes:
+            digest.update(file.read())
+        else:
+            digest.update(file.read(partial_bytes))
+            file.seek(size - partial_bytes)
+            digest.update(file.read(partial_bytes))
+    return digest.digest()
+
+
+def full_hash(path):
+    """
+    Hash a whole file, mapping it into memory instead of copying it through read buffers when it is large.
+    Args:
+        path (str): File to hash.
+    Returns:
+        bytes: Digest.
+    """
+    digest = _new_hash()
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, 'madvise'):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                digest.update(mapped)
+        else:
+            for chunk in iter(lambda: file.read(READ_CHUNK), b''):
+                digest.update(chunk)
+    return digest.digest()
+
+
+def _stat_candidate(candidate):
+    """Accept an os.DirEntry (reusing its cached stat) or a plain path."""
+    if isinstance(candidate, os.DirEntry):
+        return candidate.path, candidate.stat()
+    return candidate, os.stat(candidate)
+
+
+def _hash_all(executor, func, groups):
+    """
+    Split every group of paths further by func(path, size), dropping files that fail and groups left with one member.
+    Returns:
+        list: (key, paths) pairs with at least two paths each; key[0] is the file size.
+    """
+    jobs = [(key, path) for key, paths in groups for path in paths]
+    digests = executor.map(lambda job: _try_hash(func, job[1], job[0][0]), jobs)
+    split = defaultdict(list)
+    for (key, path), digest in zip(jobs, digests):
+        if digest is not None:
+            split[key + (digest,)].append(path)
+    return [(key, paths) for key, paths in split.items() if len(paths) > 1]
+
+
+def _try_hash(func, path, size):
+    try:
+        return func(path, size)
+    except OSError as error:
+        log_debug(f"Cannot hash {path}: {error}")
+        return None
+
+
+def find_duplicates(candidates, workers=DEFAULT_WORKERS, min_size=1):
+    """
+    Find groups of files with identical content.
+    Args:
+        candidates (iterable): os.DirEntry objects (e.g. from findFiles.find_entries) or paths.
+        workers (int): Number of files hashed concurrently.
+        min_size (int): Ignore files smaller than this; the default skips empty files.
+    Returns:
+        list: Lists of paths with identical content, largest files first, paths sorted within a group.
+    """
+    by_size = defaultdict(list)
+    seen_inodes = set()
+    for candidate in candidates:
+        try:
+            path, st = _stat_candidate(candidate)
+        except OSError as error:
+            log_debug(f"Cannot stat {candidate}: {error}")
+            continue
+        if st.st_size < min_size or (st.st_dev, st.st_ino) in seen_inodes:
+            continue
+        seen_inodes.add((st.st_dev, st.st_ino))
+        by_size[(st.st_size,)].append(path)
+
+    groups = [(key, paths) for key, paths in by_size.items() if len(paths) > 1]
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="duplicates") as executor:
+        groups = _hash_all(executor, partial_hash, groups)
+        settled = [(key, paths) for key, paths in groups if key[0] <= 2 * PARTIAL_BYTES]
+        unsettled = [(key, paths) for key, paths in groups if key[0] > 2 * PARTIAL_BYTES]
+        settled += _hash_all(executor, lambda path, size: full_hash(path), unsettled)
+
+    settled.sort(key=lambda group: (-group[0][0], sorted(group[1])))
+    return [sorted(paths) for _, paths in settled]
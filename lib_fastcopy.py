@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+lib_fastcopy.py
+---------------
+
+File copy engine that keeps data in the kernel instead of bouncing it through user-space buffers.
+
+For each file the fastest available method is tried first and the next one is used whenever the
+kernel or filesystem refuses:
+
+1. reflink  - FICLONE ioctl: the copy shares the source's blocks (copy-on-write); no data moves.
+              Supported by Btrfs, XFS (reflink=1), bcachefs, OCFS2 and some network filesystems.
+2. copy_file_range - in-kernel copy; may be offloaded to the storage server (NFS 4.2, SMB).
+3. sendfile - in-kernel copy between file descriptors.
+4. read/write - plain buffered copy, always works.
+
+A method that fails part-way hands over at the current offset, so no byte is copied twice.
+"""
+
+import os
+import sys
+import time
+import errno
+import shutil
+import tempfile
+from collections import Counter
+
+from lib_logging import *
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# _IOW(0x94, 9, int) from <linux/fs.h>
+FICLONE = 0x40049409
+# Linux caps a single copy_file_range/sendfile call just below 2 GiB.
+KERNEL_CHUNK = 0x7FFFF000
+BUFFER_SIZE = 1024 * 1024
+
+METHODS = ('reflink', 'copy_file_range', 'sendfile', 'readwrite')
+
+# Errors meaning "this method is not possible for this pair of files", as opposed to real I/O failures.
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL,
+                errno.EBADF, errno.ETXTBSY, errno.ENOTTY, errno.EPERM}
+
+
+class CopyStats:
+    """
+    Running totals for a batch of file operations.
+    Attributes:
+        files (int): Files completed.
+        bytes (int): Bytes copied (or cloned/linked).
+        errors (int): Files that failed.
+        methods (Counter): Files completed per method.
+        started (float): perf_counter() at creation.
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.methods = Counter()
+        self.started = time.perf_counter()
+
+    def add(self, size, method):
+        self.files += 1
+        self.bytes += size
+        self.methods[method] += 1
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def summary(self):
+        methods = ", ".join(f"{name}: {count}" for name, count in sorted(self.methods.items()))
+        return (f"{self.files} files, {self.bytes} bytes in {self.seconds:.3f}s "
+                f"({self.bytes_per_second / 1024**2:.1f} MiB/s); {self.errors} errors"
+                + (f" [{methods}]" if methods else ""))
+
+
+def _reflink(src_fd, dst_fd, offset, size):
+    if fcntl is None or offset:
+        raise OSError(errno.ENOTSUP, "reflink unavailable")
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    return size
+
+
+def _copy_file_range(src_fd, dst_fd, offset, size):
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError(errno.ENOSYS, "copy_file_range unavailable")
+    while offset < size:
+        copied = os.copy_file_range(src_fd, dst_fd, min(KERNEL_CHUNK, size - offset))
+        if copied == 0:
+            break
+        offset += copied
+    return offset
+
+
+def _sendfile(src_fd, dst_fd, offset, size):
+    if not sys.platform.startswith('linux'):
+        # Only Linux allows a regular file as the sendfile destination.
+        raise OSError(errno.ENOSYS, "sendfile to a file unavailable")
+    while offset < size:
+        sent = os.sendfile(dst_fd, src_fd, None, min(KERNEL_CHUNK, size - offset))
+        if sent == 0:
+            break
+        offset += sent
+    return offset
+
+
+def _readwrite(src_fd, dst_fd, offset, size):
+    buffer = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(src_fd, 'rb', buffering=0, closefd=False) as src, open(dst_fd, 'wb', buffering=0, closefd=False) as dst:
+        while True:
+            count = src.readinto(buffer)
+            if not count:
+                break
+            written = 0
+            while written < count:
+                written += dst.write(view[written:count])
+            offset += count
+    return offset
+
+
+_IMPLEMENTATIONS = {
+    'reflink': _reflink,
+    'copy_file_range': _copy_file_range,
+    'sendfile': _sendfile,
+    'readwrite': _readwrite,
+}
+
+
+def copy_file(src, dst, methods=METHODS):
+    """
+    Copy a file's data and permission bits, like shutil.copy, using the fastest method available.
+    Args:
+        src (str): Source file.
+        dst (str): Destination file or directory.
+        methods (tuple): Methods to try, in order; see METHODS.
+    Returns:
+        tuple: (destination path, bytes copied, name of the method that finished the copy).
+    Raises:
+        OSError: If the copy fails with a real I/O error, or shutil.SameFileError.
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        st = os.fstat(src_fd)
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, st.st_mode & 0o7777)
+        try:
+            offset, used = 0, None
+            for method in methods:
+                try:
+                    offset = _IMPLEMENTATIONS[method](src_fd, dst_fd, offset, st.st_size)
+                    used = method
+                    if offset >= st.st_size:
+                        break
+                except OSError as error:
+                    if error.errno not in _UNSUPPORTED:
+                        raise
+                    log_debug(f"{method} unavailable for {src} -> {dst}: {error}")
+                # Whatever was copied so far stays; the next method resumes where this one stopped.
+                offset = os.lseek(dst_fd, 0, os.SEEK_CUR)
+                os.lseek(src_fd, offset, os.SEEK_SET)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    shutil.copymode(src, dst)
+    return dst, offset, used
+
+
+def clone_file(src, dst):
+    """
+    Clone a file with FICLONE and nothing else, like cp --reflink=always. The clone is made in a
+    temporary file next to the destination and renamed over it only once it succeeded, so a refused
+    clone leaves an existing destination untouched and no empty file behind.
+    Args:
+        src (str): Source file.
+        dst (str): Destination file or directory.
+    Returns:
+        tuple: (destination path, bytes cloned, 'reflink').
+    Raises:
+        OSError: If the filesystem cannot clone the file (e.g. EXDEV, EOPNOTSUPP), or shutil.SameFileError.
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        st = os.fstat(src_fd)
+        dst_fd, temp = tempfile.mkstemp(prefix=f".{os.path.basename(dst)}.", suffix='.clone',
+                                        dir=os.path.dirname(dst) or '.')
+        try:
+            try:
+                _reflink(src_fd, dst_fd, 0, st.st_size)
+                os.fchmod(dst_fd, st.st_mode & 0o7777)
+            finally:
+                os.close(dst_fd)
+            os.replace(temp, dst)
+        except BaseException:
+            os.unlink(temp)
+            raise
+    finally:
+        os.close(src_fd)
+    return dst, st.st_size, 'reflink'
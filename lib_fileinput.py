@@ -1,49 +1,141 @@
+import itertools
 import sys
 import re
 import os
 
 import logging
 from lib_logging import *
+from lib_dryrun import parse_plan_step
 
-def get_file_paths_from_input(args):
+# Bytes requested per read from a pipe; read1 returns as soon as any data is available.
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_records(stream, delimiter=b'\n', chunk_size=CHUNK_SIZE):
     """
-    Determines the file paths to be processed based on the input source: command line, --from-file, or stdin.
-    Handles directories by listing their contents and processes stdin input, especially from dry-run output.
+    Split a stream into records as data arrives, without reading it all first.
+    Args:
+        stream: A binary (or text) file object; pipes are best passed as sys.stdin.buffer.
+        delimiter (bytes): Record separator, b'\n' or b'\0'.
+    Returns:
+        generator: Records without their delimiter, of the stream's type (bytes or str).
+    """
+    read = getattr(stream, 'read1', None) or stream.read
+    pending = None
+    while True:
+        chunk = read(chunk_size)
+        if not chunk:
+            break
+        if pending is None:
+            pending = chunk[:0]
+            if isinstance(chunk, str):
+                delimiter = delimiter.decode()
+        records = (pending + chunk).split(delimiter)
+        pending = records.pop()
+        yield from records
+    if pending:
+        yield pending
+
+
+def _parse_record(record, null):
+    """Decode a stdin record; returns (path, True) for a dry-run plan step (see lib_dryrun), else (path, False)."""
+    path = os.fsdecode(record) if isinstance(record, bytes) else record
+    if null:
+        return path, False
+    path = path.strip()
+    step = parse_plan_step(path)
+    if step is not None:
+        # Continue from where the planned operation would leave the file
+        return step.get('dst', step['src']), True
+    return path, False
+
+
+def _expand_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            # List all files in the specified directory
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        yield entry.path
+        elif os.path.isfile(path):
+            yield path
+        else:
+            log_debug(f"Path does not exist: {path}")
+
+
+def _read_path_file(file_name, null):
+    with open(file_name, 'rb') as file:
+        for record in iter_records(file, b'\0' if null else b'\n'):
+            path, _ = _parse_record(record, True)
+            if not null:
+                path = path.strip()
+            if path:
+                yield path
+
+
+def iter_file_paths_from_input(args, null=None, dedupe=False, as_bytes=False, stdin=None):
+    """
+    Streaming variant of get_file_paths_from_input: paths are yielded as they arrive, so a consumer
+    can start work before the producer (e.g. findFiles.py) has finished, and memory stays flat.
+    Whether the input is a dry-run plan is decided from its first record.
 
     Args:
-        args (Namespace): Parsed command-line arguments.
+        args (Namespace): Parsed command-line arguments (dry_run, files, from_file and optionally null).
+        null (bool): Records are NUL-terminated (find -print0, findFiles.py -0) and used verbatim, so names
+                     may contain newlines or surrounding spaces. Defaults to args.null.
+        dedupe (bool): Yield each path only once.
+        as_bytes (bool): Yield bytes paths (os.fsencode) instead of str.
+        stdin: Stream read when it is not a tty; defaults to sys.stdin.
 
     Returns:
-        tuple: A tuple containing a list of file paths to process and a boolean indicating dry-run mode.
+        tuple: A generator of file paths and a boolean indicating dry-run mode.
     """
-    file_paths = []
+    stdin = stdin or sys.stdin
+    null = getattr(args, 'null', False) if null is None else null
     dry_run_detected = args.dry_run
 
-    if not sys.stdin.isatty():
-        # Handling piped input from stdin
-        for line in sys.stdin:
-            line = line.strip()
-            if 'Dry-run:' in line and '->' in line:
-                # Extract the filename after '->' for dry-run output
-                modified_filename = line.split('->')[-1].strip().strip("'")
-                file_paths.append(modified_filename)
-                dry_run_detected = True
-            else:
-                # Handle regular piped input (non-dry-run output)
-                file_paths.append(line)
+    if not stdin.isatty():
+        records = (_parse_record(record, null)
+                   for record in iter_records(getattr(stdin, 'buffer', stdin), b'\0' if null else b'\n'))
+        records = (record for record in records if record[0])
+        first = next(records, None)
+        if first is not None:
+            dry_run_detected = dry_run_detected or first[1]
+            records = itertools.chain([first], records)
+        paths = (path for path, _ in records)
     elif args.files:
-        for path in args.files:
-            if os.path.isdir(path):
-                # List all files in the specified directory
-                file_paths.extend([os.path.join(path, f) for f in os.listdir(path) if os.path.isfile(os.path.join(path, f))])
-            elif os.path.isfile(path):
-                # Directly add the file path
-                file_paths.append(path)
-            else:
-                log_debug(f"Path does not exist: {path}")
+        paths = _expand_paths(args.files)
     elif args.from_file:
-        # Read file paths from a specified file
-        with open(args.from_file, 'r') as file:
-            file_paths = [line.strip() for line in file if line.strip()]
-    
-    return file_paths, dry_run_detected
+        paths = _read_path_file(args.from_file, null)
+    else:
+        paths = iter(())
+
+    if dedupe:
+        paths = _unique(paths)
+    if as_bytes:
+        paths = map(os.fsencode, paths)
+    return paths, dry_run_detected
+
+
+def _unique(paths):
+    seen = set()
+    for path in paths:
+        if path not in seen:
+            seen.add(path)
+            yield path
+
+
+def get_file_paths_from_input(args):
+    """
+    Determines the file paths to be processed based on the input source: command line, --from-file, or stdin.
+    Handles directories by listing their contents and processes stdin input, especially dry-run plans.
+
+    Args:
+        args (Namespace): Parsed command-line arguments.
+
+    Returns:
+        tuple: A tuple containing a list of file paths to process and a boolean indicating dry-run mode.
+    """
+    file_paths, dry_run_detected = iter_file_paths_from_input(args)
+    return list(file_paths), dry_run_detected
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+lib_grep.py
+-----------
+
+Content search over a stream of file paths, in the spirit of `xargs grep` but without spawning a
+process per batch: a fixed process pool is started once, the pattern is compiled once per worker,
+and paths are handed over in batches while results stream back as a generator.
+
+Files are searched through mmap, so the regex runs directly on the page cache. Files whose first
+BINARY_PROBE_BYTES contain a NUL byte are treated as binary and skipped, like `grep -I`.
+
+Example:
+    for path, line_number, line in grep_files(findFiles.find_files('src', '*.py', True), r'TODO'):
+        print(f"{path}:{line_number}:{line}")
+"""
+
+import os
+import re
+import mmap
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from lib_logging import *
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+BATCH_SIZE = 64
+BINARY_PROBE_BYTES = 8192
+# Workers start from a clean process rather than a fork of the caller, which may hold threads and locks
+# (logging, the lib_async search threads) that a forked child would inherit in an arbitrary state.
+_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Per-process search state, set once by _init_worker (or directly when searching in-process).
+_regex = None
+_files_only = False
+
+
+def compile_content_pattern(pattern, literal=False, ignore_case=False):
+    """
+    Compile a search pattern for matching against raw file bytes.
+    Args:
+        pattern (str): Regular expression, or a plain string if `literal` is set.
+        literal (bool): Match `pattern` verbatim.
+        ignore_case (bool): Case-insensitive matching.
+    Returns:
+        re.Pattern: Compiled bytes pattern.
+    """
+    raw = os.fsencode(pattern)
+    if literal:
+        raw = re.escape(raw)
+    return re.compile(raw, re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+
+
+def _init_worker(regex, files_only):
+    global _regex, _files_only
+    _regex = regex
+    _files_only = files_only
+
+
+def search_file(path, regex, files_only=False):
+    """
+    Search one file.
+    Args:
+        path (str): File to search.
+        regex (re.Pattern): Pattern from compile_content_pattern.
+        files_only (bool): Stop at the first match and report just the path.
+    Returns:
+        list: (path, line_number, line) for every matching line, or [(path, None, None)] when
+              `files_only` is set and the file matches. Empty for binary or unreadable files.
+    """
+    results = []
+    try:
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return results
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if mapped.find(b'\0', 0, BINARY_PROBE_BYTES) != -1:
+                    return results
+                line_number, counted_to, pos = 1, 0, 0
+                while True:
+                    match = regex.search(mapped, pos)
+                    if match is None:
+                        break
+                    if files_only:
+                        return [(path, None, None)]
+                    start = mapped.rfind(b'\n', 0, match.start()) + 1
+                    end = mapped.find(b'\n', match.end())
+                    if end == -1:
+                        end = len(mapped)
+                    line_number += mapped[counted_to:start].count(b'\n')
+                    counted_to = start
+                    results.append((path, line_number, mapped[start:end].decode('utf-8', 'replace')))
+                    # One hit per line, like grep; guard against empty matches at end of file.
+                    pos = end + 1
+                    if pos > len(mapped):
+                        break
+    except (OSError, ValueError) as error:
+        log_debug(f"Cannot search {path}: {error}")
+    return results
+
+
+def _search_batch(paths):
+    results = []
+    for path in paths:
+        results.extend(search_file(path, _regex, _files_only))
+    return results
+
+
+def _batches(paths, size):
+    batch = []
+    for path in paths:
+        batch.append(path)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def grep_files(paths, pattern, literal=False, ignore_case=False, files_only=False, workers=DEFAULT_WORKERS):
+    """
+    Search the contents of many files, spreading batches of paths over a process pool.
+    Args:
+        paths (iterable): File paths, e.g. the generator returned by findFiles.find_files.
+        pattern (str): Regular expression (or literal string) to look for.
+        literal (bool): Match `pattern` verbatim instead of as a regular expression.
+        ignore_case (bool): Case-insensitive matching.
+        files_only (bool): Report each matching file once, like `grep -l`.
+        workers (int): Number of worker processes; 1 searches in the calling process.
+    Returns:
+        Generator yielding (path, line_number, line) tuples as batches complete; line_number and
+        line are None when `files_only` is set. Files are reported in completion order.
+    """
+    regex = compile_content_pattern(pattern, literal, ignore_case)
+    if workers <= 1:
+        for path in paths:
+            yield from search_file(path, regex, files_only)
+        return
+
+    batches = _batches(paths, BATCH_SIZE)
+    in_flight = set()
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(_START_METHOD),
+                                   initializer=_init_worker, initargs=(regex, files_only))
+    try:
+        exhausted = False
+        while not exhausted or in_flight:
+            while not exhausted and len(in_flight) < workers * 2:
+                batch = next(batches, None)
+                if batch is None:
+                    exhausted = True
+                else:
+                    in_flight.add(executor.submit(_search_batch, batch))
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
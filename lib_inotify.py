@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+lib_inotify.py
+--------------
+
+Minimal Linux inotify binding over ctypes, with no dependencies beyond libc.
+
+Example:
+    with Inotify() as watcher:
+        watcher.add_watch('/data/incoming', IN_CREATE | IN_MOVED_TO)
+        for event in watcher.read_events():
+            print(event.path, event.mask)
+"""
+
+import os
+import ctypes
+import ctypes.util
+import struct
+from collections import namedtuple
+
+# Event masks from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_UNMOUNT = 0x00002000
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct('iIII')
+READ_BUFFER_SIZE = 64 * 1024
+
+InotifyEvent = namedtuple('InotifyEvent', ['wd', 'mask', 'cookie', 'name', 'path'])
+InotifyEvent.__doc__ = "An inotify event; `path` is the watched directory joined with `name` (or the directory itself)."
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify is not available on this platform")
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def _check(result, what):
+    if result < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"{what}: {os.strerror(errno)}")
+    return result
+
+
+class Inotify:
+    """
+    An inotify instance. Watch descriptors are mapped back to directory paths so events carry full paths.
+    Raises OSError if inotify is not available (non-Linux systems).
+    """
+
+    def __init__(self):
+        self.libc = _load_libc()
+        self.fd = _check(self.libc.inotify_init1(IN_CLOEXEC), "inotify_init1")
+        self.paths = {}
+
+    def add_watch(self, path, mask):
+        """
+        Watch a directory (or file) for the events in `mask`.
+        Returns:
+            int: Watch descriptor.
+        """
+        wd = _check(self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask), f"inotify_add_watch {path}")
+        self.paths[wd] = path
+        return wd
+
+    def rm_watch(self, wd):
+        self.paths.pop(wd, None)
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self):
+        """
+        Block until events are available, then return them all.
+        Returns:
+            list: InotifyEvent tuples. Watches that the kernel dropped (IN_IGNORED) are forgotten.
+        """
+        buffer = os.read(self.fd, READ_BUFFER_SIZE)
+        events = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            directory = self.paths.get(wd)
+            path = os.path.join(directory, name) if directory is not None and name else directory
+            events.append(InotifyEvent(wd, mask, cookie, name, path))
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
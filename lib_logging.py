@@ -1,60 +1,380 @@
+import atexit
+import copy
+import itertools
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import reprlib
+import sys
+import threading
+import time
 from contextlib import contextmanager
 from functools import wraps
 
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+OVERFLOW_POLICIES = ('block', 'drop', 'drop_oldest')
 
-def setup_logging(level=logging.INFO):
+
+def setup_logging(level=logging.INFO, async_queue=False, queue_size=10000, overflow='block', batch_size=256):
     """
     Set up the basic configuration for the logging system.
+    Like logging.basicConfig, this does nothing if the root logger already has handlers.
     Args:
         level (int): The logging level, e.g., logging.INFO, logging.DEBUG.
+        async_queue (bool): Hand records to a bounded queue and write them from a background thread,
+                            so logging threads never wait for console I/O. Flushed at exit.
+        queue_size (int): Capacity of the queue in records.
+        overflow (str): What a logging thread does when the queue is full: 'block' until there is room,
+                        'drop' the new record, or 'drop_oldest' queued record. Drops are counted and reported at exit.
+        batch_size (int): Maximum records written (and flushed) together by the background thread.
+    Returns:
+        BatchingQueueListener: The background writer when async_queue is set and took effect, else None.
     Example:
         setup_logging(logging.DEBUG)
+        setup_logging(logging.DEBUG, async_queue=True, overflow='drop')
+    """
+    root = logging.getLogger()
+    if not async_queue or root.handlers:
+        logging.basicConfig(format=LOG_FORMAT, level=level)
+        return None
+    if overflow not in OVERFLOW_POLICIES:
+        raise ValueError(f"Invalid overflow policy: {overflow!r} (expected one of {OVERFLOW_POLICIES})")
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = BoundedQueueHandler(log_queue, overflow)
+    listener = BatchingQueueListener(log_queue, sys.stderr, logging.Formatter(LOG_FORMAT), batch_size, handler)
+    root.addHandler(handler)
+    root.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler for a bounded queue with an overflow policy (see setup_logging).
+    Only the message is merged on the calling thread; formatting happens on the listener thread.
+    """
+
+    def __init__(self, log_queue, overflow='block'):
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.dropped = 0
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        # Freeze the message now, since the arguments may change before the listener formats it
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        # Render the traceback now too: a queued exc_info would keep every frame and local alive
+        if record.exc_info:
+            record.exc_text = record.exc_text or self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.overflow == 'block':
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.overflow == 'drop_oldest':
+            try:
+                oldest = self.queue.get_nowait()
+                if oldest is BatchingQueueListener._STOP:
+                    # Never evict the listener's stop request, or stop() would wait forever
+                    self.queue.put(oldest)
+                else:
+                    self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                pass
+        self.dropped += 1
+
+
+class BatchingQueueListener:
     """
-    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=level)
+    Background thread draining a log queue: it takes whatever is queued (up to batch_size records),
+    formats it, and writes it to the stream with a single write and flush.
+    """
+
+    _STOP = object()
+
+    def __init__(self, log_queue, stream, formatter, batch_size=256, handler=None):
+        self.queue = log_queue
+        self.stream = stream
+        self.formatter = formatter
+        self.batch_size = batch_size
+        self.handler = handler
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write out everything still queued and stop the thread. Safe to call more than once."""
+        if self._thread is None:
+            return
+        if self.handler is not None:
+            logging.getLogger().removeHandler(self.handler)
+        self.queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+        if self.handler is not None and self.handler.dropped:
+            self.stream.write(f"{self.handler.dropped} log records were dropped because the log queue was full.\n")
+            self.stream.flush()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = [self.formatter.format(record) for record in batch if record is not self._STOP]
+            if lines:
+                try:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+                except (OSError, ValueError):
+                    pass  # stream closed or broken pipe; logging must not take the program down
+            if len(lines) < len(batch):
+                return
+
+
+# Longest argument/return value repr that log_function writes; longer ones are cut with '...'.
+DEFAULT_MAX_REPR = 200
+
+_short_repr = reprlib.Repr()
+_short_repr.maxstring = DEFAULT_MAX_REPR
+_short_repr.maxother = DEFAULT_MAX_REPR
+_short_repr.maxlist = _short_repr.maxtuple = _short_repr.maxset = _short_repr.maxdict = 10
+
+
+def truncated_repr(value, max_length=DEFAULT_MAX_REPR):
+    """
+    repr() for log messages: containers only show their first few items (without repr-ing the rest),
+    and the result is cut to max_length characters. None means the full, unbounded repr.
+    """
+    if max_length is None:
+        return repr(value)
+    text = _short_repr.repr(value)
+    return text if len(text) <= max_length else text[:max_length - 3] + '...'
 
 
 @contextmanager
-def log_block(name):
+def log_block(name, level=logging.INFO):
     """
     Context manager for logging the entry and exit of a code block.
+    Nothing is formatted unless `level` is enabled.
     Args:
         name (str): The name of the block for logging purposes.
+        level (int): Logging level of the entry/exit messages.
     Example:
         with log_block("process_data"):
             # code block
     """
-    logging.info(f"Entering block: {name}")
+    logger = logging.getLogger()
+    enabled = logger.isEnabledFor(level)
+    if enabled:
+        logger.log(level, "Entering block: %s", name)
     try:
         yield
     finally:
-        logging.info(f"Exiting block: {name}")
+        if enabled:
+            logger.log(level, "Exiting block: %s", name)
 
 
-def log_function(func):
+def log_function(func=None, *, level=logging.INFO, max_repr=DEFAULT_MAX_REPR, sample=1, static=False):
     """
     Decorator for logging function calls with their arguments and return values.
+    The level is checked on every call before any repr is built, so a disabled level costs one
+    isEnabledFor() call. Can be used bare (@log_function) or with options.
     Args:
         func (function): The function to be wrapped for logging.
+        level (int): Logging level of the call/return messages.
+        max_repr (int): Maximum length of each argument/return value repr; None for no limit.
+        sample (int): Only log every Nth call.
+        static (bool): Decide once, at decoration time: if `level` is disabled then, return `func`
+                       itself so the wrapper costs nothing (later level changes are not seen).
     Returns:
         function: The wrapped function.
     Example:
         @log_function
         def add(a, b):
             return a + b
+
+        @log_function(level=logging.DEBUG, max_repr=80, sample=100, static=True)
+        def hot_path(items):
+            ...
     """
+    if func is None:
+        return lambda f: log_function(f, level=level, max_repr=max_repr, sample=sample, static=static)
+
+    logger = logging.getLogger()
+    if static and not logger.isEnabledFor(level):
+        return func
+    calls = itertools.count()
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        args_repr = [repr(a) for a in args]
-        kwargs_repr = [f"{k}={v!r}" for k, v in kwargs.items()]
+        if not logger.isEnabledFor(level) or (sample > 1 and next(calls) % sample):
+            return func(*args, **kwargs)
+        args_repr = [truncated_repr(a, max_repr) for a in args]
+        kwargs_repr = [f"{k}={truncated_repr(v, max_repr)}" for k, v in kwargs.items()]
         signature = ", ".join(args_repr + kwargs_repr)
-        logging.info(f"Calling {func.__name__}({signature})")
+        logger.log(level, f"Calling {func.__name__}({signature})")
         value = func(*args, **kwargs)
-        logging.info(f"{func.__name__!r} returned {value!r}")
+        logger.log(level, f"{func.__name__!r} returned {truncated_repr(value, max_repr)}")
         return value
     return wrapper
 
 
+class TimingRegistry:
+    """
+    In-process registry of wall time, CPU time, call counts and latency histograms per named
+    function or block, filled by timed_block and timed_function. Recording is off until enabled,
+    so instrumented code pays a single attribute check.
+    Histogram buckets are powers of two in microseconds: bucket n counts durations below 2**n us.
+    """
+
+    def __init__(self, max_trace_events=1000000):
+        self.enabled = False
+        self.max_trace_events = max_trace_events
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+            self.events = []
+            self.dropped_events = 0
+
+    def record(self, name, start, wall, cpu):
+        """Add one measurement; start and wall come from time.perf_counter(), cpu from time.thread_time()."""
+        bucket = int(wall * 1e6).bit_length()
+        with self._lock:
+            entry = self.stats.get(name)
+            if entry is None:
+                entry = self.stats[name] = {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'min': wall, 'max': wall, 'histogram': {}}
+            entry['count'] += 1
+            entry['wall'] += wall
+            entry['cpu'] += cpu
+            entry['min'] = min(entry['min'], wall)
+            entry['max'] = max(entry['max'], wall)
+            entry['histogram'][bucket] = entry['histogram'].get(bucket, 0) + 1
+            if len(self.events) < self.max_trace_events:
+                self.events.append((name, start, wall, threading.get_ident()))
+            else:
+                self.dropped_events += 1
+
+    def summary(self):
+        """Return the registry as a JSON-serialisable dict, slowest total first."""
+        with self._lock:
+            items = sorted(self.stats.items(), key=lambda item: -item[1]['wall'])
+            return {name: {
+                'count': entry['count'],
+                'wall_seconds': entry['wall'],
+                'cpu_seconds': entry['cpu'],
+                'mean_seconds': entry['wall'] / entry['count'],
+                'min_seconds': entry['min'],
+                'max_seconds': entry['max'],
+                'histogram_us': {f"<{2 ** bucket}": count for bucket, count in sorted(entry['histogram'].items())},
+            } for name, entry in items}
+
+    def dump_json(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def dump_chrome_trace(self, path):
+        """Write the recorded calls as Chrome trace events (load in chrome://tracing or Perfetto)."""
+        pid = os.getpid()
+        with self._lock:
+            events = [{'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                       'ts': (start - self._origin) * 1e6, 'dur': wall * 1e6}
+                      for name, start, wall, tid in self.events]
+            metadata = {'dropped_events': self.dropped_events}
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': metadata}, file)
+
+
+TIMINGS = TimingRegistry()
+
+
+def enable_timings(json_path=None, trace_path=None, registry=TIMINGS):
+    """
+    Start recording timings and, if paths are given, write them out at exit.
+    Args:
+        json_path (str): File for the per-name summary (counts, wall/CPU time, histograms).
+        trace_path (str): File for Chrome trace events.
+    Example:
+        enable_timings(json_path='timings.json', trace_path='trace.json')
+    """
+    registry.enabled = True
+    if json_path:
+        atexit.register(registry.dump_json, json_path)
+    if trace_path:
+        atexit.register(registry.dump_chrome_trace, trace_path)
+
+
+@contextmanager
+def timed_block(name, registry=TIMINGS):
+    """
+    Context manager recording the wall and CPU time of a code block into the timing registry.
+    Example:
+        with timed_block("walk"):
+            # code block
+    """
+    if not registry.enabled:
+        yield
+        return
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        registry.record(name, start, end - start, time.thread_time() - cpu_start)
+
+
+def timed_function(func=None, *, name=None, registry=TIMINGS):
+    """
+    Decorator recording the wall and CPU time of every call into the timing registry.
+    For generator functions only the creation of the generator would be timed; use timed_block
+    around the loop instead.
+    Args:
+        func (function): The function to be timed.
+        name (str): Registry name; defaults to the function's qualified name.
+    Example:
+        @timed_function
+        def scan(path):
+            ...
+    """
+    if func is None:
+        return lambda f: timed_function(f, name=name, registry=registry)
+    label = name or func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not registry.enabled:
+            return func(*args, **kwargs)
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            registry.record(label, start, end - start, time.thread_time() - cpu_start)
+    return wrapper
+
+
 # Decorator to handle non-string inputs in logging functions
 def handle_non_string_inputs(func):
     @wraps(func)
@@ -115,6 +435,7 @@ def log_out(message):
     Args:
         message (str): The message to output.
     """
-    print(message)
+    # A single write keeps lines from concurrent threads from interleaving
+    sys.stdout.write(f"{message}\n")
 
 
@@ -0,0 +1,63 @@
+import re
+import fnmatch
+
+_WILDCARDS = re.compile(r'[*?\[]')
+
+
+def compile_patterns(patterns):
+    """
+    Compile a list of fnmatch-style filename patterns into a single predicate, once.
+    Literal names become a set lookup, `*<literal>` patterns (e.g. '*.txt') a single str.endswith
+    call, and everything else one combined regular expression.
+    Args:
+        patterns (list): Filename patterns, e.g. ['*.jpg', 'IMG-??.png', 'README'].
+    Returns:
+        function: Predicate taking a name and returning True if any pattern matches,
+                  or None if `patterns` is empty.
+    Example:
+        is_image = compile_patterns(['*.jpg', '*.png'])
+        is_image('cat.jpg')  # True
+    """
+    patterns = list(patterns or [])
+    if not patterns:
+        return None
+    if '*' in patterns:
+        return lambda name: True
+
+    literals, suffixes, wildcards = set(), [], []
+    for pattern in patterns:
+        if not _WILDCARDS.search(pattern):
+            literals.add(pattern)
+        elif pattern.startswith('*') and not _WILDCARDS.search(pattern, 1):
+            suffixes.append(pattern[1:])
+        else:
+            wildcards.append(pattern)
+
+    checks = []
+    if literals:
+        checks.append(literals.__contains__)
+    if suffixes:
+        suffixes = tuple(suffixes)
+        checks.append(lambda name: name.endswith(suffixes))
+    if wildcards:
+        checks.append(re.compile('|'.join(fnmatch.translate(p) for p in wildcards)).match)
+
+    if len(checks) == 1:
+        return checks[0]
+    return lambda name: any(check(name) for check in checks)
+
+
+def compile_name_matcher(include, exclude=None):
+    """
+    Build a predicate accepting names that match any include pattern and no exclude pattern.
+    Args:
+        include (list): Patterns a name must match (at least one). Empty means match everything.
+        exclude (list): Patterns that reject a name even if it is included.
+    Returns:
+        function: Predicate taking a name and returning a bool.
+    """
+    included = compile_patterns(include) or (lambda name: True)
+    excluded = compile_patterns(exclude)
+    if excluded is None:
+        return included
+    return lambda name: bool(included(name)) and not excluded(name)
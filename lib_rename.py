@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+lib_rename.py
+-------------
+
+Rename without replacing an existing target, in one atomic step: Linux renameat2 with
+RENAME_NOREPLACE over ctypes, with no dependencies beyond libc.
+
+Where renameat2 is missing (older libc or kernel, other systems) or the filesystem does not
+support the flag, rename_noreplace falls back to an existence check followed by os.rename, which
+a concurrent rename onto the same target can race.
+
+Example:
+    try:
+        rename_noreplace('/data/a.txt', '/archive/a.txt')
+    except FileExistsError:
+        print("already archived")
+"""
+
+import os
+import ctypes
+import ctypes.util
+import errno
+
+# From <linux/fcntl.h> and <linux/fs.h>
+AT_FDCWD = -100
+RENAME_NOREPLACE = 1
+
+# Errors meaning renameat2 or the flag is not supported here, answered by the fallback.
+_UNSUPPORTED = {errno.ENOSYS, errno.EINVAL}
+
+_renameat2 = None
+
+
+def _load_renameat2():
+    global _renameat2
+    if _renameat2 is None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        function = getattr(libc, 'renameat2', None)
+        if function is not None:
+            function.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+            function.restype = ctypes.c_int
+        _renameat2 = function or False
+    return _renameat2
+
+
+def rename_noreplace(src, dst):
+    """
+    Rename `src` to `dst`, atomically refusing to replace an existing `dst`.
+    Raises:
+        FileExistsError: If `dst` exists.
+        OSError: If the rename fails, e.g. EXDEV across filesystems.
+    """
+    renameat2 = _load_renameat2()
+    if renameat2:
+        if renameat2(AT_FDCWD, os.fsencode(src), AT_FDCWD, os.fsencode(dst), RENAME_NOREPLACE) == 0:
+            return
+        error = ctypes.get_errno()
+        if error not in _UNSUPPORTED:
+            raise OSError(error, os.strerror(error), src, None, dst)
+    if os.path.lexists(dst):
+        raise FileExistsError(errno.EEXIST, "Destination path already exists", dst)
+    os.rename(src, dst)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+lib_scheduler.py
+----------------
+
+Runs many file transfers (copies, moves) concurrently on a thread pool without letting a few huge
+files monopolise it:
+
+- Files larger than SMALL_FILE_BYTES are admitted against an in-flight byte budget, so only a bounded
+  amount of large-file data is being pushed through the page cache at any time. A file bigger than
+  the whole budget runs once it has the budget to itself.
+- Small files are bounded by the worker count only, and keep flowing while large files wait for budget.
+- Work is grouped per (source device, destination device) and groups are served round-robin, with an
+  optional cap on concurrent transfers per group, so one slow device does not absorb every worker.
+- Transfers can be streamed: they are read from the input PLAN_BATCH at a time, topped up whenever
+  fewer than PLAN_LOW_WATER are waiting, so the first ones start before the rest of the input has
+  been read or stat'ed, and the workers never wait for a batch to drain.
+"""
+
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
+from lib_logging import *
+from lib_fastcopy import CopyStats
+from lib_walk import DEFAULT_WORKERS
+
+DEFAULT_MAX_INFLIGHT_BYTES = 256 * 1024 * 1024
+SMALL_FILE_BYTES = 1024 * 1024
+PLAN_BATCH = 4096
+# Transfers planned but not started below which the next PLAN_BATCH is read from the input.
+PLAN_LOW_WATER = PLAN_BATCH // 2
+
+Transfer = namedtuple('Transfer', ['src', 'dst', 'size', 'devices'])
+Transfer.__doc__ = "One file operation: `devices` is the (source, destination) st_dev pair used for grouping."
+
+
+def plan_transfers(file_paths, destination, stats=None):
+    """
+    Stat every source once and describe it as a Transfer into `destination`.
+    Sources that cannot be stat'ed, or whose target another source already claimed (see claim_target),
+    are logged and counted as errors in `stats`.
+    Returns:
+        list: Transfer tuples.
+    """
+    return list(iter_transfers(file_paths, destination, stats))
+
+
+def iter_transfers(file_paths, destination, stats=None):
+    """Like plan_transfers, but a generator: each source is stat'ed when the transfer is needed."""
+    to_dir = os.path.isdir(destination)
+    dst_dev = _device(destination if to_dir else os.path.dirname(destination) or '.')
+
+    def target(file_path):
+        return os.path.join(destination, os.path.basename(file_path.rstrip(os.sep))) if to_dir else destination
+
+    return _iter_stat_transfers(((file_path, destination, target(file_path), dst_dev) for file_path in file_paths),
+                                stats)
+
+
+def plan_transfer_pairs(pairs, stats=None):
+    """
+    Like plan_transfers, but for (source, full target path) pairs that each have their own destination,
+    e.g. the steps of a dry-run plan. Destination devices are looked up once per target directory.
+    Returns:
+        list: Transfer tuples.
+    """
+    devices = {}
+
+    def dst_dev(dst):
+        parent = os.path.dirname(dst) or '.'
+        if parent not in devices:
+            devices[parent] = _device(parent)
+        return devices[parent]
+
+    return _stat_transfers(((src, dst, dst, dst_dev(dst)) for src, dst in pairs), stats)
+
+
+def _device(path):
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+
+def claim_target(claimed, src, target, stats=None):
+    """
+    Register `src` as the writer of `target` in the `claimed` dict. Concurrent transfers onto one
+    target would interleave their bytes (or replace each other), so only the first source of a run
+    may write it: later ones are logged and counted as errors in `stats`.
+    Returns:
+        bool: True if `src` may write `target`.
+    """
+    key = os.path.normpath(target)
+    if key in claimed:
+        log_error(f"Skipping {src}: {target} is already the target of {claimed[key]}")
+        if stats is not None:
+            stats.errors += 1
+        return False
+    claimed[key] = src
+    return True
+
+
+def _stat_transfers(items, stats):
+    return list(_iter_stat_transfers(items, stats))
+
+
+def _iter_stat_transfers(items, stats):
+    # Targets are remembered for the whole run, so duplicates are caught across batches too
+    claimed = {}
+    for file_path, destination, target, dst_dev in items:
+        if not claim_target(claimed, file_path, target, stats):
+            continue
+        try:
+            st = os.stat(file_path)
+        except OSError as error:
+            log_error(f"Cannot stat {file_path}: {error}")
+            if stats is not None:
+                stats.errors += 1
+            continue
+        yield Transfer(file_path, destination, st.st_size, (st.st_dev, dst_dev))
+
+
+class _Group:
+    def __init__(self):
+        self.small = deque()
+        self.large = deque()
+        self.running = 0
+
+
+def run_transfers(transfers, operation, workers=DEFAULT_WORKERS, max_inflight_bytes=DEFAULT_MAX_INFLIGHT_BYTES,
+                  per_device_workers=None, stats=None, name="transfer", data_bytes=None):
+    """
+    Run operation(transfer) for every transfer on a thread pool, under the scheduling rules above.
+    Transfers are read from the iterable PLAN_BATCH at a time, whenever fewer than PLAN_LOW_WATER are
+    waiting, so a generator such as iter_transfers is consumed as the work proceeds.
+    Args:
+        transfers (iterable): Transfer tuples, e.g. from plan_transfers or iter_transfers.
+        operation (function): Performs one transfer and returns (bytes moved, method name).
+        workers (int): Maximum concurrent transfers; 1 runs them serially on the calling thread.
+        max_inflight_bytes (int): Budget for the combined size of large files in flight.
+        per_device_workers (int): Maximum concurrent transfers per device pair; None means no cap.
+        stats (CopyStats): Totals to update; a new one is created if omitted.
+        name (str): Operation name used in log messages.
+        data_bytes (function): Bytes of data a transfer will really push through the page cache, used for
+                               scheduling; defaults to its size. Renames and links move none.
+    Returns:
+        CopyStats: Totals and throughput. Failures are logged and counted, never raised.
+    """
+    stats = stats or CopyStats()
+
+    def record(transfer, future=None):
+        try:
+            size, method = future.result() if future else operation(transfer)
+        except OSError as error:
+            stats.errors += 1
+            log_error(f"Error during {name} of {transfer.src} to {transfer.dst}: {error}")
+        else:
+            stats.add(size, method)
+
+    if workers <= 1:
+        for transfer in transfers:
+            record(transfer)
+        log_info(f"{name}: {stats.summary()}")
+        return stats
+
+    data_bytes = data_bytes or (lambda transfer: transfer.size)
+    transfers = iter(transfers)
+    groups = {}
+    order = deque()
+    cap = per_device_workers or workers
+    inflight_bytes = 0
+    planned = 0
+    exhausted = False
+    running = {}
+
+    def cost(transfer):
+        size = data_bytes(transfer)
+        return min(size, max_inflight_bytes) if size > SMALL_FILE_BYTES else 0
+
+    def refill():
+        # Plan up to PLAN_BATCH more transfers into their device groups
+        nonlocal planned, exhausted
+        count = 0
+        for transfer in islice(transfers, PLAN_BATCH):
+            group = groups.get(transfer.devices)
+            if group is None:
+                group = groups[transfer.devices] = _Group()
+                order.append(group)
+            (group.small if data_bytes(transfer) <= SMALL_FILE_BYTES else group.large).append(transfer)
+            count += 1
+        planned += count
+        exhausted = count < PLAN_BATCH
+
+    def pick():
+        # Round-robin over device groups; a group offers its next large file if the budget allows, else a small one.
+        for _ in range(len(order)):
+            group = order[0]
+            order.rotate(-1)
+            if group.running >= cap:
+                continue
+            if group.large and inflight_bytes + cost(group.large[0]) <= max_inflight_bytes:
+                return group, group.large.popleft()
+            if group.small:
+                return group, group.small.popleft()
+        return None, None
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name) as executor:
+        while True:
+            # Top the plan up before it runs dry, so workers never wait for a batch to drain
+            if not exhausted and planned < PLAN_LOW_WATER:
+                refill()
+            while len(running) < workers:
+                group, transfer = pick()
+                if transfer is None:
+                    break
+                planned -= 1
+                group.running += 1
+                inflight_bytes += cost(transfer)
+                running[executor.submit(operation, transfer)] = (group, transfer)
+            if not running:
+                if exhausted and not planned:
+                    break
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                group, transfer = running.pop(future)
+                group.running -= 1
+                inflight_bytes -= cost(transfer)
+                record(transfer, future)
+    log_info(f"{name}: {stats.summary()}")
+    return stats
@@ -3,72 +3,521 @@
 lib_undo.py
 -----------
 
-This module is a placeholder for implementing a transactional undo functionality 
-for file operations in the context of a file management toolkit.
+Transactional undo for file operations, backed by a write-ahead journal on disk.
 
-The key concept is to use a combination of context managers and decorators to 
-track and reverse file operations (like renaming, moving, and deleting) as part 
-of transactional blocks.
+Each transaction is one journal file in the journal directory, so several processes can record
+transactions at the same time without locking, and any later process can list and undo them.
+The file starts with a header line and holds one JSON line per operation, in the same step
+format as dry-run plans (see lib_dryrun), e.g.
 
-Features and Ideas:
--------------------
+    {"op": "rename", "src": "/home/me/a.txt", "dst": "/home/me/A.txt", "seq": 1}
 
-1. Transactional Undo with Context Manager
-   - The context manager demarcates the start and end of a transactional block.
-   - All file operations within this block are logged as part of a single transaction.
-   - The undo operation reverses all actions in the most recent transaction.
+Paths are recorded as absolute paths, so the transaction can be undone from any working directory.
 
-2. Decorator for Logging Actions
-   - A decorator is used to automatically log file operations along with the details necessary to undo them.
-   - Each logged action includes the function called, its arguments, and any other relevant details.
+Write-ahead: renameFiles and dirFileActions append the step just *before* performing it. The write
+goes straight to the kernel (one append, a few microseconds), so it survives a crash of the process.
+Durability against power loss uses group commit: a background thread fsyncs the file at most every
+COMMIT_INTERVAL seconds, covering every step appended since the last sync, instead of one fsync per
+operation. With durable=True an operation additionally waits for the group commit that covers it.
 
-3. Maintaining a Transaction Log
-   - A log maintains a list of transactions, where each transaction is a list of actions.
-   - This log is crucial for the undo functionality, tracking the sequence and details of all operations.
+Undo runs independent steps concurrently and checkpoints its progress, so it can resume (see
+perform_undo). It checks the filesystem before reversing each step, so steps that were journaled
+but never ran (crash, failure) are skipped:
 
-4. Implementing Undo Logic
-   - The undo function reverses the actions of the most recent transaction.
-   - Actions are undone in reverse order to maintain integrity.
+    rename, move            renamed back if the target exists and the source does not
+    copy, link, reflink,
+    sync                    target removed if it did not exist before the operation; a target that
+                            was overwritten cannot be restored, which is reported
+    delete                  cannot be reversed; reported
 
-5. Error Handling and User Feedback
-   - Transactions should handle errors gracefully, with the option to roll back immediately if an error occurs.
-   - Clear feedback should be provided to the user regarding the start, end, and status of transactions and undo operations.
+A transaction whose block raised is left uncommitted, like one whose process crashed. A step
+whose operation failed or was refused is followed by an abort record (see journaled), and undo
+ignores it, so it never touches a target the operation did not write.
 
-6. Persistence (Optional)
-   - Consideration for persisting the transaction log to a file for durability and across script executions.
+Usage:
 
-Sample Pseudo-Code:
--------------------
+    with transaction("renameFiles"):
+        with journaled('rename', old_path, new_path):
+            os.rename(old_path, new_path)
 
-# Sample decorator and context manager implementation
+    perform_undo()                      # the most recent transaction, from any process
 
-transactions = []
+Command line:
+
+    lib_undo.py list
+    lib_undo.py undo [TRANSACTION]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from lib_logging import *
+from lib_dryrun import plan_step
+from lib_walk import DEFAULT_WORKERS
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.environ.get('XDG_STATE_HOME') or os.path.expanduser('~/.local/state'),
+                                   'python_libs', 'undo')
+JOURNAL_SUFFIX = '.jsonl'
+UNDONE_SUFFIX = '.undone'
+# Group commit: fsync at most this often, or sooner once this many steps are waiting.
+COMMIT_INTERVAL = 0.05
+COMMIT_RECORDS = 4096
+
+# Undo: concurrency, steps handed to the pool at a time, and steps between progress checkpoints.
+UNDO_WORKERS = DEFAULT_WORKERS
+UNDO_BATCH = 256
+CHECKPOINT_EVERY = 1024
+PROGRESS_SUFFIX = '.progress'
+
+RENAME_OPS = ('rename', 'move')
+CREATE_OPS = ('copy', 'link', 'reflink', 'sync')
+
+
+class Journal:
+    """
+    Append-only journal of one transaction, with group-committed fsync.
+    Safe to use from several threads; see the module docstring for the format.
+    """
+
+    def __init__(self, path, name=None, durable=False, commit_interval=COMMIT_INTERVAL,
+                 commit_records=COMMIT_RECORDS):
+        self.path = path
+        self.durable = durable
+        self.commit_interval = commit_interval
+        self.commit_records = commit_records
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        self._cond = threading.Condition()
+        self._written = 0
+        self._synced = 0
+        self._closing = False
+        header = {'transaction': transaction_id(path), 'name': name, 'pid': os.getpid(),
+                  'cwd': os.getcwd(), 'started': time.time()}
+        os.write(self._fd, (json.dumps(header) + '\n').encode())
+        self._thread = threading.Thread(target=self._commit_loop, name="undo-journal", daemon=True)
+        self._thread.start()
+
+    def record(self, op, src, dst=None, **fields):
+        """
+        Append one step before it is performed. For operations that create `dst`, whether it already
+        existed is recorded too, so undo never removes a file the operation did not create.
+        Returns:
+            int: The step's sequence number.
+        """
+        src = os.path.abspath(src)
+        if dst is not None:
+            dst = os.path.abspath(dst)
+        if op in CREATE_OPS:
+            fields['existed'] = os.path.lexists(dst)
+        step = plan_step(op, src, dst, **fields)
+        with self._cond:
+            self._written += 1
+            seq = step['seq'] = self._written
+            os.write(self._fd, (json.dumps(step) + '\n').encode())
+            if self._written - self._synced >= self.commit_records:
+                self._cond.notify_all()
+            if self.durable:
+                self._cond.notify_all()
+                while self._synced < seq:
+                    self._cond.wait()
+        return seq
+
+    def abort(self, seq):
+        """Append an abort record: the step `seq` failed and did not take effect."""
+        with self._cond:
+            os.write(self._fd, (json.dumps({'op': 'abort', 'seq': seq}) + '\n').encode())
+
+    def _commit_loop(self):
+        with self._cond:
+            while True:
+                self._cond.wait_for(lambda: self._closing or self._written - self._synced >= self.commit_records
+                                    or (self.durable and self._written > self._synced), self.commit_interval)
+                target = self._written
+                if target > self._synced:
+                    # fsync without holding the lock, so appends carry on and join the next group
+                    self._cond.release()
+                    try:
+                        os.fsync(self._fd)
+                    finally:
+                        self._cond.acquire()
+                    self._synced = target
+                    self._cond.notify_all()
+                if self._closing and self._synced == self._written:
+                    return
+
+    def close(self, committed=True):
+        """Mark the transaction finished (if `committed`), sync everything and close the file."""
+        if self._fd is None:
+            return
+        if committed:
+            with self._cond:
+                os.write(self._fd, (json.dumps({'op': 'commit', 'count': self._written}) + '\n').encode())
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+        os.fsync(self._fd)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close(committed=exc_type is None)
+
+
+_current = None
+_current_lock = threading.Lock()
+
+
+def current_journal():
+    """The journal of the active transaction, or None. Shared by all threads of the process."""
+    return _current
+
+
+def record(op, src, dst=None, **fields):
+    """Append a step to the active transaction's journal; does nothing outside a transaction."""
+    journal = _current
+    if journal is not None:
+        return journal.record(op, src, dst, **fields)
 
-def undo_decorator(func):
-    def wrapper(*args, **kwargs):
-        result = func(*args, **kwargs)
-        transactions[-1].append((func, args, kwargs))
-        return result
-    return wrapper
 
 @contextmanager
-def transactional_undo_context():
-    transactions.append([])
-    yield
-    if not transactions[-1]:
-        transactions.pop()
+def journaled(op, src, dst=None, **fields):
+    """
+    Journal a step around the block performing it: the step is recorded before the block runs, and
+    aborted if the block raises. Does nothing outside a transaction.
+    """
+    journal = _current
+    seq = journal.record(op, src, dst, **fields) if journal is not None else None
+    try:
+        yield seq
+    except BaseException:
+        if seq is not None:
+            journal.abort(seq)
+        raise
 
-# Example usage
-with transactional_undo_context():
-    # File operations
 
-def perform_undo():
-    # Logic to undo the last transaction
+def transaction_id(path):
+    name = os.path.basename(path)
+    for suffix in (JOURNAL_SUFFIX, UNDONE_SUFFIX):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name
 
-Note:
------
-This module is currently a placeholder and will be developed and refined further
-based on specific requirements and use cases.
 
-"""
+@contextmanager
+def transaction(name=None, journal_dir=DEFAULT_JOURNAL_DIR, durable=False):
+    """
+    Record every operation performed inside the block as one undoable transaction.
+    Nested transactions join the outer one.
+    Args:
+        name (str): Label shown by list_transactions, e.g. the tool name.
+        journal_dir (str): Directory holding the journals; created if missing.
+        durable (bool): Make every operation wait until its step is fsynced (group commit).
+    Yields:
+        Journal: The active journal.
+    """
+    global _current
+    with _current_lock:
+        outer = _current
+        if outer is None:
+            os.makedirs(journal_dir, exist_ok=True)
+            # Time first, so journal names sort in start order across processes
+            path = os.path.join(journal_dir, f"{time.time_ns():020d}-{os.getpid()}{JOURNAL_SUFFIX}")
+            _current = Journal(path, name, durable)
+    if outer is not None:
+        yield outer
+        return
+    journal = _current
+    committed = False
+    try:
+        yield journal
+        committed = True
+    finally:
+        with _current_lock:
+            _current = None
+        journal.close(committed)
+
+
+def read_journal(path):
+    """
+    Read a journal file.
+    Returns:
+        tuple: (header dict, list of steps, committed flag). Aborted steps, and a torn last line from
+               a crash, are left out.
+    """
+    header, steps, committed, aborted = {}, [], False, set()
+    with open(path) as file:
+        for line in file:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                log_debug(f"Ignoring incomplete journal line in {path}: {line[:80]!r}")
+                continue
+            if 'transaction' in item:
+                header = item
+            elif item.get('op') == 'commit':
+                committed = True
+            elif item.get('op') == 'abort':
+                aborted.add(item.get('seq'))
+            elif 'op' in item:
+                steps.append(item)
+    if aborted:
+        steps = [step for step in steps if step.get('seq') not in aborted]
+    return header, steps, committed
+
+
+def list_transactions(journal_dir=DEFAULT_JOURNAL_DIR, include_undone=False):
+    """
+    List journal files, oldest first.
+    Returns:
+        list: Paths of the journal files.
+    """
+    try:
+        names = os.listdir(journal_dir)
+    except FileNotFoundError:
+        return []
+    suffixes = (JOURNAL_SUFFIX, UNDONE_SUFFIX) if include_undone else (JOURNAL_SUFFIX,)
+    return [os.path.join(journal_dir, name) for name in sorted(names) if name.endswith(suffixes)]
+
+
+def find_transaction(transaction=None, journal_dir=DEFAULT_JOURNAL_DIR):
+    """Path of the journal for a transaction id (or a unique prefix of one); the latest one if None."""
+    journals = list_transactions(journal_dir)
+    if transaction is not None:
+        journals = [path for path in journals if transaction_id(path).startswith(transaction)]
+        if len(journals) > 1:
+            raise ValueError(f"Ambiguous transaction id: {transaction}")
+    if not journals:
+        raise FileNotFoundError(f"No transaction to undo in {journal_dir}")
+    return journals[-1]
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def undo_step(step):
+    """
+    Reverse one journaled step if it took effect.
+    Returns:
+        bool: True if something was reversed, False if there was nothing to do.
+    Raises:
+        OSError: If the reversal failed.
+    """
+    op, src, dst = step['op'], step['src'], step.get('dst')
+    if op in RENAME_OPS:
+        if os.path.lexists(dst) and not os.path.lexists(src):
+            shutil.move(dst, src)
+            return True
+        return False
+    if op in CREATE_OPS:
+        if step.get('existed'):
+            log_error(f"Cannot restore overwritten file: {dst}")
+            return False
+        if os.path.lexists(dst):
+            os.remove(dst)
+            return True
+        return False
+    if op == 'delete':
+        log_error(f"Cannot restore deleted path: {src}")
+        return False
+    log_error(f"Unknown journal step: {step}")
+    return False
+
+
+def _resolve_step(step, cwd):
+    # Journals written before paths were made absolute hold them relative to the writer's cwd
+    for key in ('src', 'dst'):
+        if step.get(key) is not None and cwd:
+            step[key] = os.path.join(cwd, step[key])
+    return step
+
+
+def undo_groups(steps):
+    """
+    Split steps into groups that can be undone independently of each other.
+    Two steps are dependent if they touch the same path, or one touches a directory containing a
+    path the other touches (e.g. a file renamed inside a directory that was moved afterwards).
+    Returns:
+        list: Groups of steps, each in undo order (newest first); largest groups first.
+    """
+    parent = list(range(len(steps)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}
+    for index, step in enumerate(steps):
+        for path in (step['src'], step.get('dst')):
+            if path is None:
+                continue
+            other = owner.setdefault(path, index)
+            if other != index:
+                parent[find(index)] = find(other)
+    for path, index in owner.items():
+        ancestor = os.path.dirname(path)
+        while ancestor and ancestor != path:
+            if ancestor in owner:
+                parent[find(index)] = find(owner[ancestor])
+            path, ancestor = ancestor, os.path.dirname(ancestor)
+
+    groups = {}
+    for index in range(len(steps) - 1, -1, -1):
+        groups.setdefault(find(index), []).append(steps[index])
+    return sorted(groups.values(), key=len, reverse=True)
+
+
+def _batches(groups, size=UNDO_BATCH):
+    # Many tiny groups (typical for mass renames) are handed to the pool a batch at a time
+    batch, count = [], 0
+    for group in groups:
+        batch.append(group)
+        count += len(group)
+        if count >= size:
+            yield batch
+            batch, count = [], 0
+    if batch:
+        yield batch
+
+
+class _Checkpoint:
+    """Sequence numbers of steps already undone, appended to a progress file in batches."""
+
+    def __init__(self, path, every=CHECKPOINT_EVERY):
+        self.path = path
+        self.every = every
+        self.done = set()
+        try:
+            with open(path) as file:
+                for line in file:
+                    if line.strip().isdigit():
+                        self.done.add(int(line))
+        except FileNotFoundError:
+            pass
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def mark(self, seq):
+        with self._lock:
+            self._pending.append(seq)
+            if len(self._pending) >= self.every:
+                self._flush()
+
+    def _flush(self):
+        if self._pending:
+            os.write(self._fd, ''.join(f"{seq}\n" for seq in self._pending).encode())
+            self._pending = []
+
+    def close(self):
+        with self._lock:
+            self._flush()
+        os.fsync(self._fd)
+        os.close(self._fd)
+
+
+def perform_undo(transaction=None, journal_dir=DEFAULT_JOURNAL_DIR, force=False, workers=UNDO_WORKERS):
+    """
+    Undo a transaction and mark its journal as undone.
+    Steps are split into independent groups (see undo_groups); each group is undone newest step first,
+    and groups run concurrently on a thread pool. Progress is checkpointed next to the journal, so an
+    interrupted or partly failed undo resumes where it stopped when run again. After a failure, the
+    rest of that step's group is left alone, and the journal stays available for another attempt.
+    Args:
+        transaction (str): Transaction id or unique prefix; the most recent transaction if None.
+        journal_dir (str): Directory holding the journals.
+        force (bool): Undo even if the process that wrote it is still running.
+        workers (int): Number of groups undone concurrently.
+    Returns:
+        tuple: (steps reversed, steps that failed or were blocked by a failure).
+    """
+    path = find_transaction(transaction, journal_dir)
+    header, steps, committed = read_journal(path)
+    if not committed and not force and _process_alive(header.get('pid', 0)) and header.get('pid') != os.getpid():
+        raise RuntimeError(f"Transaction {transaction_id(path)} is still being written by process {header['pid']}")
+    steps = [_resolve_step(step, header.get('cwd')) for step in steps]
+    base = path[:-len(JOURNAL_SUFFIX)]
+    checkpoint = _Checkpoint(base + PROGRESS_SUFFIX)
+    pending = [step for step in steps if step['seq'] not in checkpoint.done]
+    if len(pending) < len(steps):
+        log_info(f"Resuming undo of {transaction_id(path)}: {len(steps) - len(pending)} steps already done")
+
+    def run(batch):
+        reversed_count = failed = 0
+        for group in batch:
+            for position, step in enumerate(group):
+                try:
+                    if undo_step(step):
+                        reversed_count += 1
+                except OSError as error:
+                    log_error(f"Cannot undo {step['op']} of {step['src']}: {error}")
+                    # Older steps in this group may depend on this one
+                    failed += len(group) - position
+                    break
+                checkpoint.mark(step['seq'])
+        return reversed_count, failed
+
+    try:
+        batches = list(_batches(undo_groups(pending)))
+        if workers > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="undo") as executor:
+                results = list(executor.map(run, batches))
+        else:
+            results = [run(batch) for batch in batches]
+    finally:
+        checkpoint.close()
+    reversed_count, failed = sum(r for r, _ in results), sum(f for _, f in results)
+    lost = sum(1 for step in pending if step['op'] == 'delete' or (step['op'] in CREATE_OPS and step.get('existed')))
+    if lost:
+        log_error(f"{lost} steps of {transaction_id(path)} deleted or overwrote files and cannot be reversed")
+    if not failed:
+        os.rename(path, base + UNDONE_SUFFIX)
+        os.remove(base + PROGRESS_SUFFIX)
+    log_info(f"Undid transaction {transaction_id(path)}: {reversed_count} reversed, {failed} failed")
+    return reversed_count, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List or undo journaled file operations.")
+    parser.add_argument('--journal-dir', default=DEFAULT_JOURNAL_DIR, help="Directory holding the undo journals.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="List transactions, oldest first.")
+    undo = commands.add_parser('undo', help="Undo a transaction (default: the most recent one).")
+    undo.add_argument('transaction', nargs='?', help="Transaction id or unique prefix.")
+    undo.add_argument('--force', action='store_true', help="Undo even if its process is still running.")
+    undo.add_argument('--workers', '-j', type=int, default=UNDO_WORKERS,
+                      help=f"Number of independent groups of steps undone concurrently (default: {UNDO_WORKERS}).")
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for path in list_transactions(args.journal_dir):
+            header, steps, committed = read_journal(path)
+            started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(header.get('started', 0)))
+            state = '' if committed else ' (incomplete)'
+            print(f"{transaction_id(path)}  {started}  {header.get('name') or '-'}  {len(steps)} steps{state}")
+    else:
+        reversed_count, failed = perform_undo(args.transaction, args.journal_dir, args.force, args.workers)
+        print(f"{reversed_count} reversed, {failed} failed", file=sys.stderr)
+        sys.exit(1 if failed else 0)
+
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+lib_walk.py
+-----------
+
+Directory walking shared by the tools: scan_dir lists one directory with os.scandir, and
+walk_entries walks a tree, listing subdirectories in parallel on a bounded thread pool, either as
+fast as the listings complete or in a deterministic name-sorted depth-first order.
+
+Example:
+    for entry in walk_entries('/data', recursive=True):
+        print(entry.path)
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
+from lib_logging import *
+
+# Same default as ThreadPoolExecutor, shared by the thread pools of every tool: their work is I/O bound, not CPU bound.
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+@timed_function(name="scan_dir")
+def scan_dir(path, prune=None):
+    """
+    Lists a single directory with os.scandir, splitting it into files and subdirectories.
+    Symlinks to directories are reported as neither, matching os.walk's default of not following them.
+
+    :param path: The directory to list.
+    :param prune: Optional predicate on a subdirectory name; matching subdirectories are dropped.
+    :return: Tuple (files, subdirs) of os.DirEntry lists.
+    """
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    files.append(entry)
+                elif not entry.is_symlink() and not (prune and prune(entry.name)):
+                    subdirs.append(entry)
+    except OSError as error:
+        log_debug(f"Cannot scan directory {path}: {error}")
+    return files, subdirs
+
+
+def walk_entries(directory, recursive=False, workers=DEFAULT_WORKERS, ordered=False, prune=None, cancel=None):
+    """
+    Walks a directory tree with os.scandir, listing subdirectories in parallel on a bounded thread pool.
+
+    :param directory: The directory to walk.
+    :param recursive: Whether to descend into subdirectories.
+    :param workers: Number of directories listed concurrently; 1 walks serially on the calling thread.
+    :param ordered: Yield entries in a deterministic, name-sorted depth-first order.
+    :param prune: Optional predicate on a subdirectory name; matching subdirectories are never entered.
+    :param cancel: Optional threading.Event; once set, the walk ends before listing another directory.
+    :return: Generator yielding os.DirEntry objects for every non-directory entry.
+    """
+    if not recursive:
+        files, _ = scan_dir(directory)
+        yield from (sorted(files, key=lambda e: e.name) if ordered else files)
+    elif workers <= 1:
+        yield from _walk_serial(directory, ordered, prune, cancel)
+    elif ordered:
+        yield from _walk_ordered(directory, workers, prune, cancel)
+    else:
+        yield from _walk_unordered(directory, workers, prune, cancel)
+
+
+def _cancelled(cancel):
+    return cancel is not None and cancel.is_set()
+
+
+def _walk_serial(directory, ordered, prune, cancel):
+    pending = [directory]
+    while pending and not _cancelled(cancel):
+        files, subdirs = scan_dir(pending.pop(), prune)
+        if ordered:
+            files.sort(key=lambda e: e.name)
+            subdirs.sort(key=lambda e: e.name, reverse=True)
+        yield from files
+        pending.extend(entry.path for entry in subdirs)
+
+
+def _walk_unordered(directory, workers, prune, cancel):
+    # Only keep a couple of scans queued per worker so huge trees do not pile up futures.
+    max_in_flight = workers * 2
+    pending = deque([directory])
+    in_flight = set()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="walk")
+    try:
+        while (pending or in_flight) and not _cancelled(cancel):
+            while pending and len(in_flight) < max_in_flight:
+                in_flight.add(executor.submit(scan_dir, pending.popleft(), prune))
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                pending.extend(entry.path for entry in subdirs)
+                yield from files
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _walk_ordered(directory, workers, prune, cancel):
+    # Directories are consumed strictly in depth-first order; the next few are prefetched in parallel.
+    max_in_flight = workers * 2
+    pending = deque([directory])
+    scans = {}
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="walk")
+    try:
+        while pending and not _cancelled(cancel):
+            for path in islice(pending, max_in_flight):
+                if path not in scans:
+                    scans[path] = executor.submit(scan_dir, path, prune)
+            path = pending.popleft()
+            files, subdirs = scans.pop(path).result()
+            files.sort(key=lambda e: e.name)
+            subdirs.sort(key=lambda e: e.name, reverse=True)
+            pending.extendleft(entry.path for entry in subdirs)
+            yield from files
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
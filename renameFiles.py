@@ -4,29 +4,41 @@ import argparse
 import os
 import re
 import sys
+import time
+import uuid
 import logging
 import argparse
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 
 from lib_dryrun import *
 from lib_fileinput import *
 from lib_logging import *
+from lib_undo import DEFAULT_JOURNAL_DIR, journaled, transaction
 
 # setup_logging(level=logging.ERROR)
-setup_logging(level=logging.DEBUG)
+# Debug output goes through a background writer so renames never wait on console I/O
+LOGGING = dict(level=logging.DEBUG, async_queue=True)
+setup_logging(**LOGGING)
 
 
-def dry_run_perform_rename(old_path, new_path, **kwargs):
-    return f"Dry-run: '{old_path}' -> '{new_path}'"
+def rename_plan(old_path, new_path, **kwargs):
+    return [plan_step('rename', old_path, new_path)]
 
 
 @log_function
-@dry_run_decorator(custom_message=dry_run_perform_rename)
-def perform_rename(old_path, new_path):
+@timed_function(name="perform_rename")
+@dry_run_decorator(plan=rename_plan)
+def perform_rename(old_path, new_path, dry_run=False):
     try:
-        os.rename(old_path, new_path)
+        with journaled('rename', old_path, new_path):
+            os.rename(old_path, new_path)
         log_out(f"'{old_path}' ==> '{new_path}'")
+        return True
     except OSError as error:
         log_error(f"Error renaming file {old_path} to {new_path}: {error}")
+        return False
 
 
 @log_function
@@ -41,30 +53,31 @@ def remove_vowels(s):
     :param s: String from which vowels will be removed
     :return: String with vowels removed
     """
-    result = re.sub(r'[aeiouAEIOU]', '', s)
-    return result
+    return s.translate(_VOWELS)
+
+
+CASE_TRANSFORMS = {
+    'upper': str.upper,
+    'lower': str.lower,
+    'proper': str.title,
+    'title': str.title,
+}
 
 
 def apply_case_transform(name, case_type):
     """Change the case of the string based on the specified case type.
     Args:
         name (str): String to transform.
-        case_type (str): Type of case transformation ('upper', 'lower', 'proper').
+        case_type (str): Type of case transformation ('upper', 'lower', 'proper', 'title').
     Returns:
-        str: Transformed string.
+        str: Transformed string (the original if case_type is unknown).
     """
-    transformed_name = name  # Default to original if no case_type matches
+    transform = CASE_TRANSFORMS.get(case_type)
+    return transform(name) if transform else name
 
-    if case_type == 'upper':
-        transformed_name = name.upper()
-    elif case_type == 'lower':
-        transformed_name = name.lower()
-    elif case_type == 'proper':
-        transformed_name = name.title()
-    elif case_type == 'title':
-        transformed_name = name.title()
 
-    return transformed_name
+# Same operation under the name of the --change-case option
+change_case = apply_case_transform
 
 
 def replace(filename, pattern, replacement):
@@ -77,107 +90,401 @@ def replace(filename, pattern, replacement):
     return re.sub(pattern, replacement, filename)
 
 
+_NUM_FIELD = re.compile(r'\{num(\d*)\}')
+_VOWELS = str.maketrans('', '', 'aeiouAEIOU')
+
+
+def _renumbering_replacer(template, number):
+    """
+    Build a re.sub replacement function for a template containing {num} / {numN} fields, where N is the
+    zero-padded width. Backreferences in the rest of the template are expanded as usual.
+    """
+    parts = _NUM_FIELD.split(template)  # literal, width, literal, width, ..., literal
+
+    def replacer(match):
+        return ''.join(match.expand(part) if i % 2 == 0 else str(number).zfill(int(part or 0))
+                       for i, part in enumerate(parts))
+    return replacer
+
+
+def replace_with_renumbering(filename, pattern, template, number):
+    """Replace a pattern in the filename with a template that may contain {num} / {numN} fields.
+    :param filename: Name of the file
+    :param pattern: Pattern to replace in the filename
+    :param template: Replacement string; {num4} becomes `number` padded to 4 digits
+    :param number: Number to insert
+    :return: Updated filename, e.g. ('IMG-1234', 'IMG-\\d+', 'IMG_{num4}', 1) -> 'IMG_0001'
+    """
+    return re.sub(pattern, _renumbering_replacer(template, number), filename)
+
+
+class RenamePipeline:
+    """
+    The rename options compiled once into a list of transform stages, so that renaming a batch of
+    files costs one compiled regex call per stage per name instead of re-reading the options,
+    recompiling patterns and branching for every file.
+
+    Stages, in order:
+    1. Pattern replacement on the full filename, including extension; {num}/{numN} fields in the
+       replacement are numbered consecutively over the files that match, starting at start_number.
+    2. Case change on the base name only.
+    3. Vowel removal on the base name only.
+
+    Example:
+        pipeline = RenamePipeline(match=r'IMG-\\d+', replace='IMG_{num4}')
+        pipeline.transform_names(['IMG-7.jpg', 'IMG-3.jpg'])  # ['IMG_0001.jpg', 'IMG_0002.jpg']
+    """
+
+    def __init__(self, match=None, replace=None, change_case=None, remove_vowels=False, start_number=1):
+        self.match_regex = re.compile(match) if match else None
+        self.replacement = replace if self.match_regex is not None else None
+        self.numbered = self.replacement is not None and bool(_NUM_FIELD.search(self.replacement))
+        self.next_number = start_number
+
+        self.base_stages = []
+        if change_case:
+            if change_case not in CASE_TRANSFORMS:
+                raise ValueError(f"Invalid case transform: {change_case!r}")
+            self.base_stages.append(CASE_TRANSFORMS[change_case])
+        if remove_vowels:
+            self.base_stages.append(lambda base: base.translate(_VOWELS))
+
+    @classmethod
+    def from_args(cls, args):
+        """Compile the pipeline from parsed command-line arguments."""
+        return cls(getattr(args, 'match', None), getattr(args, 'replace', None), getattr(args, 'change_case', None),
+                   getattr(args, 'remove_vowels', False), getattr(args, 'start_number', 1))
+
+    def matches(self, name):
+        """True if there is no match pattern or the name matches it."""
+        return self.match_regex is None or self.match_regex.search(name) is not None
+
+    def transform_name(self, name):
+        """Apply every stage to a filename (no directory part) and return the new name."""
+        if self.replacement is not None:
+            if self.numbered:
+                name, count = self.match_regex.subn(_renumbering_replacer(self.replacement, self.next_number), name)
+                self.next_number += 1 if count else 0
+            else:
+                name = self.match_regex.sub(self.replacement, name)
+        if self.base_stages:
+            base, ext = os.path.splitext(name)
+            for stage in self.base_stages:
+                base = stage(base)
+            name = base + ext
+        return name
+
+    def transform_names(self, names):
+        """Transform a whole list of filenames in one call; numbering follows the list order."""
+        return [self.transform_name(name) for name in names]
+
+    def transform_paths(self, paths):
+        """Transform the filename part of every path, keeping the directories."""
+        split = [os.path.split(path) for path in paths]
+        new_names = self.transform_names([name for _, name in split])
+        return [os.path.join(directory, name) for (directory, _), name in zip(split, new_names)]
+
+
 @log_function
 def process_files(file_paths, args, dry_run):
     """
     Process each file or directory in the provided file paths according to the specified arguments.
-    This includes handling dry-run output piped as input for further processing.
+    This includes handling a dry-run plan piped as input for further processing.
+    All targets are computed and checked for collisions and cycles (see plan_renames) before the first rename.
     Args:
         file_paths (list): A list of file paths to process, which could come from direct input, a file, or piped from stdin.
-        args (Namespace): Arguments containing options for matching, replacement, removing vowels, changing case, etc.
+        args (Namespace): Arguments containing options for matching, replacement, removing vowels, changing case,
+                          and `workers` for the number of directories renamed concurrently.
         dry_run (bool): Indicates whether to perform operations as a dry-run.
+    Returns:
+        RenameStats: Outcome of the renames, or None in dry-run mode.
     """
-    match_pattern = args.match if hasattr(args, 'match') and args.match else None
+    renames = collect_renames(file_paths, args, dry_run)
+    operations, conflicts = plan_renames(renames, check_existing=not dry_run)
+    for old_path, new_path, reason in conflicts:
+        log_error(f"Not renaming {old_path} to {new_path}: {reason}")
+
+    if dry_run:
+        # Report the net effect, not the temporary steps, so the output can be piped on
+        skipped = {old_path for old_path, _, _ in conflicts}
+        write_plan(plan_step('rename', old_path, new_path)
+                   for old_path, new_path in renames.items() if old_path not in skipped)
+    else:
+        return execute_renames(operations, getattr(args, 'workers', 1))
 
-    for file_path in file_paths:
-        file_path = file_path.strip()
 
+@timed_function
+def collect_renames(file_paths, args, dry_run):
+    """
+    Compute the target of every file to be renamed, without renaming anything.
+    Directories in file_paths are expanded to the files they contain, as in process_files.
+    Returns:
+        dict: old path -> new path, for files whose name actually changes, in input order.
+    """
+    pipeline = RenamePipeline.from_args(args)
+    candidates = []
+
+    # Paths are used verbatim: lib_fileinput already strips line-delimited input, and NUL-delimited
+    # names may legitimately start or end with spaces
+    for file_path in file_paths:
         # For piped input from a dry-run, the file_path might not exist. Skip os.path checks if dry_run is True.
         if dry_run or os.path.exists(file_path):
             # Determine if the current path is a file (or treated as a file in dry-run mode)
             if not os.path.isdir(file_path) or file_path.endswith('/'):
                 # If a match pattern is specified, ensure the file matches; otherwise, process the file
-                if not match_pattern or matches_pattern(file_path, match_pattern):
-                    rename_file(file_path, args, dry_run)
+                if pipeline.matches(file_path):
+                    candidates.append(file_path)
             else:
                 # If it's a directory (and not in dry-run mode), process each file within it
                 for filename in os.listdir(file_path):
                     full_path = os.path.join(file_path, filename)
-                    if os.path.isfile(full_path) and (not match_pattern or matches_pattern(filename, match_pattern)):
-                        rename_file(full_path, args, dry_run)
+                    if os.path.isfile(full_path) and pipeline.matches(filename):
+                        candidates.append(full_path)
         else:
             log_debug(f"Skipping non-existing path: {file_path} (in non-dry-run mode)")
 
+    return {old: new for old, new in zip(candidates, pipeline.transform_paths(candidates)) if old != new}
 
-@log_function
-def rename_file(file_path, args, dry_run):
+
+def _temporary_path(path, taken):
+    directory, name = os.path.split(path)
+    while True:
+        candidate = os.path.join(directory, f".{name}.rename-{uuid.uuid4().hex[:8]}")
+        if candidate not in taken and not os.path.lexists(candidate):
+            return candidate
+
+
+def _occupied(old, new):
     """
-    Perform the renaming operation on a single file based on the specified transformations.
-    Args:
-        file_path (str): The path of the file to be renamed.
-        args: Argument namespace containing transformation flags and values.
-        dry_run (bool): Flag indicating whether to simulate the renaming without making actual changes.
+    True if `new` exists as something other than `old` itself. On case-insensitive filesystems
+    (macOS, Windows) a case-only rename's target "exists" because it is the source.
+    """
+    try:
+        new_stat = os.lstat(new)
+    except FileNotFoundError:
+        return False
+    except OSError:
+        return True
+    try:
+        return not os.path.samestat(os.lstat(old), new_stat)
+    except OSError:
+        return True
 
-    The function processes the file based on the specified flags and patterns in the order of:
-    1. Pattern replacement (applied to the full filename including extension)
-    2. Case change (applied to the base name only)
-    3. Vowel removal (applied to the base name only)
+
+@timed_function
+def plan_renames(renames, check_existing=True):
+    """
+    Turn a set of old -> new mappings into an ordered list of renames that is safe to execute one by one.
+    - Collisions: if several sources map to the same target, or the target already exists and is not
+      itself being renamed away, none of those sources is renamed.
+    - Chains (A->B, B->C): renames run target-first (B->C before A->B) so nothing is overwritten.
+    - Cycles (A->B, B->A): one member is moved to a temporary name first, which breaks the cycle.
+    Everything is done with hash maps, in O(n).
+    Args:
+        renames (dict): old path -> new path.
+        check_existing (bool): Also treat targets that exist on disk as collisions.
+    Returns:
+        tuple: (operations, conflicts) where operations is a list of (old, new) to run in order and
+               conflicts a list of (old, new, reason) that were left alone.
+    """
+    renames = {old: new for old, new in renames.items() if old != new}
+    conflicts = []
+    staying = set()
+    target_counts = Counter(renames.values())
+    for old, new in list(renames.items()):
+        if target_counts[new] > 1:
+            conflicts.append((old, new, f"{target_counts[new]} files would be renamed to the same name"))
+            staying.add(old)
+            del renames[old]
+    # A dropped source stays where it is and can block the rename into it in turn: follow those
+    # blocks through a worklist, so every target is checked on disk at most once.
+    source_of = {new: old for old, new in renames.items()}
+    blocked = [old for old, new in renames.items()
+               if new not in renames and (new in staying or (check_existing and _occupied(old, new)))]
+    while blocked:
+        old = blocked.pop()
+        if old not in renames:
+            continue
+        conflicts.append((old, renames.pop(old), "target already exists"))
+        staying.add(old)
+        if source_of.get(old) in renames:
+            blocked.append(source_of[old])
+
+    sources_of = {new: old for old, new in renames.items()}
+    operations = []
+    done = set()
+
+    def unwind(free_path):
+        # free_path is about to be vacated: run the renames that target it, walking back the chain.
+        while free_path in sources_of:
+            old = sources_of[free_path]
+            if old in done:
+                break
+            operations.append((old, free_path))
+            done.add(old)
+            free_path = old
+
+    # Chains end at a target that is not itself a source; start there and walk back.
+    for old, new in renames.items():
+        if new not in renames and old not in done:
+            unwind(new)
+    # Whatever is left forms cycles.
+    taken = set(renames) | set(renames.values())
+    for old, new in renames.items():
+        if old in done:
+            continue
+        temporary = _temporary_path(old, taken)
+        taken.add(temporary)
+        operations.append((old, temporary))
+        done.add(old)
+        unwind(old)
+        operations.append((temporary, new))
+    return operations, conflicts
+
+
+class RenameStats:
+    """
+    Outcome of execute_renames.
+    Attributes:
+        renamed (int): Renames that succeeded.
+        failed (int): Renames that failed (perform_rename logs each one).
+        seconds (float): Wall time of the execution.
     """
 
-    directory, full_name = os.path.split(file_path)
-    base_name, ext = os.path.splitext(full_name)
+    def __init__(self, renamed=0, failed=0, seconds=0.0):
+        self.renamed = renamed
+        self.failed = failed
+        self.seconds = seconds
 
-    # Apply pattern replacement if the match pattern is specified and the filename matches
-    log_debug(f"args.match: {args.match}, args.repace: {args.replace}")
-    if args.match and (args.replace or args.replace=="") and matches_pattern(full_name, args.match):
-        full_name = replace(full_name, args.match, args.replace)
-        base_name, ext = os.path.splitext(full_name)  # Re-split if pattern replacement changed the extension
-    elif not args.replace:
-        log_debug("failing due to args.replace")
-    elif not args.match:
-        log_debug("failing due to args.match")
+    def summary(self):
+        rate = self.renamed / self.seconds if self.seconds > 0 else 0.0
+        return f"{self.renamed} renamed in {self.seconds:.3f}s ({rate:.0f}/s); {self.failed} errors"
 
-    # Apply case transformation to the base name only
-    if args.change_case:
-        base_name = apply_case_transform(base_name, args.change_case)
-    else:
-        log_debug(f"No change to case: args.change_case = {args.change_case}")
 
-    # Apply vowel removal to the base name only
-    if args.remove_vowels:
-        base_name = remove_vowels(base_name)
+def _run_shard(operations):
+    renamed = failed = 0
+    for old_path, new_path in operations:
+        if perform_rename(old_path, new_path):
+            renamed += 1
+        else:
+            failed += 1
+    return renamed, failed
+
+
+def shard_by_directory(operations):
+    """
+    Group planned renames by parent directory, keeping their order within each group.
+    Renames from plan_renames only depend on each other inside one directory, so the groups can run
+    concurrently. If any rename moves a file to another directory, a single group is returned.
+    Returns:
+        list: Lists of (old, new) operations.
+    """
+    shards = defaultdict(list)
+    for old_path, new_path in operations:
+        directory = os.path.dirname(old_path)
+        if os.path.dirname(new_path) != directory:
+            return [list(operations)]
+        shards[directory].append((old_path, new_path))
+    return list(shards.values())
+
+
+@timed_function
+def execute_renames(operations, workers=1):
+    """
+    Run renames from plan_renames. With workers > 1, directories are renamed concurrently on a thread pool
+    while the renames within each directory keep their planned order (see shard_by_directory).
+    Returns:
+        RenameStats: Successes, failures and elapsed time.
+    """
+    started = time.perf_counter()
+    shards = shard_by_directory(operations) if workers > 1 else [operations]
+    if len(shards) > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rename") as executor:
+            results = list(executor.map(_run_shard, shards))
     else:
-        log_debug(f"No removal of vowels: args.remove_vowels = {args.remove_vowels}")
+        results = [_run_shard(shard) for shard in shards]
+    stats = RenameStats(sum(r for r, _ in results), sum(f for _, f in results), time.perf_counter() - started)
+    log_info(f"rename: {stats.summary()}")
+    return stats
 
-    # Construct the new file path
-    new_path = os.path.join(directory, base_name + ext)
+
+def apply_rename_plan(steps, workers=1):
+    """
+    Perform the renames of a plan written by --dry-run (see lib_dryrun) exactly as planned, without
+    recomputing any transform. The plan is still checked for collisions and cycles (see plan_renames)
+    against the current state of the filesystem.
+    Args:
+        steps (iterable): Plan steps; steps other than 'rename' are logged and skipped.
+        workers (int): Number of directories renamed concurrently.
+    Returns:
+        RenameStats: Outcome of the renames.
+    """
+    renames = {}
+    for step in steps:
+        if step['op'] != 'rename' or 'dst' not in step:
+            log_error(f"Cannot apply plan step here: {step}")
+            continue
+        renames[step['src']] = step['dst']
+    operations, conflicts = plan_renames(renames)
+    for old_path, new_path, reason in conflicts:
+        log_error(f"Not renaming {old_path} to {new_path}: {reason}")
+    return execute_renames(operations, workers)
+
+
+@log_function
+def rename_file(file_path, args, dry_run):
+    """
+    Perform the renaming operation on a single file based on the specified transformations.
+    Args:
+        file_path (str): The path of the file to be renamed.
+        args: Argument namespace containing transformation flags and values.
+        dry_run (bool): Flag indicating whether to simulate the renaming without making actual changes.
+    """
+    new_path = compute_new_path(file_path, args)
 
     # Perform the rename operation
     if new_path != file_path:
         # Call the decorated renaming function
-        perform_rename(file_path, new_path)
-
-        # if dry_run:
-            # In the function that generates dry-run output
-            # if dry_run and os.path.isdir(file_path):
-                # log_out(f"dry-run: '{file_path}' -> '{new_path}/'")  
-            # elif dry_run:
-                # log_out(f"dry-run: '{file_path}' -> '{new_path}'")  
-        # else:
-            # os.rename(file_path, new_path)
-            # log_out(f"{file_path}' -> '{new_path}'")  
+        perform_rename(file_path, new_path, dry_run=dry_run)
     else:
         log_debug(f"No change to filename: {new_path} == {file_path}")
 
 
+def compute_new_path(file_path, args):
+    """
+    Compute the path a file would be renamed to, based on the specified transformations (see RenamePipeline).
+    To rename many files, compile a RenamePipeline once and use transform_paths instead.
+    Args:
+        file_path (str): The path of the file to be renamed.
+        args: Argument namespace containing transformation flags and values.
+    Returns:
+        str: The new path (equal to file_path if nothing changes).
+    """
+    return RenamePipeline.from_args(args).transform_paths([file_path])[0]
+
+
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Rename files based on given patterns and transformations with optional dry-run simulation.")
-    parser.add_argument('--dry-run', action='store_true', help="Simulate the rename operations without performing them.")
+    parser.add_argument('--dry-run', action='store_true', help="Print the planned renames as JSON lines (see --apply-plan) without performing them.")
     parser.add_argument('--match', '-m', help="Match pattern to filter files.")
     parser.add_argument('--replace', '-rp', '-re', help="Replacement string for matched filenames.")
     parser.add_argument('--remove-vowels', '-rv', action='store_true', help="Remove vowels from filenames.")
-    parser.add_argument('--change-case', '-cc', choices=['upper', 'lower', 'proper'], help="Change case of filenames.")
+    parser.add_argument('--change-case', '-cc', choices=sorted(CASE_TRANSFORMS), help="Change case of filenames.")
+    parser.add_argument('--start-number', '-sn', type=int, default=1,
+                        help="First number for {num}/{numN} fields in the replacement (e.g. IMG_{num4}).")
+    parser.add_argument('--workers', '-j', type=int, default=1,
+                        help="Rename files in this many directories concurrently (renames within a directory stay in order).")
+    parser.add_argument('--stats', action='store_true', help="Print the number of renames and throughput to stderr.")
+    parser.add_argument('--timings', metavar='FILE',
+                        help="Write per-step wall/CPU time, call counts and latency histograms as JSON on exit.")
+    parser.add_argument('--trace', metavar='FILE', help="Write a Chrome trace-event file (chrome://tracing) on exit.")
+    parser.add_argument('--apply-plan', metavar='PLAN',
+                        help="Perform the renames of a plan written by --dry-run ('-' for stdin) instead of computing them.")
+    parser.add_argument('--journal', nargs='?', const=DEFAULT_JOURNAL_DIR, metavar='DIR',
+                        help=f"Journal every rename so it can be undone with lib_undo.py (default dir: {DEFAULT_JOURNAL_DIR}).")
     parser.add_argument('--from-file', '-ff', help="Read file names from a file (one per line).")
+    parser.add_argument('--null', '-0', action='store_true',
+                        help="Input file names are NUL-terminated (find -print0, findFiles.py -0) and used verbatim.")
     parser.add_argument('files', nargs='*', help="Files to be renamed.")
     # Add other arguments as necessary
     return parser.parse_args()
@@ -186,20 +493,29 @@ def parse_arguments():
 def main():
     args = parse_arguments()
     dry_run_flag = args.dry_run
+    if args.timings or args.trace:
+        enable_timings(args.timings, args.trace)
 
     if args.replace and not args.match:
         parser.error("--replace requires --match to be specified.")
         sys.exit(1)
 
 
-    # Determine the file paths to process
-    file_paths, detected_dry_run = get_file_paths_from_input(args)
+    if not args.apply_plan:
+        # Determine the file paths to process
+        file_paths, detected_dry_run = iter_file_paths_from_input(args)
 
-    # If dry-run was detected from piped input, override the script's dry-run state
-    if detected_dry_run:
-        args.dry_run = True
+        # If dry-run was detected from piped input, override the script's dry-run state
+        if detected_dry_run:
+            args.dry_run = True
 
-    process_files(file_paths, args, args.dry_run)
+    with transaction("renameFiles", args.journal) if args.journal and not args.dry_run else nullcontext():
+        if args.apply_plan:
+            stats = apply_rename_plan(read_plan(args.apply_plan), args.workers)
+        else:
+            stats = process_files(file_paths, args, args.dry_run)
+    if args.stats and stats is not None:
+        print(stats.summary(), file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,382 @@
+# test_dirFileActions.py
+
+import unittest
+import errno
+import os
+import shutil
+import tempfile
+import threading
+import time
+import io
+import contextlib
+from unittest import mock
+import dirFileActions
+import lib_dryrun
+import lib_delete
+import lib_fastcopy
+import lib_rename
+import lib_scheduler
+from lib_scheduler import Transfer, run_transfers
+
+
+class TestCopyFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp(prefix='test_dirFileActions_')
+        self.src_dir = os.path.join(self.test_dir, 'src')
+        self.dst_dir = os.path.join(self.test_dir, 'dst')
+        os.makedirs(self.src_dir)
+        os.makedirs(self.dst_dir)
+        self.files = {'small.txt': b'hello', 'empty.txt': b'', 'big.bin': os.urandom(3 * lib_fastcopy.BUFFER_SIZE + 17)}
+        for name, data in self.files.items():
+            with open(self.src(name), 'wb') as f:
+                f.write(data)
+        os.chmod(self.src('small.txt'), 0o640)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def src(self, name):
+        return os.path.join(self.src_dir, name)
+
+    def dst(self, name):
+        return os.path.join(self.dst_dir, name)
+
+    def assertCopied(self):
+        for name, data in self.files.items():
+            with open(self.dst(name), 'rb') as f:
+                self.assertEqual(f.read(), data)
+        self.assertEqual(os.stat(self.dst('small.txt')).st_mode & 0o777, 0o640)
+
+    def test_copy_files(self):
+        stats = dirFileActions.copy_files([self.src(n) for n in self.files], self.dst_dir)
+        self.assertCopied()
+        self.assertEqual((stats.files, stats.errors), (3, 0))
+        self.assertEqual(stats.bytes, sum(len(d) for d in self.files.values()))
+
+    def test_each_method(self):
+        for method in lib_fastcopy.METHODS:
+            with self.subTest(method=method):
+                # reflink is often unsupported (tmpfs, ext4); the plain copy must then take over
+                methods = (method, 'readwrite')
+                for name in self.files:
+                    _, size, used = lib_fastcopy.copy_file(self.src(name), self.dst_dir, methods)
+                    self.assertEqual(size, len(self.files[name]))
+                    self.assertIn(used, methods)
+                self.assertCopied()
+
+    def test_errors_are_collected(self):
+        stats = dirFileActions.copy_files([self.src('missing'), self.src('small.txt')], self.dst_dir)
+        self.assertEqual((stats.files, stats.errors), (1, 1))
+        with self.assertRaises(shutil.SameFileError):
+            lib_fastcopy.copy_file(self.src('small.txt'), self.src_dir)
+
+    def test_dry_run(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertIsNone(dirFileActions.copy_files([self.src('small.txt')], self.dst_dir, dry_run=True))
+            dirFileActions.delete_files([self.src('empty.txt')], dry_run=True)
+        self.assertFalse(os.path.exists(self.dst('small.txt')))
+        steps = list(lib_dryrun.read_plan(io.StringIO(out.getvalue())))
+        self.assertEqual(steps, [{'op': 'copy', 'src': self.src('small.txt'), 'dst': self.dst('small.txt')},
+                                 {'op': 'delete', 'src': self.src('empty.txt'), 'recursive': False}])
+        results = dirFileActions.apply_plan(steps, workers=2)
+        self.assertEqual((results[0].files, results[1].deleted), (1, 1))
+        with open(self.dst('small.txt'), 'rb') as f:
+            self.assertEqual(f.read(), self.files['small.txt'])
+        self.assertFalse(os.path.exists(self.src('empty.txt')))
+
+    def test_move_files(self):
+        reports = []
+        stats = dirFileActions.move_files([self.src(n) for n in self.files], self.dst_dir, workers=4,
+                                          report=reports.append)
+        self.assertEqual((stats.files, stats.errors), (3, 0))
+        self.assertEqual(stats.methods['rename'], 3)
+        self.assertCopied()
+        self.assertEqual(os.listdir(self.src_dir), [])
+        self.assertIn('3 via rename', reports[0])
+
+        # An existing target is never silently replaced
+        with open(self.src('small.txt'), 'w') as f:
+            f.write('newer')
+        stats = dirFileActions.move_files([self.src('small.txt')], self.dst_dir)
+        self.assertEqual(stats.errors, 1)
+        self.assertTrue(os.path.exists(self.src('small.txt')))
+
+    def test_move_same_name_sources(self):
+        sources = []
+        for sub in ['a', 'b']:
+            os.makedirs(os.path.join(self.src_dir, sub))
+            sources.append(os.path.join(self.src_dir, sub, 'same.txt'))
+            with open(sources[-1], 'w') as f:
+                f.write(sub)
+        for _ in range(20):
+            stats = dirFileActions.move_files(sources, self.dst_dir, workers=4)
+            self.assertEqual((stats.files, stats.errors), (1, 1))
+            # The file that lost keeps its source; nothing is overwritten
+            with open(self.dst('same.txt')) as f:
+                moved = f.read()
+            remaining = [path for path in sources if os.path.exists(path)]
+            self.assertEqual(len(remaining), 1)
+            self.assertNotEqual(os.path.basename(os.path.dirname(remaining[0])), moved)
+            os.rename(self.dst('same.txt'), os.path.join(self.src_dir, moved, 'same.txt'))
+
+    def test_move_is_a_single_rename(self):
+        # Same-device moves are one renameat2 call: never a hardlink at both paths, even for a moment
+        with mock.patch('os.link', side_effect=AssertionError("moves must not hardlink")):
+            stats = dirFileActions.move_files([self.src(n) for n in self.files], self.dst_dir)
+        self.assertEqual(stats.methods['rename'], 3)
+        self.assertCopied()
+
+    def test_move_without_renameat2(self):
+        with open(self.dst('small.txt'), 'w') as f:
+            f.write('older')
+        with mock.patch.object(lib_rename, '_renameat2', False):
+            stats = dirFileActions.move_files([self.src(n) for n in self.files], self.dst_dir)
+        self.assertEqual((stats.methods['rename'], stats.errors), (2, 1))
+        self.assertTrue(os.path.exists(self.src('small.txt')))
+
+    def test_same_target_is_written_once(self):
+        sources = []
+        for sub in ['a', 'b']:
+            os.makedirs(os.path.join(self.src_dir, sub))
+            sources.append(os.path.join(self.src_dir, sub, 'same.bin'))
+            with open(sources[-1], 'wb') as f:
+                f.write(sub.encode() * 4 * lib_fastcopy.BUFFER_SIZE)
+        stats = dirFileActions.copy_files(sources, self.dst_dir, workers=4)
+        self.assertEqual((stats.files, stats.errors), (1, 1))
+        with open(self.dst('same.bin'), 'rb') as f:
+            self.assertEqual(f.read(), b'a' * 4 * lib_fastcopy.BUFFER_SIZE)
+        stats = dirFileActions.sync_files([os.path.join(self.src_dir, 'a') + os.sep,
+                                           os.path.join(self.src_dir, 'b') + os.sep], self.dst_dir, workers=4)
+        self.assertEqual((stats.files, stats.errors), (1, 1))
+
+    def test_link_mode(self):
+        stats = dirFileActions.copy_files([self.src(n) for n in self.files], self.dst_dir, mode='link')
+        self.assertEqual(stats.methods['link'], 3)
+        self.assertCopied()
+        self.assertTrue(os.path.samefile(self.src('big.bin'), self.dst('big.bin')))
+        with self.assertRaises(ValueError):
+            dirFileActions.copy_files([], self.dst_dir, mode='symlink')
+
+    def test_reflink_mode_never_copies_bytes(self):
+        with open(self.dst('small.txt'), 'wb') as f:
+            f.write(b'keep me')
+        stats = dirFileActions.copy_files([self.src(n) for n in self.files], self.dst_dir, mode='reflink', workers=2)
+        # Filesystems without reflink support (ext4, tmpfs) fail every file instead of copying it
+        self.assertEqual(stats.files + stats.errors, 3)
+        self.assertEqual(set(stats.methods) - {'reflink'}, set())
+        if stats.errors:
+            self.assertRefusedClonesLeftNoTrace()
+        else:
+            self.assertCopied()
+
+    def test_refused_clone_leaves_target_untouched(self):
+        with open(self.dst('small.txt'), 'wb') as f:
+            f.write(b'keep me')
+        refused = OSError(errno.EOPNOTSUPP, "Operation not supported")
+        with mock.patch.object(lib_fastcopy, '_reflink', side_effect=refused):
+            stats = dirFileActions.copy_files([self.src(n) for n in self.files], self.dst_dir, mode='reflink')
+        self.assertEqual((stats.files, stats.errors), (0, 3))
+        self.assertRefusedClonesLeftNoTrace()
+
+    def assertRefusedClonesLeftNoTrace(self):
+        # The existing target keeps its contents, and neither empty targets nor temporary files appear
+        with open(self.dst('small.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'keep me')
+        self.assertEqual(os.listdir(self.dst_dir), ['small.txt'])
+
+    def test_plan_report(self):
+        transfers = [Transfer('a', 'd', 10, (1, 1)), Transfer('b', 'd', 5, (1, 2)), Transfer('c', 'd', 7, (2, 2))]
+        self.assertEqual(dirFileActions.plan_report(transfers, 'link'),
+                         "link plan: 3 files, 2 via link (17 bytes, no data moved), 1 copying bytes (5 bytes)")
+        self.assertEqual(dirFileActions.plan_report(transfers, 'copy'),
+                         "copy plan: 3 files, 3 copying bytes (22 bytes)")
+        self.assertEqual(dirFileActions.plan_report(transfers, 'reflink'),
+                         "reflink plan: 3 files, 2 via reflink (17 bytes, no data moved), 1 on another device, "
+                         "cannot be cloned")
+
+    def test_sync_files(self):
+        os.makedirs(os.path.join(self.src_dir, 'nested', 'deeper'))
+        nested = os.path.join(self.src_dir, 'nested', 'deeper', 'n.txt')
+        with open(nested, 'w') as f:
+            f.write('nested')
+
+        stats = dirFileActions.sync_files([self.src_dir + os.sep], self.dst_dir, workers=4)
+        self.assertEqual(stats.files, 4)
+        self.assertNotIn('skipped', stats.methods)
+        self.assertCopied()
+        self.assertTrue(os.path.exists(self.dst(os.path.join('nested', 'deeper', 'n.txt'))))
+
+        # Nothing changed: everything is skipped
+        stats = dirFileActions.sync_files([self.src_dir + os.sep], self.dst_dir)
+        self.assertEqual(stats.methods['skipped'], 4)
+
+        # Same size and mtime but different content: only --checksum notices
+        with open(self.dst('small.txt'), 'w') as f:
+            f.write('HELLO')
+        st = os.stat(self.src('small.txt'))
+        os.utime(self.dst('small.txt'), ns=(st.st_atime_ns, st.st_mtime_ns))
+        stats = dirFileActions.sync_files([self.src('small.txt')], self.dst_dir)
+        self.assertEqual(stats.methods['skipped'], 1)
+        stats = dirFileActions.sync_files([self.src('small.txt')], self.dst_dir, checksum=True)
+        self.assertEqual(stats.methods['skipped'], 0)
+        self.assertCopied()
+
+        # Without a trailing separator the directory itself is recreated under the destination
+        dirFileActions.sync_files([os.path.join(self.src_dir, 'nested')], self.dst_dir)
+        self.assertTrue(os.path.exists(self.dst(os.path.join('nested', 'deeper', 'n.txt'))))
+
+    def test_input_is_streamed(self):
+        # With two transfers per batch, a copy has finished before the input is read to the end
+        copied_before_end = []
+
+        def sources():
+            yield from (self.src(name) for name in self.files)
+            copied_before_end.append(len(os.listdir(self.dst_dir)) > 0)
+
+        with mock.patch.object(lib_scheduler, 'PLAN_BATCH', 2), mock.patch.object(lib_scheduler, 'PLAN_LOW_WATER', 1):
+            stats = dirFileActions.copy_files(sources(), self.dst_dir, workers=2)
+        self.assertEqual(stats.files, 3)
+        self.assertEqual(copied_before_end, [True])
+        self.assertCopied()
+
+
+class TestDeleteFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp(prefix='test_delete_')
+        self.addCleanup(shutil.rmtree, self.test_dir, ignore_errors=True)
+        self.tree = os.path.join(self.test_dir, 'tree')
+        for sub in ['', 'a', os.path.join('a', 'b'), 'c']:
+            os.makedirs(os.path.join(self.tree, sub), exist_ok=True)
+            for i in range(5):
+                open(os.path.join(self.tree, sub, f'f{i}'), 'a').close()
+        self.outside = os.path.join(self.test_dir, 'outside')
+        os.makedirs(self.outside)
+        open(os.path.join(self.outside, 'keep'), 'a').close()
+        os.symlink(self.outside, os.path.join(self.tree, 'link'))
+
+    def test_delete_tree(self):
+        original = lib_delete.CHUNK_SIZE
+        lib_delete.CHUNK_SIZE = 2
+        self.addCleanup(setattr, lib_delete, 'CHUNK_SIZE', original)
+        loose = os.path.join(self.test_dir, 'loose')
+        open(loose, 'a').close()
+
+        stats = dirFileActions.delete_files([self.tree, loose], recursive=True, workers=4)
+        self.assertEqual(stats.failures, [])
+        # 20 files + 1 symlink + 4 directories + 1 loose file
+        self.assertEqual(stats.deleted, 26)
+        self.assertFalse(os.path.exists(self.tree))
+        self.assertTrue(os.path.exists(os.path.join(self.outside, 'keep')))
+
+    def test_each_directory_is_opened_once(self):
+        for name, value in [('CHUNK_SIZE', 2), ('MAX_OPEN_DIRS', 1)]:
+            self.addCleanup(setattr, lib_delete, name, getattr(lib_delete, name))
+            setattr(lib_delete, name, value)
+        with mock.patch('lib_delete.os.open', wraps=os.open) as open_dir:
+            stats = dirFileActions.delete_files([self.tree], recursive=True, workers=4)
+        self.assertEqual((stats.deleted, stats.failures), (25, []))
+        # tree, a, a/b and c: everything below a directory is reached through its descriptor
+        self.assertEqual(open_dir.call_count, 4)
+        self.assertTrue(os.path.exists(os.path.join(self.outside, 'keep')))
+
+    def test_input_is_read_as_files_are_deleted(self):
+        self.addCleanup(setattr, lib_delete, 'CHUNK_SIZE', lib_delete.CHUNK_SIZE)
+        lib_delete.CHUNK_SIZE = 2
+        names = [os.path.join(self.test_dir, f'loose{i}') for i in range(200)]
+        for name in names:
+            open(name, 'a').close()
+        unlinked = []
+        lags = []
+
+        def unlink_paths(paths):
+            result = real_unlink_paths(paths)
+            unlinked.extend(paths)
+            return result
+
+        def paths():
+            for count, name in enumerate(names):
+                lags.append(count - len(unlinked))
+                yield name
+
+        real_unlink_paths = lib_delete._unlink_paths
+        with mock.patch.object(lib_delete, '_unlink_paths', unlink_paths):
+            stats = lib_delete.delete_paths(paths(), workers=2)
+        self.assertEqual((stats.deleted, stats.failures), (200, []))
+        # Reading waits for the workers: at most 2 * workers chunks are queued, plus the one being filled
+        self.assertLessEqual(max(lags), (2 * 2 + 1) * 2)
+
+    def test_failures_are_collected(self):
+        missing = os.path.join(self.test_dir, 'missing')
+        stats = dirFileActions.delete_files([missing, self.tree, os.path.join(self.tree, 'f0')])
+        self.assertEqual(stats.deleted, 1)
+        self.assertEqual(sorted(path for path, _ in stats.failures), sorted([missing, self.tree]))
+        self.assertTrue(os.path.isdir(self.tree))
+
+
+class TestRunTransfers(unittest.TestCase):
+
+    def test_budget_and_device_cap(self):
+        mib = 1024 * 1024
+        transfers = [Transfer(f'large{i}', 'dst', 40 * mib, ('a', 'x')) for i in range(6)]
+        transfers += [Transfer(f'small{i}', 'dst', 10, ('b', 'x')) for i in range(20)]
+        transfers.append(Transfer('huge', 'dst', 500 * mib, ('a', 'x')))
+        lock = threading.Lock()
+        state = {'large_bytes': 0, 'max_large_bytes': 0, 'a_running': 0, 'max_a_running': 0}
+        order = []
+
+        def operation(transfer):
+            large = transfer.size > lib_scheduler.SMALL_FILE_BYTES
+            with lock:
+                order.append(transfer.src)
+                if large:
+                    state['large_bytes'] += min(transfer.size, 100 * mib)
+                    state['max_large_bytes'] = max(state['max_large_bytes'], state['large_bytes'])
+                    state['a_running'] += 1
+                    state['max_a_running'] = max(state['max_a_running'], state['a_running'])
+            time.sleep(0.005)
+            with lock:
+                if large:
+                    state['large_bytes'] -= min(transfer.size, 100 * mib)
+                    state['a_running'] -= 1
+            return transfer.size, 'test'
+
+        stats = run_transfers(transfers, operation, workers=8, max_inflight_bytes=100 * mib, per_device_workers=3)
+        self.assertEqual((stats.files, stats.errors), (27, 0))
+        self.assertLessEqual(state['max_large_bytes'], 100 * mib)
+        self.assertLessEqual(state['max_a_running'], 3)
+        # Small files on the other device are not held back behind the large ones
+        self.assertLess(order.index('small5'), order.index('large5'))
+
+    def test_errors_are_counted(self):
+        def operation(transfer):
+            raise OSError(f"cannot {transfer.src}")
+        stats = run_transfers([Transfer('a', 'b', 1, (1, 1))], operation, workers=2)
+        self.assertEqual((stats.files, stats.errors), (0, 1))
+
+    def test_no_barrier_between_batches(self):
+        # A slow transfer at the end of one batch must not hold back the transfers read after it
+        transfers = [Transfer(f'f{i}', 'dst', 10, (1, 1)) for i in range(3)]
+        transfers.append(Transfer('slow', 'dst', 10, (1, 1)))
+        transfers += [Transfer(f'f{i}', 'dst', 10, (1, 1)) for i in range(3, 12)]
+        others_done = threading.Event()
+        finished = []
+
+        def operation(transfer):
+            if transfer.src == 'slow':
+                others_done.wait(5)
+            finished.append(transfer.src)
+            if len(finished) == len(transfers) - 1:
+                others_done.set()
+            return transfer.size, 'test'
+
+        with mock.patch.object(lib_scheduler, 'PLAN_BATCH', 4), mock.patch.object(lib_scheduler, 'PLAN_LOW_WATER', 2):
+            stats = run_transfers(iter(transfers), operation, workers=2)
+        self.assertEqual(stats.files, len(transfers))
+        self.assertEqual(finished[-1], 'slow')
+
+
+if __name__ == '__main__':
+    unittest.main()
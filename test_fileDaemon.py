@@ -0,0 +1,100 @@
+# test_fileDaemon.py
+
+import unittest
+import os
+import select
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+import fileClient
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class TestFileDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp(prefix='test_fileDaemon_')
+        self.socket = os.path.join(self.test_dir, 'daemon.sock')
+        for name in ['a.txt', 'b.txt', 'c.doc']:
+            open(os.path.join(self.test_dir, name), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def client(self, *args, socket=None, input=''):
+        return subprocess.run([sys.executable, os.path.join(HERE, 'fileClient.py'), '--socket', socket or self.socket]
+                              + list(args), input=input, capture_output=True, text=True, cwd=self.test_dir)
+
+    def start_daemon(self):
+        daemon = subprocess.Popen([sys.executable, os.path.join(HERE, 'fileDaemon.py'), '--socket', self.socket],
+                                  stderr=subprocess.DEVNULL)
+        self.addCleanup(daemon.wait)
+        self.addCleanup(daemon.terminate)
+        for _ in range(100):
+            if os.path.exists(self.socket):
+                return daemon
+            time.sleep(0.05)
+        self.fail("daemon did not start")
+
+    def test_requests_run_in_daemon_with_client_stdio_and_cwd(self):
+        daemon = self.start_daemon()
+        found = self.client('findFiles', '*.txt', '.', '-s')
+        self.assertEqual((found.returncode, found.stdout), (0, './a.txt\n./b.txt\n'))
+        renamed = self.client('renameFiles', '-cc', 'upper', input=found.stdout)
+        self.assertEqual(renamed.returncode, 0)
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ['A.txt', 'B.txt', 'c.doc', 'daemon.sock'])
+        self.assertEqual(self.client('findFiles').returncode, 2)
+        daemon.terminate()
+        daemon.wait()
+        self.assertFalse(os.path.exists(self.socket))
+
+    def test_silent_client_does_not_block_others(self):
+        self.start_daemon()
+        silent = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(silent.close)
+        silent.connect(self.socket)
+        found = self.client('findFiles', '*.doc', '.')
+        self.assertEqual((found.returncode, found.stdout), (0, './c.doc\n'))
+
+    def watch_in_daemon(self):
+        client = subprocess.Popen([sys.executable, os.path.join(HERE, 'fileClient.py'), '--socket', self.socket,
+                                   'findFiles', '*.new', '.', '--watch'], cwd=self.test_dir,
+                                  stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, text=True)
+        self.addCleanup(client.stdout.close)
+        # The watch reports files created after it started, so a line shows it is running in the daemon
+        for _ in range(100):
+            open(os.path.join(self.test_dir, 'x.new'), 'w').close()
+            os.remove(os.path.join(self.test_dir, 'x.new'))
+            if select.select([client.stdout], [], [], 0.05)[0]:
+                break
+        self.assertEqual(client.stdout.readline().strip(), os.path.join('.', 'x.new'))
+        return client
+
+    def test_signals_are_forwarded(self):
+        self.start_daemon()
+        client = self.watch_in_daemon()
+        client.send_signal(signal.SIGINT)
+        # findFiles --watch ends quietly on Ctrl-C, as when run directly
+        self.assertEqual(client.wait(5), 0)
+        client = self.watch_in_daemon()
+        client.terminate()
+        self.assertEqual(client.wait(5), -signal.SIGTERM)
+
+    def test_daemon_of_another_user_is_ignored(self):
+        self.start_daemon()
+        with mock.patch('fileClient.peer_uid', return_value=os.getuid() + 1), \
+                mock.patch('sys.stderr') as stderr:
+            self.assertIsNone(fileClient.run_in_daemon('findFiles', ['*.txt', '.'], self.socket))
+        self.assertIn('served by user', ''.join(call.args[0] for call in stderr.write.call_args_list))
+
+    def test_fallback_without_daemon(self):
+        found = self.client('findFiles', '*.doc', '.', socket=os.path.join(self.test_dir, 'missing.sock'))
+        self.assertEqual((found.returncode, found.stdout), (0, './c.doc\n'))
+
+if __name__ == '__main__':
+    unittest.main()
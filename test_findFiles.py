@@ -0,0 +1,185 @@
+# test_findFiles.py
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import time
+from unittest import mock
+import findFiles
+import lib_dirindex
+from lib_dirindex import DirIndex
+
+
+class TestFindFiles(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Set up a small tree: two levels of directories with a mix of extensions
+        cls.test_dir = tempfile.mkdtemp(prefix='test_findFiles_')
+        cls.expected_txt = []
+        for sub in ['', 'a', 'b', os.path.join('a', 'c')]:
+            dir_path = os.path.join(cls.test_dir, sub)
+            os.makedirs(dir_path, exist_ok=True)
+            for name in ['one.txt', 'two.txt', 'three.jpg']:
+                path = os.path.join(dir_path, name)
+                open(path, 'a').close()
+                if name.endswith('.txt'):
+                    cls.expected_txt.append(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.test_dir)
+
+    def test_non_recursive(self):
+        found = sorted(findFiles.find_files(self.test_dir, '*.txt'))
+        self.assertEqual(found, sorted(os.path.join(self.test_dir, n) for n in ['one.txt', 'two.txt']))
+
+    def test_recursive_parallel(self):
+        found = sorted(findFiles.find_files(self.test_dir, '*.txt', recursive=True, workers=4))
+        self.assertEqual(found, sorted(self.expected_txt))
+
+    def test_recursive_serial_matches_parallel(self):
+        serial = sorted(findFiles.find_files(self.test_dir, '*', recursive=True, workers=1))
+        parallel = sorted(findFiles.find_files(self.test_dir, '*', recursive=True, workers=8))
+        self.assertEqual(serial, parallel)
+        self.assertEqual(len(serial), 12)
+
+    def test_ordered_is_deterministic(self):
+        ordered = list(findFiles.find_files(self.test_dir, '*', recursive=True, workers=8, ordered=True))
+        serial = list(findFiles.find_files(self.test_dir, '*', recursive=True, workers=1, ordered=True))
+        self.assertEqual(ordered, serial)
+        self.assertEqual(ordered[:3], [os.path.join(self.test_dir, n) for n in ['one.txt', 'three.jpg', 'two.txt']])
+        self.assertEqual(ordered[3], os.path.join(self.test_dir, 'a', 'one.txt'))
+
+    def test_include_exclude_prune(self):
+        found = sorted(findFiles.find_files(self.test_dir, '*.jpg', recursive=True, include=['one.*'],
+                                            exclude=['*.txt'], prune_dirs=['a']))
+        self.assertEqual(found, sorted(os.path.join(self.test_dir, d, 'three.jpg') for d in ['', 'b']))
+
+    def test_entry_filter(self):
+        big = os.path.join(self.test_dir, 'b', 'big.bin')
+        old = os.path.join(self.test_dir, 'b', 'old.bin')
+        link = os.path.join(self.test_dir, 'b', 'link.bin')
+        with open(big, 'wb') as f:
+            f.write(b'x' * 4096)
+        open(old, 'a').close()
+        os.utime(old, (0, 0))
+        os.symlink(big, link)
+        self.addCleanup(lambda: [os.remove(p) for p in (big, old, link)])
+
+        def find(**criteria):
+            entry_filter = findFiles.build_entry_filter(**criteria)
+            return sorted(findFiles.find_files(self.test_dir, '*.bin', recursive=True, entry_filter=entry_filter))
+
+        self.assertEqual(find(min_size=findFiles.parse_size('4k')), [big])
+        self.assertEqual(find(min_size=4096, follow_symlinks=True), [big, link])
+        self.assertEqual(find(max_size=0, file_type='f'), [old])
+        self.assertEqual(find(min_age=findFiles.parse_age('1d')), [old])
+        self.assertEqual(find(max_age=findFiles.parse_age('1h'), file_type='f'), [big])
+        self.assertEqual(find(file_type='l'), [link])
+        self.assertIsNone(findFiles.build_entry_filter())
+        with self.assertRaises(ValueError):
+            findFiles.build_entry_filter(file_type='l', follow_symlinks=True)
+
+    def test_lazy_generator(self):
+        results = findFiles.find_files(self.test_dir, '*', recursive=True)
+        self.assertTrue(next(results))
+        results.close()
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is Linux-only')
+class TestWatchFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp(prefix='test_watch_')
+        open(os.path.join(self.test_dir, 'existing.txt'), 'a').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_reports_new_files(self):
+        watcher = findFiles.watch_files(self.test_dir, '*.txt', recursive=True, prune_dirs=['skip'])
+        self.addCleanup(watcher.close)
+        self.assertEqual(next(watcher), os.path.join(self.test_dir, 'existing.txt'))
+
+        # The root is watched now; everything below happens after the initial scan
+        open(os.path.join(self.test_dir, 'ignored.jpg'), 'a').close()
+        os.makedirs(os.path.join(self.test_dir, 'skip'))
+        open(os.path.join(self.test_dir, 'skip', 'pruned.txt'), 'a').close()
+        os.makedirs(os.path.join(self.test_dir, 'sub'))
+        open(os.path.join(self.test_dir, 'sub', 'nested.txt'), 'a').close()
+        open(os.path.join(self.test_dir, 'tmp.part'), 'a').close()
+        os.rename(os.path.join(self.test_dir, 'tmp.part'), os.path.join(self.test_dir, 'renamed.txt'))
+
+        self.assertEqual(next(watcher), os.path.join(self.test_dir, 'sub', 'nested.txt'))
+        self.assertEqual(next(watcher), os.path.join(self.test_dir, 'renamed.txt'))
+
+
+class TestDirIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp(prefix='test_dirindex_')
+        self.tree = os.path.join(self.test_dir, 'tree')
+        os.makedirs(os.path.join(self.tree, 'sub', 'deeper'))
+        for rel in ['a.txt', os.path.join('sub', 'b.txt'), os.path.join('sub', 'deeper', 'c.txt')]:
+            open(os.path.join(self.tree, rel), 'a').close()
+        self.index = DirIndex(os.path.join(self.test_dir, 'index.db'), workers=4)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.test_dir)
+
+    def find(self):
+        return sorted(self.index.find_files(self.tree, '*.txt', recursive=True))
+
+    def test_matches_walker(self):
+        expected = sorted(findFiles.find_files(self.tree, '*.txt', recursive=True))
+        self.assertEqual(self.find(), expected)
+        # Second query is answered from the index
+        self.assertEqual(self.find(), expected)
+
+    def backdate(self, seconds=3600):
+        # Directories modified within the racy window are always listed again; age them past it
+        past = time.time() - seconds
+        for dir_path, _, _ in os.walk(self.tree):
+            os.utime(dir_path, (past, past))
+
+    def listed_paths(self):
+        # Run find() and return the directories it read from disk rather than from the index
+        listed = []
+
+        def refresh_dir(path, cached_mtime_ns):
+            result = real_refresh_dir(path, cached_mtime_ns)
+            if result is not None and result[1] is not None:
+                listed.append(path)
+            return result
+
+        real_refresh_dir = lib_dirindex._refresh_dir
+        with mock.patch.object(lib_dirindex, '_refresh_dir', refresh_dir):
+            found = self.find()
+        return found, sorted(listed)
+
+    def test_refresh_sees_changes(self):
+        self.backdate()
+        self.find()
+        new_file = os.path.join(self.tree, 'sub', 'new.txt')
+        open(new_file, 'a').close()
+        shutil.rmtree(os.path.join(self.tree, 'sub', 'deeper'))
+        found, listed = self.listed_paths()
+        self.assertIn(new_file, found)
+        self.assertNotIn(os.path.join(self.tree, 'sub', 'deeper', 'c.txt'), found)
+        count = self.index.conn.execute("SELECT COUNT(*) FROM dirs WHERE path LIKE '%deeper'").fetchone()[0]
+        self.assertEqual(count, 0)
+        # Only the changed directory is read again; the unchanged root comes from the index
+        self.assertEqual(listed, [os.path.join(self.tree, 'sub')])
+
+    def test_unchanged_tree_is_not_rescanned(self):
+        self.backdate()
+        expected = self.find()
+        self.assertEqual(self.listed_paths(), (expected, []))
+
+
+if __name__ == '__main__':
+    unittest.main()
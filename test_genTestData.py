@@ -1,43 +1,61 @@
-#!/usr/bin/env python3
+# test_genTestData.py
 
+import unittest
 import os
-import random
-import string
-import nltk
-
-nltk.download('words')
-from nltk.corpus import words
-
-word_list = words.words()
-
-
-def create_random_word():
-  return ''.join(random.choices(word_list, k=random.randint(1, 3))).lower()
-
-
-def create_dir_structure(depth, max_dirs, extensions):
-  """
-    Creates a directory structure with random-ish names and files at each level.
-
-    Args:
-    depth (int): The depth of the directory structure.
-    max_dirs (int): The maximum number of directories at each level.
-    extensions (list): List of file extensions to be used.
-
-    Returns:
-    None
-    """
-  if depth <= 0:
-    return
-  num_dirs = random.randint(1, max_dirs)
-  for _ in range(num_dirs):
-    dir_name = create_random_word()
-    os.makedirs(dir_name)
-    num_files = random.randint(1, 5)
-    for _ in range(num_files):
-      file_name = create_random_word() + random.choice(extensions)
-      open(os.path.join(dir_name, file_name), 'a').close()
-    create_dir_structure(depth - 1, max_dirs, extensions)
-
-
-create_dir_structure(3, 4, ['.txt', '.doc', '.mp4'])
+import logging
+import shutil
+import tempfile
+import benchmark
+from genTestData import TreeSpec, generate_tree, size_sampler
+
+
+def listing(root):
+    return sorted((os.path.relpath(os.path.join(d, f), root), os.path.getsize(os.path.join(d, f)))
+                  for d, _, files in os.walk(root) for f in files)
+
+
+class TestGenTestData(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp(prefix='test_genTestData_')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_same_seed_same_tree(self):
+        spec = TreeSpec(seed=3, depth=2, fan_out=(1, 3), files_per_dir=(2, 6), sizes='uniform:0-2k', fill='random',
+                        vocabulary=50)
+        a, b, c = (os.path.join(self.test_dir, name) for name in 'abc')
+        stats = generate_tree(a, spec, workers=1)
+        self.assertEqual(generate_tree(b, spec, workers=8), stats)
+        self.assertEqual(listing(a), listing(b))
+        self.assertEqual(len(listing(a)), stats.files)
+        self.assertEqual(sum(size for _, size in listing(a)), stats.bytes)
+        generate_tree(c, spec._replace(seed=4))
+        self.assertNotEqual(listing(a), listing(c))
+
+    def test_shape(self):
+        spec = TreeSpec(depth=2, fan_out=(3, 3), files_per_dir=(4, 4), vocabulary=2, words_per_name=(1, 1))
+        stats = generate_tree(self.test_dir, spec)
+        # Two words only: names repeat and get numbered instead of clashing
+        self.assertEqual((stats.dirs, stats.files), (1 + 3 + 9, 13 * 4))
+
+    def test_size_sampler(self):
+        self.assertEqual(size_sampler('fixed:4k')(None), 4096)
+        with self.assertRaises(ValueError):
+            size_sampler('gaussian:1')
+
+    def test_benchmark_results(self):
+        spec = TreeSpec(depth=1, fan_out=(2, 2), files_per_dir=(3, 3), sizes='fixed:100', fill='zero')
+        level = logging.getLogger().level
+        results = benchmark.run_benchmarks(spec, repeat=1, workers=2, workdir=self.test_dir)
+        self.assertEqual(logging.getLogger().level, level)
+        self.assertEqual(set(results['results']), set(benchmark.BENCHMARKS))
+        self.assertEqual(results['results']['find_files']['items'], 9)
+        self.assertEqual(results['results']['process_files']['items'], 9)
+        self.assertEqual(results['meta']['tree']['bytes'], 900)
+        self.assertEqual(len(benchmark.compare(results, results)), 1 + len(benchmark.BENCHMARKS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+# test_lib_async.py
+
+import unittest
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+import findFiles
+import lib_async
+import lib_walk
+from lib_async import AsyncFileActions
+
+class TestLibAsync(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp(prefix='test_lib_async_')
+        self.src = os.path.join(self.test_dir, 'src')
+        os.makedirs(os.path.join(self.src, 'sub'))
+        for name in ['a.txt', 'b.txt', 'c.doc', os.path.join('sub', 'd.txt')]:
+            with open(os.path.join(self.src, name), 'w') as f:
+                f.write(name)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    async def test_find_files(self):
+        found = [path async for path in lib_async.find_files(self.src, '*.txt', recursive=True)]
+        self.assertEqual(sorted(os.path.relpath(path, self.src) for path in found),
+                         ['a.txt', 'b.txt', os.path.join('sub', 'd.txt')])
+
+    async def test_find_files_keeps_order(self):
+        for i in range(300):
+            open(os.path.join(self.src, f'{i}.txt'), 'w').close()
+        expected = list(findFiles.find_files(self.src, '*.txt', recursive=True, ordered=True))
+        with mock.patch.object(lib_async, 'SEARCH_BATCH', 7), mock.patch.object(lib_async, 'SEARCH_BATCH_SECONDS', 0.0001):
+            found = [path async for path in lib_async.find_files(self.src, '*.txt', recursive=True, ordered=True)]
+        self.assertEqual(found, expected)
+
+    async def test_find_files_stops_when_consumer_leaves(self):
+        for i in range(50):
+            open(os.path.join(self.src, f'{i}.log'), 'w').close()
+        with mock.patch.object(lib_async, 'SEARCH_BATCH', 1), mock.patch.object(lib_async, 'SEARCH_QUEUE_BATCHES', 1):
+            search = lib_async.find_files(self.src, '*.log')
+            async for _ in search:
+                break
+            await search.aclose()
+        for thread in threading.enumerate():
+            if thread.name == 'lib_async-find':
+                thread.join(1)
+                self.assertFalse(thread.is_alive())
+
+    async def test_sparse_search_yields_early_and_stops(self):
+        root = os.path.join(self.src, 'many')
+        for i in range(100):
+            os.makedirs(os.path.join(root, f'd{i:03}'))
+        open(os.path.join(root, 'd000', 'match.bin'), 'w').close()
+        scanned = []
+        real_scan_dir = lib_walk.scan_dir
+
+        def slow_scan_dir(path, prune=None):
+            scanned.append(path)
+            time.sleep(0.01)
+            return real_scan_dir(path, prune)
+
+        with mock.patch('lib_walk.scan_dir', slow_scan_dir):
+            search = lib_async.find_files(root, '*.bin', recursive=True, workers=1, ordered=True)
+            async for path in search:
+                break
+            await search.aclose()
+        self.assertEqual(os.path.basename(path), 'match.bin')
+        # The lone match is not held back until the walk ends, and the walk stops with the consumer
+        self.assertLess(len(scanned), 50)
+
+    async def test_find_files_error(self):
+        def entry_filter(entry):
+            raise ValueError(entry.name)
+
+        with self.assertRaises(ValueError):
+            async for _ in lib_async.find_files(self.src, '*', entry_filter=entry_filter):
+                pass
+
+    async def test_actions(self):
+        copies, moved = os.path.join(self.test_dir, 'copies'), os.path.join(self.test_dir, 'moved')
+        os.makedirs(copies)
+        os.makedirs(moved)
+        async with AsyncFileActions(max_concurrent=2) as actions:
+            paths = [path async for path in actions.find_files(self.src, '*.txt')]
+            await actions.copy_files(paths, copies)
+            self.assertTrue(await actions.perform_rename(os.path.join(copies, 'a.txt'), os.path.join(copies, 'A.txt')))
+            await actions.move_files([os.path.join(self.src, 'c.doc')], moved)
+            await actions.delete_files([os.path.join(self.src, 'sub')], recursive=True)
+        self.assertEqual(sorted(os.listdir(copies)), ['A.txt', 'b.txt'])
+        self.assertEqual(os.listdir(moved), ['c.doc'])
+        self.assertEqual(sorted(os.listdir(self.src)), ['a.txt', 'b.txt'])
+
+    async def test_concurrency_limit(self):
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def slow_rename(old_path, new_path, dry_run=False):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return True
+
+        with mock.patch('renameFiles.perform_rename', slow_rename):
+            async with AsyncFileActions(max_concurrent=2) as actions:
+                results = await asyncio.gather(*(actions.perform_rename(str(i), str(i)) for i in range(8)))
+        self.assertEqual(results, [True] * 8)
+        self.assertEqual(peak[0], 2)
+
+
+class TestDefaultActions(unittest.TestCase):
+
+    def test_module_functions_in_several_event_loops(self):
+        test_dir = tempfile.mkdtemp(prefix='test_lib_async_')
+        self.addCleanup(shutil.rmtree, test_dir)
+        sources = []
+        for i in range(12):
+            sources.append(os.path.join(test_dir, f'{i}.txt'))
+            open(sources[-1], 'w').close()
+
+        async def copy_all(destination):
+            os.makedirs(destination)
+            # More calls than the concurrency limit, so the semaphore is contended
+            await asyncio.gather(*(lib_async.copy_files([source], destination) for source in sources))
+            return len(os.listdir(destination))
+
+        self.assertEqual(asyncio.run(copy_all(os.path.join(test_dir, 'first'))), 12)
+        self.assertEqual(asyncio.run(copy_all(os.path.join(test_dir, 'second'))), 12)
+
+if __name__ == '__main__':
+    unittest.main()
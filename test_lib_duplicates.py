@@ -0,0 +1,63 @@
+# test_lib_duplicates.py
+
+import unittest
+import os
+import shutil
+import tempfile
+import findFiles
+import lib_duplicates
+from lib_duplicates import find_duplicates
+
+class TestFindDuplicates(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = tempfile.mkdtemp(prefix='test_duplicates_')
+        big = os.urandom(3 * lib_duplicates.PARTIAL_BYTES)
+        # Same size and same head/tail as `big`, different middle: only the full hash tells them apart
+        middle = bytearray(big)
+        middle[len(big) // 2] ^= 0xFF
+        contents = {
+            'small1.txt': b'hello', 'small2.txt': b'hello', 'small3.txt': b'world',
+            'big1.bin': big, os.path.join('sub', 'big2.bin'): big, 'middle.bin': bytes(middle),
+            'empty1': b'', 'empty2': b'',
+        }
+        os.makedirs(os.path.join(cls.test_dir, 'sub'))
+        for name, data in contents.items():
+            with open(cls.path(name), 'wb') as f:
+                f.write(data)
+        os.link(cls.path('big1.bin'), cls.path('hardlink.bin'))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.test_dir)
+
+    @classmethod
+    def path(cls, name):
+        return os.path.join(cls.test_dir, name)
+
+    def test_groups(self):
+        entries = findFiles.find_entries(self.test_dir, '*', recursive=True)
+        groups = find_duplicates(entries, workers=4)
+        self.assertEqual(len(groups), 2)
+        big_group, small_group = groups
+        self.assertEqual(small_group, [self.path('small1.txt'), self.path('small2.txt')])
+        self.assertEqual(len(big_group), 2)
+        self.assertIn(self.path(os.path.join('sub', 'big2.bin')), big_group)
+        self.assertNotIn(self.path('middle.bin'), big_group)
+
+    def test_plain_paths_and_empty_files(self):
+        paths = [self.path(n) for n in ['empty1', 'empty2', 'small3.txt']]
+        self.assertEqual(find_duplicates(paths, min_size=0), [paths[:2]])
+
+    def test_full_hash_mmap(self):
+        original = lib_duplicates.MMAP_THRESHOLD
+        lib_duplicates.MMAP_THRESHOLD = 1
+        try:
+            self.assertEqual(lib_duplicates.full_hash(self.path('big1.bin')),
+                             lib_duplicates.full_hash(self.path(os.path.join('sub', 'big2.bin'))))
+        finally:
+            lib_duplicates.MMAP_THRESHOLD = original
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# test_lib_fileinput.py
+
+import unittest
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from lib_fileinput import iter_records, iter_file_paths_from_input, get_file_paths_from_input
+
+def make_args(**kwargs):
+    defaults = dict(dry_run=False, files=[], from_file=None, null=False)
+    defaults.update(kwargs)
+    return argparse.Namespace(**defaults)
+
+class TestFileInput(unittest.TestCase):
+
+    def test_records_span_chunks(self):
+        stream = io.BytesIO(b'alpha\0be\nta\0gamma')
+        self.assertEqual(list(iter_records(stream, b'\0', chunk_size=3)), [b'alpha', b'be\nta', b'gamma'])
+
+    def test_null_delimited_paths_are_verbatim(self):
+        stdin = io.BytesIO(b' a b \0new\nline\0 a b \0')
+        paths, dry_run = iter_file_paths_from_input(make_args(null=True), dedupe=True, stdin=stdin)
+        self.assertEqual(list(paths), [' a b ', 'new\nline'])
+        self.assertFalse(dry_run)
+
+    def test_bytes_paths(self):
+        stdin = io.BytesIO(b'caf\xe9\n\nplain\n')
+        paths, _ = iter_file_paths_from_input(make_args(), as_bytes=True, stdin=stdin)
+        self.assertEqual(list(paths), [b'caf\xe9', b'plain'])
+
+    def test_dry_run_plan_is_detected(self):
+        stdin = io.BytesIO(b'{"op": "rename", "src": "a.txt", "dst": "it\'s -> b.txt"}\n'
+                           b'{"op": "delete", "src": "c\\nd.txt"}\n')
+        paths, dry_run = iter_file_paths_from_input(make_args(), stdin=stdin)
+        self.assertTrue(dry_run)
+        self.assertEqual(list(paths), ["it's -> b.txt", 'c\nd.txt'])
+
+    def test_from_file_null(self):
+        with tempfile.NamedTemporaryFile('wb', delete=False) as file:
+            file.write(b'one\0two\0')
+        self.addCleanup(os.remove, file.name)
+        stdin = io.StringIO()
+        stdin.isatty = lambda: True
+        paths, _ = iter_file_paths_from_input(make_args(from_file=file.name, null=True), stdin=stdin)
+        self.assertEqual(list(paths), ['one', 'two'])
+
+    def test_find_and_rename_pipeline_with_newline_in_name(self):
+        test_dir = tempfile.mkdtemp(prefix='test_lib_fileinput_')
+        self.addCleanup(shutil.rmtree, test_dir)
+        open(os.path.join(test_dir, 'odd\nname.txt'), 'w').close()
+        here = os.path.dirname(os.path.abspath(__file__))
+        found = subprocess.run([sys.executable, os.path.join(here, 'findFiles.py'), '-0', '*.txt', test_dir],
+                               stdin=subprocess.DEVNULL, capture_output=True, check=True).stdout
+        subprocess.run([sys.executable, os.path.join(here, 'renameFiles.py'), '-0', '-cc', 'upper'],
+                       input=found, capture_output=True, check=True)
+        self.assertEqual(os.listdir(test_dir), ['ODD\nNAME.txt'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+# test_lib_grep.py
+
+import unittest
+import os
+import shutil
+import tempfile
+from lib_grep import grep_files
+
+class TestGrepFiles(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = tempfile.mkdtemp(prefix='test_grep_')
+        contents = {
+            'a.txt': b'first line\nTODO: fix (this)\nlast TODO line',
+            'b.txt': b'nothing to see\n',
+            'binary.bin': b'TODO\0\x01\x02',
+            'empty.txt': b'',
+        }
+        cls.paths = {}
+        for name, data in contents.items():
+            cls.paths[name] = os.path.join(cls.test_dir, name)
+            with open(cls.paths[name], 'wb') as f:
+                f.write(data)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.test_dir)
+
+    def test_regex_lines(self):
+        results = list(grep_files(self.paths.values(), r'TODO\b', workers=1))
+        self.assertEqual(results, [(self.paths['a.txt'], 2, 'TODO: fix (this)'),
+                                   (self.paths['a.txt'], 3, 'last TODO line')])
+
+    def test_literal_ignore_case(self):
+        results = list(grep_files(self.paths.values(), '(THIS)', literal=True, ignore_case=True, workers=1))
+        self.assertEqual(results, [(self.paths['a.txt'], 2, 'TODO: fix (this)')])
+
+    def test_process_pool_files_only(self):
+        paths = list(self.paths.values()) * 50
+        results = list(grep_files(paths, 'line', files_only=True, workers=2))
+        self.assertEqual(len(results), 50)
+        self.assertEqual({path for path, _, _ in results}, {self.paths['a.txt']})
+
+if __name__ == '__main__':
+    unittest.main()
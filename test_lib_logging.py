@@ -0,0 +1,192 @@
+# test_lib_logging.py
+
+import unittest
+import io
+import json
+import logging
+import os
+import tempfile
+import queue
+from lib_logging import log_function, log_block, truncated_repr, BoundedQueueHandler, BatchingQueueListener, \
+    TimingRegistry, timed_block, timed_function
+
+class ReprCounter:
+    count = 0
+
+    def __repr__(self):
+        ReprCounter.count += 1
+        return 'ReprCounter()'
+
+class TestLogFunction(unittest.TestCase):
+
+    def setUp(self):
+        self.root = logging.getLogger()
+        self.old_level = self.root.level
+        ReprCounter.count = 0
+
+    def tearDown(self):
+        self.root.setLevel(self.old_level)
+
+    def test_disabled_level_builds_no_repr(self):
+        @log_function
+        def identity(value):
+            return value
+
+        self.root.setLevel(logging.ERROR)
+        value = ReprCounter()
+        self.assertIs(identity(value), value)
+        self.assertEqual(ReprCounter.count, 0)
+
+        self.root.setLevel(logging.INFO)
+        with self.assertLogs(level=logging.INFO) as logs:
+            identity(value)
+        self.assertEqual(ReprCounter.count, 2)
+        self.assertIn('Calling identity(ReprCounter())', logs.output[0])
+
+    def test_truncation(self):
+        @log_function(max_repr=40)
+        def total(items):
+            return sum(items)
+
+        self.root.setLevel(logging.INFO)
+        with self.assertLogs(level=logging.INFO) as logs:
+            self.assertEqual(total(list(range(1000000))), 499999500000)
+        self.assertLess(len(logs.records[0].getMessage()), 70)
+        self.assertEqual(truncated_repr('x' * 10, 5), "'x...")
+        self.assertEqual(truncated_repr(list(range(20)), None), repr(list(range(20))))
+
+    def test_sampling(self):
+        @log_function(sample=10)
+        def noop():
+            pass
+
+        self.root.setLevel(logging.INFO)
+        with self.assertLogs(level=logging.INFO) as logs:
+            for _ in range(25):
+                noop()
+        self.assertEqual(len(logs.output), 6)
+
+    def test_static_elides_wrapper(self):
+        def func():
+            pass
+
+        self.root.setLevel(logging.WARNING)
+        self.assertIs(log_function(func, static=True), func)
+        self.assertIsNot(log_function(func, level=logging.ERROR, static=True), func)
+
+    def test_log_block_level(self):
+        # assertLogs sets the level it captures at, so DEBUG is disabled inside
+        with self.assertLogs(level=logging.INFO) as logs:
+            with log_block("quiet", level=logging.DEBUG):
+                pass
+            with log_block("loud"):
+                pass
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn('Entering block: loud', logs.output[0])
+
+class TestAsyncLogging(unittest.TestCase):
+
+    def make_logger(self, handler):
+        logger = logging.getLogger(f'test_async_{id(handler)}')
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        return logger
+
+    def test_records_are_written_in_order_and_flushed_on_stop(self):
+        log_queue = queue.Queue(maxsize=100)
+        handler = BoundedQueueHandler(log_queue)
+        stream = io.StringIO()
+        listener = BatchingQueueListener(log_queue, stream, logging.Formatter('%(levelname)s %(message)s'), 16)
+        logger = self.make_logger(handler)
+        listener.start()
+        items = [1]
+        logger.info("items: %s", items)
+        items.append(2)  # The message was frozen when logged
+        for i in range(50):
+            logger.debug("line %d", i)
+        listener.stop()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(lines[0], 'INFO items: [1]')
+        self.assertEqual(lines[1:], [f'DEBUG line {i}' for i in range(50)])
+
+    def test_overflow_policies(self):
+        for policy, expected in [('drop', ['0', '1']), ('drop_oldest', ['3', '4'])]:
+            with self.subTest(policy=policy):
+                log_queue = queue.Queue(maxsize=2)
+                handler = BoundedQueueHandler(log_queue, policy)
+                logger = self.make_logger(handler)
+                # No listener running: the queue fills up
+                for i in range(5):
+                    logger.warning("%d", i)
+                self.assertEqual(handler.dropped, 3)
+                self.assertEqual([log_queue.get_nowait().getMessage() for _ in range(2)], expected)
+
+    def test_stop_request_is_never_dropped(self):
+        log_queue = queue.Queue(maxsize=1)
+        handler = BoundedQueueHandler(log_queue, 'drop_oldest')
+        logger = self.make_logger(handler)
+        log_queue.put(BatchingQueueListener._STOP)
+        logger.warning("late")
+        self.assertIs(log_queue.get_nowait(), BatchingQueueListener._STOP)
+        self.assertEqual(handler.dropped, 1)
+
+    def test_tracebacks_are_rendered_when_queued(self):
+        log_queue = queue.Queue()
+        logger = self.make_logger(BoundedQueueHandler(log_queue))
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed")
+        record = log_queue.get_nowait()
+        self.assertIsNone(record.exc_info)
+        text = logging.Formatter('%(message)s').format(record)
+        self.assertTrue(text.startswith('failed\nTraceback'))
+        self.assertIn('ValueError: boom', text)
+
+class TestTimings(unittest.TestCase):
+
+    def test_disabled_registry_records_nothing(self):
+        registry = TimingRegistry()
+        with timed_block("block", registry=registry):
+            pass
+        self.assertEqual(registry.summary(), {})
+
+    def test_counts_histogram_and_dumps(self):
+        registry = TimingRegistry(max_trace_events=3)
+        registry.enabled = True
+
+        @timed_function(registry=registry)
+        def work(x):
+            if x < 0:
+                raise ValueError(x)
+            return x * 2
+
+        self.assertEqual([work(i) for i in range(4)], [0, 2, 4, 6])
+        with self.assertRaises(ValueError):
+            work(-1)
+        with timed_block("block", registry=registry):
+            pass
+
+        summary = registry.summary()
+        entry = summary[work.__qualname__]
+        self.assertEqual(entry['count'], 5)
+        self.assertEqual(sum(entry['histogram_us'].values()), 5)
+        self.assertLessEqual(entry['min_seconds'], entry['max_seconds'])
+        self.assertEqual(summary['block']['count'], 1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path, trace_path = os.path.join(tmp, 'timings.json'), os.path.join(tmp, 'trace.json')
+            registry.dump_json(json_path)
+            registry.dump_chrome_trace(trace_path)
+            with open(json_path) as file:
+                self.assertEqual(json.load(file)['block']['count'], 1)
+            with open(trace_path) as file:
+                trace = json.load(file)
+        self.assertEqual(len(trace['traceEvents']), 3)
+        self.assertEqual(trace['otherData']['dropped_events'], 3)
+        self.assertTrue(all(event['ph'] == 'X' for event in trace['traceEvents']))
+
+if __name__ == '__main__':
+    unittest.main()
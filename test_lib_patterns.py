@@ -0,0 +1,34 @@
+# test_lib_patterns.py
+
+import unittest
+from lib_patterns import compile_patterns, compile_name_matcher
+
+class TestPatterns(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertIsNone(compile_patterns([]))
+        self.assertTrue(compile_name_matcher([])('anything'))
+
+    def test_suffix_fast_path(self):
+        matches = compile_patterns(['*.jpg', '*.png'])
+        self.assertTrue(matches('cat.jpg'))
+        self.assertTrue(matches('.png'))
+        self.assertFalse(matches('cat.jpeg'))
+
+    def test_literal_and_wildcard_mix(self):
+        matches = compile_patterns(['README', '*.md', 'IMG-??.[jp]*'])
+        self.assertTrue(matches('README'))
+        self.assertTrue(matches('notes.md'))
+        self.assertTrue(matches('IMG-01.png'))
+        self.assertFalse(matches('IMG-001.png'))
+        self.assertFalse(matches('README.txt'))
+
+    def test_include_exclude(self):
+        matches = compile_name_matcher(['*.txt'], ['secret*', '*.bak.txt'])
+        self.assertTrue(matches('notes.txt'))
+        self.assertFalse(matches('secret.txt'))
+        self.assertFalse(matches('notes.bak.txt'))
+        self.assertFalse(matches('notes.md'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+# test_lib_undo.py
+
+import unittest
+import errno
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+import lib_undo
+import dirFileActions
+
+class TestUndoJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp(prefix='test_lib_undo_')
+        self.journal_dir = os.path.join(self.test_dir, 'journal')
+        self.work_dir = os.path.join(self.test_dir, 'work')
+        os.makedirs(self.work_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def path(self, name):
+        return os.path.join(self.work_dir, name)
+
+    def write(self, name):
+        with open(self.path(name), 'w') as f:
+            f.write(name)
+
+    def test_group_commit(self):
+        with mock.patch('lib_undo.os.fsync', wraps=os.fsync) as fsync:
+            with lib_undo.transaction('test', self.journal_dir) as journal:
+                for i in range(1000):
+                    journal.record('rename', f'a{i}', f'b{i}')
+        self.assertLess(fsync.call_count, 20)
+        header, steps, committed = lib_undo.read_journal(lib_undo.find_transaction(None, self.journal_dir))
+        self.assertTrue(committed)
+        self.assertEqual(header['name'], 'test')
+        self.assertEqual([step['seq'] for step in steps], list(range(1, 1001)))
+
+    def test_durable_record_waits_for_sync(self):
+        with lib_undo.transaction('test', self.journal_dir, durable=True) as journal:
+            seq = journal.record('rename', 'a', 'b')
+            self.assertGreaterEqual(journal._synced, seq)
+
+    def test_torn_last_line_is_ignored(self):
+        with lib_undo.transaction('test', self.journal_dir):
+            lib_undo.record('rename', 'a', 'b')
+        path = lib_undo.find_transaction(None, self.journal_dir)
+        with open(path, 'a') as f:
+            f.write('{"op": "rena')
+        _, steps, _ = lib_undo.read_journal(path)
+        self.assertEqual(len(steps), 1)
+
+    def test_undo_copy_move_and_skipped_steps(self):
+        for name in ['a', 'b', 'kept']:
+            self.write(name)
+        os.makedirs(self.path('dst'))
+        self.write(os.path.join('dst', 'kept'))
+        with lib_undo.transaction('test', self.journal_dir):
+            dirFileActions.copy_files([self.path('a'), self.path('kept')], self.path('dst'), workers=2)
+            dirFileActions.move_files([self.path('b')], self.path('dst'), workers=2)
+            # Journaled but never performed: undo must leave it alone
+            lib_undo.record('rename', self.path('missing'), self.path('other'))
+        self.assertEqual(sorted(os.listdir(self.path('dst'))), ['a', 'b', 'kept'])
+        with self.assertLogs(level='ERROR') as logs:
+            self.assertEqual(lib_undo.perform_undo(None, self.journal_dir), (2, 0))
+        # dst/kept was overwritten by the copy: left alone, and reported
+        self.assertTrue(any('overwritten' in line for line in logs.output))
+        self.assertEqual(os.listdir(self.path('dst')), ['kept'])
+        self.assertEqual(sorted(os.listdir(self.work_dir)), ['a', 'b', 'dst', 'kept'])
+        self.assertEqual(lib_undo.list_transactions(self.journal_dir), [])
+
+    def test_failed_block_and_refused_move(self):
+        self.write('a')
+        os.makedirs(self.path('dst'))
+        self.write(os.path.join('dst', 'a'))
+        with self.assertRaises(RuntimeError):
+            with lib_undo.transaction('test', self.journal_dir):
+                stats = dirFileActions.move_files([self.path('a')], self.path('dst'))
+                raise RuntimeError("interrupted")
+        self.assertEqual(stats.errors, 1)
+        _, steps, committed = lib_undo.read_journal(lib_undo.find_transaction(None, self.journal_dir))
+        # The refused move was never journaled, and the transaction is not marked committed
+        self.assertEqual((steps, committed), ([], False))
+
+    def test_failed_operations_are_aborted(self):
+        self.write('a')
+        os.makedirs(self.path('dst'))
+        self.write(os.path.join('dst', 'a'))
+        refused = OSError(errno.EOPNOTSUPP, "Operation not supported")
+        with lib_undo.transaction('test', self.journal_dir):
+            with mock.patch('lib_fastcopy._reflink', side_effect=refused):
+                dirFileActions.copy_files([self.path('a')], self.path('dst'), mode='reflink')
+            with mock.patch('dirFileActions.copy_file', side_effect=OSError(errno.EIO, "I/O error")):
+                dirFileActions.copy_files([self.path('a')], self.path('dst'))
+            # Refused by the existing dst/a
+            dirFileActions.copy_files([self.path('a')], self.path('dst'), mode='link')
+            dirFileActions.copy_files([self.path('a')], self.work_dir + os.sep + 'b', mode='link')
+        path = lib_undo.find_transaction(None, self.journal_dir)
+        with open(path) as f:
+            self.assertEqual(f.read().count('"op": "abort"'), 3)
+        _, steps, committed = lib_undo.read_journal(path)
+        self.assertTrue(committed)
+        self.assertEqual([(step['op'], step['dst']) for step in steps], [('link', self.path('b'))])
+        # So undo leaves the existing dst/a alone and reports nothing as overwritten
+        with self.assertNoLogs(level='ERROR'):
+            self.assertEqual(lib_undo.perform_undo(None, self.journal_dir), (1, 0))
+        with open(self.path(os.path.join('dst', 'a'))) as f:
+            self.assertEqual(f.read(), os.path.join('dst', 'a'))
+        self.assertFalse(os.path.exists(self.path('b')))
+
+    def test_undo_rename_from_another_process(self):
+        for name in ['a.txt', 'b.txt']:
+            self.write(name)
+        here = os.path.dirname(os.path.abspath(__file__))
+        subprocess.run([sys.executable, os.path.join(here, 'renameFiles.py'), '-cc', 'upper',
+                        '--journal', self.journal_dir], input=f"{self.path('a.txt')}\n{self.path('b.txt')}\n",
+                       text=True, capture_output=True, check=True)
+        self.assertEqual(sorted(os.listdir(self.work_dir)), ['A.txt', 'B.txt'])
+        self.assertEqual(lib_undo.perform_undo(None, self.journal_dir), (2, 0))
+        self.assertEqual(sorted(os.listdir(self.work_dir)), ['a.txt', 'b.txt'])
+
+    def test_undo_from_another_cwd(self):
+        self.write('a.txt')
+        here = os.path.dirname(os.path.abspath(__file__))
+        subprocess.run([sys.executable, os.path.join(here, 'renameFiles.py'), '-cc', 'upper',
+                        '--journal', self.journal_dir], input='a.txt\n', text=True, capture_output=True,
+                       check=True, cwd=self.work_dir)
+        other = os.path.join(self.test_dir, 'other')
+        os.makedirs(other)
+        # A file of the same name elsewhere must not be touched
+        open(os.path.join(other, 'A.txt'), 'w').close()
+        cwd = os.getcwd()
+        os.chdir(other)
+        try:
+            self.assertEqual(lib_undo.perform_undo(None, self.journal_dir), (1, 0))
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(os.listdir(self.work_dir), ['a.txt'])
+        self.assertEqual(os.listdir(other), ['A.txt'])
+
+    def test_undo_groups(self):
+        steps = [{'op': 'rename', 'src': 'd/a', 'dst': 'd/b', 'seq': 1},
+                 {'op': 'rename', 'src': 'd/b', 'dst': 'd/c', 'seq': 2},
+                 {'op': 'rename', 'src': 'x', 'dst': 'y', 'seq': 3},
+                 {'op': 'move', 'src': 'd', 'dst': 'e', 'seq': 4},
+                 {'op': 'rename', 'src': 'e/f', 'dst': 'e/g', 'seq': 5}]
+        groups = [[step['seq'] for step in group] for group in lib_undo.undo_groups(steps)]
+        # e/f lives inside the moved directory e, so it belongs with the moves of d
+        self.assertEqual(groups, [[5, 4, 2, 1], [3]])
+
+    def test_failed_undo_resumes_from_checkpoint(self):
+        names = [f'f{i}' for i in range(20)]
+        for name in names:
+            self.write(name)
+        with lib_undo.transaction('test', self.journal_dir):
+            for name in names:
+                lib_undo.record('rename', self.path(name), self.path(name + '.bak'))
+                os.rename(self.path(name), self.path(name + '.bak'))
+            # A chain: f0.bak -> chained, undone before f0.bak -> f0
+            lib_undo.record('rename', self.path('f0.bak'), self.path('chained'))
+            os.rename(self.path('f0.bak'), self.path('chained'))
+
+        real_undo_step = lib_undo.undo_step
+        def flaky(step):
+            if step['dst'] == self.path('chained'):
+                raise OSError("injected")
+            return real_undo_step(step)
+        with mock.patch('lib_undo.undo_step', side_effect=flaky):
+            self.assertEqual(lib_undo.perform_undo(None, self.journal_dir, workers=4), (19, 2))
+        # The failure blocked the older step of its group; the journal is kept for another attempt
+        self.assertTrue(os.path.exists(self.path('chained')))
+        with mock.patch('lib_undo.undo_step', wraps=real_undo_step) as undo_step:
+            self.assertEqual(lib_undo.perform_undo(None, self.journal_dir), (2, 0))
+        self.assertEqual(undo_step.call_count, 2)
+        self.assertEqual(sorted(os.listdir(self.work_dir)), sorted(names))
+        self.assertEqual(os.listdir(self.journal_dir), [f for f in os.listdir(self.journal_dir) if f.endswith('.undone')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,12 @@
 import unittest
 import os
 import shutil
+import argparse
+import tempfile
+import io
+import contextlib
+from unittest import mock
+import lib_dryrun
 import renameFiles
 
 class TestRenameFiles(unittest.TestCase):
@@ -37,6 +43,128 @@ class TestRenameFiles(unittest.TestCase):
 
     def test_matches_pattern(self):
         self.assertTrue(renameFiles.matches_pattern("IMG-1234", "IMG-\d+"))
+    def test_pipeline(self):
+        pipeline = renameFiles.RenamePipeline(match=r'IMG-(\d+)', replace=r'P\1_{num3}', change_case='lower',
+                                              remove_vowels=True, start_number=5)
+        self.assertEqual(pipeline.transform_names(['IMG-7.JPG', 'Other.JPG', 'IMG-3.jpg']),
+                         ['p7_005.JPG', 'thr.JPG', 'p3_006.jpg'])
+        self.assertEqual(pipeline.transform_paths([os.path.join('dir', 'IMG-1.jpg')]), [os.path.join('dir', 'p1_007.jpg')])
+
+    def test_pipeline_matches_rename_file_order(self):
+        args = argparse.Namespace(
+            match=r'\.JPEG$', replace='.Jpeg', change_case='upper', remove_vowels=False)
+        self.assertEqual(renameFiles.compute_new_path(os.path.join('d', 'cat.JPEG'), args), os.path.join('d', 'CAT.Jpeg'))
+
+
+class TestRenamePlanning(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp(prefix='test_rename_plan_')
+        self.addCleanup(shutil.rmtree, self.test_dir)
+
+    def path(self, name):
+        return os.path.join(self.test_dir, name)
+
+    def write(self, name, content=None):
+        with open(self.path(name), 'w') as f:
+            f.write(content or name)
+
+    def read(self, name):
+        with open(self.path(name)) as f:
+            return f.read()
+
+    def test_chain_runs_target_first(self):
+        operations, conflicts = renameFiles.plan_renames({'a': 'b', 'b': 'c'}, check_existing=False)
+        self.assertEqual(operations, [('b', 'c'), ('a', 'b')])
+        self.assertEqual(conflicts, [])
+
+    def test_collisions(self):
+        self.write('existing')
+        renames = {self.path('x'): self.path('same'), self.path('y'): self.path('same'),
+                   self.path('z'): self.path('x'), self.path('w'): self.path('existing')}
+        operations, conflicts = renameFiles.plan_renames(renames)
+        self.assertEqual(operations, [])
+        self.assertEqual(sorted(c[0] for c in conflicts), sorted(renames))
+
+    def test_blocked_shift_chain_is_linear(self):
+        # IMG-0 -> IMG-1 -> ... -> IMG-n, where IMG-n exists: every rename is blocked
+        n = 500
+        self.write(f'IMG-{n}')
+        renames = {self.path(f'IMG-{i}'): self.path(f'IMG-{i + 1}') for i in range(n)}
+        with mock.patch('renameFiles.os.lstat', wraps=os.lstat) as lstat:
+            operations, conflicts = renameFiles.plan_renames(renames)
+        self.assertEqual((operations, len(conflicts)), ([], n))
+        # The target, then its would-be source
+        self.assertEqual(lstat.call_count, 2)
+
+    def test_case_only_rename_on_case_insensitive_filesystem(self):
+        for name in ['a.txt', 'x', 'y']:
+            self.write(name)
+        real_lstat = os.lstat
+
+        def case_insensitive_lstat(path):
+            directory, name = os.path.split(path)
+            matches = [entry for entry in os.listdir(directory) if entry.lower() == name.lower()]
+            return real_lstat(os.path.join(directory, matches[0]) if matches else path)
+
+        renames = {self.path('a.txt'): self.path('A.txt'), self.path('x'): self.path('Y')}
+        with mock.patch('renameFiles.os.lstat', case_insensitive_lstat):
+            operations, conflicts = renameFiles.plan_renames(renames)
+        # A.txt "exists" only as a.txt itself; Y is a different file
+        self.assertEqual(operations, [(self.path('a.txt'), self.path('A.txt'))])
+        self.assertEqual([c[:2] for c in conflicts], [(self.path('x'), self.path('Y'))])
+
+    def test_swap_and_rotation(self):
+        for name in ['a', 'b', 'c', 'x', 'y']:
+            self.write(name)
+        renames = {self.path('a'): self.path('b'), self.path('b'): self.path('c'), self.path('c'): self.path('a'),
+                   self.path('x'): self.path('y'), self.path('y'): self.path('x')}
+        operations, conflicts = renameFiles.plan_renames(renames)
+        self.assertEqual(conflicts, [])
+        self.assertEqual(len(operations), 7)
+        self.assertEqual(renameFiles.execute_renames(operations).failed, 0)
+        self.assertEqual([self.read(n) for n in ['a', 'b', 'c', 'x', 'y']], ['c', 'a', 'b', 'y', 'x'])
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ['a', 'b', 'c', 'x', 'y'])
+
+    def test_parallel_execution_by_directory(self):
+        renames = {}
+        for d in range(4):
+            os.makedirs(self.path(f'd{d}'))
+            for name in ['a', 'b']:
+                self.write(os.path.join(f'd{d}', name))
+            # A swap in every directory: order within the directory matters
+            renames[self.path(os.path.join(f'd{d}', 'a'))] = self.path(os.path.join(f'd{d}', 'b'))
+            renames[self.path(os.path.join(f'd{d}', 'b'))] = self.path(os.path.join(f'd{d}', 'a'))
+        operations, _ = renameFiles.plan_renames(renames)
+        self.assertEqual(len(renameFiles.shard_by_directory(operations)), 4)
+        stats = renameFiles.execute_renames(operations, workers=4)
+        self.assertEqual((stats.renamed, stats.failed), (12, 0))
+        for d in range(4):
+            self.assertEqual(self.read(os.path.join(f'd{d}', 'a')), os.path.join(f'd{d}', 'b'))
+        self.assertEqual(len(renameFiles.shard_by_directory([('x/a', 'x/b'), ('y/a', 'x/c')])), 1)
+
+    def test_process_files(self):
+        for name in ['one.txt', 'two.txt', 'TWO.txt']:
+            self.write(name)
+        args = argparse.Namespace(match=None, replace=None, change_case='upper', remove_vowels=False)
+        renameFiles.process_files([self.path('one.txt'), self.path('two.txt')], args, False)
+        # two.txt -> TWO.txt would overwrite an existing file, so it is left alone
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ['ONE.txt', 'TWO.txt', 'two.txt'])
+        self.assertEqual(self.read('TWO.txt'), 'TWO.txt')
+
+    def test_dry_run_plan_and_apply(self):
+        for name in ['a -> b.txt', "it's.txt"]:
+            self.write(name)
+        args = argparse.Namespace(match=None, replace=None, change_case='upper', remove_vowels=False)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            renameFiles.process_files([self.path('a -> b.txt'), self.path("it's.txt")], args, True)
+        steps = list(lib_dryrun.read_plan(io.StringIO(out.getvalue())))
+        self.assertEqual(steps[0], {'op': 'rename', 'src': self.path('a -> b.txt'), 'dst': self.path('A -> B.txt')})
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ['a -> b.txt', "it's.txt"])
+        stats = renameFiles.apply_rename_plan(steps)
+        self.assertEqual((stats.renamed, stats.failed), (2, 0))
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ['A -> B.txt', "IT'S.txt"])
 
 if __name__ == '__main__':
     unittest.main()